@@ -0,0 +1,334 @@
+## ============================================================
+## ANN.PY - Approximate nearest-neighbour index for RAG vectors
+## ============================================================
+## Brute-force cosine (vectors.py) reads every row of the matrix for
+## every query. Fine for one course; too slow once the KB holds
+## hundreds of thousands of sections. This is an IVF index:
+##
+## - k-means splits the unit vectors into `nlist` clusters
+##   (spherical k-means - centroids are kept unit length too)
+## - every row is filed under its closest centroid
+## - a query scores the centroids, then only the rows in the
+##   `nprobe` closest clusters
+##
+## A query touches roughly nprobe / nlist of the matrix.
+##
+## KNOBS (recall vs latency):
+## - nlist:  more clusters = smaller lists, but more to miss
+##           (default ~4 * sqrt(rows))
+## - nprobe: clusters searched per query - raise for recall,
+##           lower for speed. nprobe == nlist is exact.
+##
+## ON DISK:
+##   RAG/.digger/ann.npz   centroids, row order, list offsets,
+##                         plus the index state (epoch, generation)
+##                         of the vectors it was filed from
+##
+## The matrix itself stays in vectors.npy - the IVF only stores which
+## rows live in which cluster. When vectors change, rows are re-filed
+## under the existing centroids (one matrix multiply); k-means only
+## re-runs once the matrix has doubled since training.
+##
+## Run this file directly for the recall@k benchmark vs brute force.
+## ============================================================
+
+import os
+import math
+
+try:
+    import numpy as np
+except ImportError:  ## Optional - vectors.py checks before using this
+    np = None
+
+
+## ============================================================
+## ANN SETTINGS
+## ============================================================
+ANN_FILENAME = "ann.npz"
+ANN_MIN_ROWS = 20000          ## Below this brute force is fast enough
+ANN_NPROBE = 16               ## Clusters searched per query
+KMEANS_ITERATIONS = 10        ## Lloyd iterations when training
+KMEANS_SAMPLE_PER_LIST = 64   ## Training rows per cluster (sampled)
+ASSIGN_BATCH_ROWS = 16384     ## Rows scored against centroids at once
+
+
+class IVFIndex:
+    """
+    Inverted-file index over a matrix of unit vectors.
+
+    Example:
+        ivf = IVFIndex()
+        ivf.train(matrix)
+        ivf.assign(matrix)
+        scores, rows = ivf.search(matrix, query, k=10, nprobe=16)
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty (untrained) index.
+        """
+        self.centroids = None     ## float32 [nlist x dims], unit rows
+        self.order = None         ## Matrix row ids grouped by cluster
+        self.offsets = None       ## Cluster i = order[offsets[i]:offsets[i + 1]]
+        self.trained_rows = 0     ## Matrix size when k-means last ran
+        self.state = None         ## (epoch, generation) of the vectors the lists match
+
+    @property
+    def nlist(self):
+        return 0 if self.centroids is None else len(self.centroids)
+
+    @staticmethod
+    def default_nlist(rows):
+        """
+        Pick a cluster count for a matrix size (~4 * sqrt(rows)).
+
+        Args:
+            rows: Number of vectors
+
+        Returns:
+            int: Number of clusters
+        """
+        return max(1, min(rows, int(4 * math.sqrt(rows))))
+
+    def needs_training(self, rows):
+        """
+        Check whether k-means should (re)run for a matrix size.
+
+        Args:
+            rows: Current number of vectors
+
+        Returns:
+            bool: True if untrained or the matrix has doubled since
+        """
+        return self.centroids is None or rows > 2 * self.trained_rows
+
+    def train(self, matrix, nlist=None, iterations=KMEANS_ITERATIONS, seed=0):
+        """
+        Learn cluster centroids with spherical k-means.
+
+        Trains on a sample of KMEANS_SAMPLE_PER_LIST rows per cluster,
+        so cost doesn't grow with the full matrix.
+
+        Args:
+            matrix: [rows x dims] unit vectors (float16 or float32)
+            nlist: Number of clusters (default: default_nlist(rows))
+            iterations: Lloyd iterations
+            seed: RNG seed - same data, same clusters
+        """
+        rows = len(matrix)
+        nlist = min(nlist or self.default_nlist(rows), rows)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(rows, nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, sample_size, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+
+            ## Empty clusters restart on a random sample row
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[rng.choice(sample_size, len(empty))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_rows = rows
+
+    def assign(self, matrix, state=None):
+        """
+        File every matrix row under its closest centroid.
+
+        Args:
+            matrix: [rows x dims] unit vectors
+            state: (epoch, generation) of the vectors, recorded with the lists
+        """
+        labels = np.empty(len(matrix), dtype=np.int32)
+        for start in range(0, len(matrix), ASSIGN_BATCH_ROWS):
+            batch = np.asarray(matrix[start:start + ASSIGN_BATCH_ROWS], dtype=np.float32)
+            labels[start:start + len(batch)] = np.argmax(batch @ self.centroids.T, axis=1)
+
+        self.order = np.argsort(labels, kind="stable").astype(np.int32)
+        counts = np.bincount(labels, minlength=self.nlist)
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.state = state
+
+    def search(self, matrix, query, k=10, nprobe=ANN_NPROBE):
+        """
+        Approximate top-k rows by cosine similarity.
+
+        Args:
+            matrix: The same [rows x dims] matrix the lists were built on
+            query: Unit query vector
+            k: Number of rows to return
+            nprobe: Clusters to search (nlist = exact)
+
+        Returns:
+            tuple: (scores, row ids) arrays, best first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = max(1, min(nprobe, self.nlist))
+
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+        if not len(candidates):
+            return np.zeros(0, dtype=np.float32), candidates
+
+        scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return scores[top], candidates[top]
+
+    def save(self, path):
+        """
+        Write the index to an .npz file (temp file + rename).
+
+        Args:
+            path: Target path (e.g. RAG/.digger/ann.npz)
+
+        Returns:
+            bool: True if saved
+        """
+        epoch, generation = self.state or (None, -1)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    centroids=self.centroids,
+                    order=self.order,
+                    offsets=self.offsets,
+                    trained_rows=np.int64(self.trained_rows),
+                    epoch=np.str_(epoch or ""),
+                    generation=np.int64(generation),
+                )
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            print(f"Warning: Could not save ANN index: {e}")
+            return False
+
+    def load(self, path):
+        """
+        Load an index saved by save().
+
+        Args:
+            path: Path to the .npz file
+
+        Returns:
+            bool: True if loaded
+        """
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"]
+                order = data["order"]
+                offsets = data["offsets"]
+                trained_rows = int(data["trained_rows"])
+                epoch = str(data["epoch"])
+                generation = int(data["generation"])
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.trained_rows = trained_rows
+        self.state = None if generation < 0 else (epoch or None, generation)
+        return True
+
+
+def brute_force_search(matrix, query, k=10):
+    """
+    Exact top-k rows by cosine similarity (the ANN reference).
+
+    Args:
+        matrix: [rows x dims] unit vectors
+        query: Unit query vector
+        k: Number of rows to return
+
+    Returns:
+        tuple: (scores, row ids) arrays, best first
+    """
+    scores = np.asarray(matrix, dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return scores[top], top
+
+
+def recall_at_k(ivf, matrix, queries, k=10, nprobe=ANN_NPROBE):
+    """
+    Measure how much of the exact top-k the IVF index finds.
+
+    Args:
+        ivf: Trained + assigned IVFIndex
+        matrix: Matrix the index was built on
+        queries: [n x dims] unit query vectors
+        k: Results per query
+        nprobe: Clusters searched per query
+
+    Returns:
+        float: Mean fraction of true top-k rows returned (1.0 = exact)
+    """
+    found = 0
+    for query in queries:
+        _, exact = brute_force_search(matrix, query, k)
+        _, approx = ivf.search(matrix, query, k, nprobe)
+        found += len(set(exact.tolist()) & set(approx.tolist()))
+    return found / (len(queries) * k)
+
+
+## ============================================================
+## QUICK TEST - Run this file directly for the recall@k benchmark
+## ============================================================
+if __name__ == "__main__":
+    import sys
+    import time
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dims = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    k = 10
+
+    print(f"ANN benchmark: {rows} x {dims} vectors, recall@{k}")
+    print("=" * 50)
+
+    ## Clustered synthetic data - real embeddings are far from uniform
+    rng = np.random.default_rng(1)
+    topics = rng.standard_normal((200, dims)).astype(np.float32)
+    matrix = topics[rng.integers(0, len(topics), rows)] + 0.6 * rng.standard_normal((rows, dims)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix.astype(np.float16)
+    queries = np.asarray(matrix[rng.choice(rows, 100, replace=False)], dtype=np.float32)
+    queries += 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / math.sqrt(dims)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    ivf = IVFIndex()
+    start = time.time()
+    ivf.train(matrix)
+    ivf.assign(matrix)
+    print(f"Build: {time.time() - start:.2f}s (nlist={ivf.nlist})")
+
+    start = time.time()
+    for query in queries:
+        brute_force_search(matrix, query, k)
+    brute_ms = (time.time() - start) * 1000 / len(queries)
+    print(f"\nBrute force: {brute_ms:.2f} ms/query")
+
+    print(f"\n{'nprobe':>7} {'recall':>7} {'ms/query':>9} {'speedup':>8}")
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        start = time.time()
+        for query in queries:
+            ivf.search(matrix, query, k, nprobe)
+        ann_ms = (time.time() - start) * 1000 / len(queries)
+        recall = recall_at_k(ivf, matrix, queries, k, nprobe)
+        print(f"{nprobe:>7} {recall:>7.3f} {ann_ms:>9.2f} {brute_ms / ann_ms:>7.1f}x")
+
+    print("=" * 50)
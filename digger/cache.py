@@ -0,0 +1,195 @@
+## ============================================================
+## CACHE.PY - LRU cache for RAG search results
+## ============================================================
+## Students 'load' the same topics over and over, across sessions.
+## RAGSearch keeps the formatted result of each search here so a
+## repeat costs a dict lookup instead of a ranking + section reads.
+##
+## KEYS:
+## Built by RAGSearch from the parsed query (so "TCP  Handshake" and
+## "tcp handshake" share an entry), the search mode/limits, and the
+## index state. Any change to the knowledge base - an edited file or
+## add_note() - moves the state on, so old entries can never be hit
+## again; set_state() then drops them.
+##
+## The state is [INDEX_VERSION, epoch, generation]: generation alone
+## starts again at 1 when the index is rebuilt from scratch, the
+## epoch (new per build) doesn't.
+##
+## ON DISK (optional):
+##   RAG/.digger/query_cache.json
+##   {"state": [5, "9f1c...", 7], "entries": [[key, result], ...]}  oldest first
+## Loaded at startup and only kept if the index state matches. New
+## entries are written at most every QUERY_CACHE_SAVE_INTERVAL
+## seconds, plus once by flush() at exit - never a full rewrite on
+## every search.
+## ============================================================
+
+import os
+import json
+import time
+from collections import OrderedDict
+
+
+## ============================================================
+## CACHE SETTINGS
+## ============================================================
+QUERY_CACHE_FILENAME = "query_cache.json"
+QUERY_CACHE_SIZE = 128        ## Results kept (least recently used go first)
+QUERY_CACHE_SAVE_INTERVAL = 30.0  ## Seconds between saves of new entries
+
+
+class QueryCache:
+    """
+    Least-recently-used cache of search results for one index state.
+
+    Example:
+        cache = QueryCache(capacity=128, path=index_dir / "query_cache.json")
+        cache.set_state((INDEX_VERSION, *index.state))
+        result = cache.get(key)
+        if result is None:
+            result = run_search()
+            cache.put(key, result)
+        cache.flush()          # at exit
+    """
+
+    def __init__(self, capacity=QUERY_CACHE_SIZE, path=None):
+        """
+        Initialize the cache.
+
+        Args:
+            capacity: Max results kept (0 disables caching)
+            path: JSON file to persist to (default: memory only)
+        """
+        self.capacity = capacity
+        self.path = path
+        self.entries = OrderedDict()  ## key -> result, oldest first
+        self.state = None
+        self.dirty = False            ## Entries not saved yet
+        self.saved_at = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            self.load()
+
+    def get(self, key):
+        """
+        Look up a result and mark it recently used.
+
+        Args:
+            key: Cache key string
+
+        Returns:
+            str: Cached result, or None on a miss
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, result):
+        """
+        Store a result, evicting the least recently used if full.
+
+        Args:
+            key: Cache key string
+            result: Search result to cache
+        """
+        if self.capacity <= 0:
+            return
+
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+        self.dirty = True
+        if time.monotonic() - self.saved_at >= QUERY_CACHE_SAVE_INTERVAL:
+            self.save()
+
+    def set_state(self, state):
+        """
+        Drop every entry if the knowledge base moved on.
+
+        Args:
+            state: Current index state, e.g. (INDEX_VERSION, epoch, generation)
+        """
+        state = tuple(state)
+        if state == self.state:
+            return
+
+        self.state = state
+        if self.entries:
+            self.entries.clear()
+            self.save()
+
+    def flush(self):
+        """
+        Save entries added since the last save (call at exit).
+        """
+        if self.dirty:
+            self.save()
+
+    def stats(self):
+        """
+        Get hit/miss counts since startup.
+
+        Returns:
+            dict: hits, misses, hit_rate (0-1), size
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
+
+    def load(self):
+        """
+        Load persisted entries (checked against the index state later).
+
+        Returns:
+            bool: True if entries were loaded
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = data["entries"]
+            state = tuple(data["state"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        self.state = state
+        if self.capacity <= 0:
+            entries = []  ## entries[-0:] would keep them all
+        self.entries = OrderedDict((key, result) for key, result in entries[-self.capacity:])
+        return True
+
+    def save(self):
+        """
+        Write entries to disk (temp file + rename), if persisting.
+        """
+        if not self.path:
+            return
+
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        data = {
+            "state": self.state,
+            "entries": list(self.entries.items()),
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not save query cache: {e}")
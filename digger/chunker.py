@@ -0,0 +1,137 @@
+## ============================================================
+## CHUNKER.PY - Markdown-aware section splitter for the RAG index
+## ============================================================
+## Decides where each retrieval section starts. The index stores the
+## result (start line, start byte, title) so search can hand back a
+## whole section with one seek + read instead of stitching lines.
+##
+## A NEW SECTION STARTS AT:
+## - ATX headings            "## TCP vs UDP"
+## - Setext headings         "SECTION 2: FILE SYSTEM" over "-------"
+## - Oversized sections: once a section passes CHUNK_TARGET_BYTES it
+##   is split at the next safe break - a blank line or a bold
+##   pseudo-heading line ("**Core mechanics**")
+##
+## NEVER SPLITS:
+## - Inside ``` / ~~~ code fences ('#' comments are not headings)
+## - Inside tables or paragraphs (only blank lines are safe breaks)
+##
+## The chunker is fed one line at a time and its state can be saved,
+## so text appended by add_note() continues where the file left off.
+## ============================================================
+
+import re
+
+
+## ============================================================
+## CHUNK SETTINGS
+## ============================================================
+CHUNK_TARGET_BYTES = 1200     ## Split oversized sections after this
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+SETEXT_UNDERLINE_PATTERN = re.compile(r"^\s{0,3}(=+|-+)\s*$")
+FENCE_PATTERN = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
+BOLD_LINE_PATTERN = re.compile(r"^\*\*[^*].*\*\*\s*$")
+LIST_OR_TABLE_PATTERN = re.compile(r"^\s*([-*+>|]|\d+[.)])\s")
+
+
+class MarkdownChunker:
+    """
+    Streaming section splitter.
+
+    Example:
+        chunker = MarkdownChunker()
+        for i, line in enumerate(lines):
+            next_line = lines[i + 1] if i + 1 < len(lines) else None
+            if chunker.feed(line, next_line):
+                print("section starts:", chunker.title)
+    """
+
+    def __init__(self, state=None):
+        """
+        Initialize the chunker.
+
+        Args:
+            state: Dict from a previous state() call, to continue a
+                   file that was appended to (default: start of file)
+        """
+        state = state or {}
+        self.fence = state.get("fence", "")             ## Open fence marker, "" if none
+        self.title = state.get("title", "")             ## Text of the current heading
+        self.size = state.get("size", 0)                ## Bytes in the current section
+        self.split_ready = state.get("split_ready", False)  ## Oversized, at a safe break
+
+    def feed(self, line, next_line=None):
+        """
+        Process one line.
+
+        Args:
+            line: The line (with or without its newline)
+            next_line: The following line if known - needed to spot
+                       setext headings, which are underlined
+
+        Returns:
+            bool: True if this line starts a new section
+        """
+        stripped = line.strip()
+        starts = False
+
+        if self.fence:
+            ## Inside a code block - only look for the closing fence
+            if stripped.startswith(self.fence):
+                self.fence = ""
+        else:
+            heading = HEADING_PATTERN.match(line)
+            if heading:
+                starts = True
+                self.title = heading.group(2)
+            elif self._is_setext_heading(line, next_line):
+                starts = True
+                self.title = stripped
+            elif stripped and self.split_ready:
+                starts = True  ## Continuation chunk - keeps the old title
+            elif BOLD_LINE_PATTERN.match(stripped) and self.size > CHUNK_TARGET_BYTES:
+                starts = True
+
+            fence = FENCE_PATTERN.match(line)
+            if fence:
+                self.fence = fence.group(1)[:3]
+
+        if starts:
+            self.size = 0
+            self.split_ready = False
+
+        self.size += len(line.encode("utf-8"))
+
+        ## A blank line outside code is a safe place to split
+        if not stripped and not self.fence and self.size > CHUNK_TARGET_BYTES:
+            self.split_ready = True
+
+        return starts
+
+    def state(self):
+        """
+        Snapshot the chunker so an append can resume it.
+
+        Returns:
+            dict: JSON-serialisable state
+        """
+        return {
+            "fence": self.fence,
+            "title": self.title,
+            "size": self.size,
+            "split_ready": self.split_ready,
+        }
+
+    @staticmethod
+    def _is_setext_heading(line, next_line):
+        """
+        Check for a text line underlined with === or ---.
+
+        A "---" under a list item or table row is a rule, not a heading.
+        """
+        if next_line is None or not line.strip():
+            return False
+        if not SETEXT_UNDERLINE_PATTERN.match(next_line):
+            return False
+        return not LIST_OR_TABLE_PATTERN.match(line) and not FENCE_PATTERN.match(line)
@@ -24,14 +24,20 @@
 ## ============================================================
 print("*** PORT-TEST VERSION RUNNING - STARTUP CHECK ***")
 import argparse
+import atexit
 import sys
 import readline  ## Enables arrow keys in input()
 
 from digger.config import load_config
 from digger.session import Session
+from digger.context import ContextBuilder
+from digger.summary import Summarizer
 from digger.ollama import OllamaClient
 from digger.voice import VoiceEngine
+from digger.speech import SpeechPipeline
 from digger.rag import RAGSearch
+from digger.history import HistoryIndex
+from digger.vectors import OllamaEmbedder
 
 
 ## ============================================================
@@ -81,8 +87,10 @@ DIGGER COMMANDS
   clear                   - Reset session (clears history + RAG)
   paste                   - Multiline input (blank line to send)
   load <topic>            - Search RAG for topic
+                            (AND, OR, "exact phrase", prefix*)
   remember <note>         - Add to general_notes.md
   remember <file>: <note> - Add to specific file
+  history <query>         - Search answers from past sessions
   show files              - List all RAG files
   show knowledge          - Display RAG stats
   help                    - Show this message
@@ -156,6 +164,13 @@ def main():
         "--memory-dir",
         help="Session memory directory"
     )
+    parser.add_argument(
+        "--resume", "-r",
+        nargs="?",
+        const="latest",
+        metavar="ID",
+        help="Continue a saved session (default: latest)"
+    )
 
     args = parser.parse_args()
 
@@ -174,11 +189,47 @@ def main():
     ## STEP 3: Initialize components
     ## ========================================
 
-    ## Session for memory management
-    session = Session(memory_dir=config["memory_dir"])
-
     ## Ollama client for model interaction
-    ollama = OllamaClient(model=config["model"])
+    ollama = OllamaClient(
+        model=config["model"],
+        transport=config["ollama_transport"],
+        host=config["ollama_host"],
+        reuse_context=config["ollama_reuse_context"],
+        keep_alive=config["ollama_keep_alive"]
+    )
+
+    ## Load the model in the background while everything else starts
+    if config["ollama_warm_up"]:
+        ollama.start_warm_up()
+
+    ## Session for memory management - new, or a saved one (--resume)
+    session_options = {
+        "builder": ContextBuilder(num_ctx=config["num_ctx"]),
+        "fsync": config["session_fsync"],
+        "write_behind": config["session_write_behind"],
+    }
+    if args.resume:
+        try:
+            session = Session.resume(config["memory_dir"], args.resume, **session_options)
+        except OSError as e:
+            print(f"Cannot resume: {e}")
+            return
+    else:
+        session = Session(memory_dir=config["memory_dir"], **session_options)
+
+    ## Queued journal writes still land if main() dies unexpectedly
+    atexit.register(session.close)
+
+    ## Background summary of old turns (own client - may be a smaller model)
+    if config["summarize"]:
+        summarizer = Summarizer(OllamaClient(
+            model=config["summary_model"] or config["model"],
+            transport=config["ollama_transport"],
+            host=config["ollama_host"],
+            keep_alive=config["ollama_keep_alive"]
+        ))
+    else:
+        summarizer = None
 
     ## Voice engine (if enabled)
     if config["voice_enabled"] and not args.no_voice:
@@ -186,13 +237,32 @@ def main():
     else:
         voice_engine = None
 
+    ## Past answers from earlier sessions ('history', and 'load' if rag_history)
+    history = HistoryIndex(config["memory_dir"], exclude=session.id)
+
+    def finish_history():
+        session.close()  ## Flush the journal before indexing it
+        history.finish_session()
+    atexit.register(finish_history)
+
     ## RAG search engine
-    rag = RAGSearch(rag_dir=config["rag_dir"])
+    rag = RAGSearch(
+        rag_dir=config["rag_dir"],
+        mode=config["rag_mode"],
+        embedder=OllamaEmbedder(model=config["embed_model"], host=config["ollama_host"]),
+        cache_size=config["rag_cache_size"],
+        persist_cache=config["rag_cache_persist"],
+        history=history if config["rag_history"] else None
+    )
+    atexit.register(rag.close)  ## Saves the result cache
 
     ## ========================================
     ## STEP 4: Show banner
     ## ========================================
     print_banner(session.id, config["model"], config["rag_dir"])
+    if args.resume:
+        summary = session.get_summary()
+        print(f"Resumed: {summary['message_count']} messages, {summary['knowledge_blocks']} knowledge blocks")
 
     ## Startup voice
     if voice_engine:
@@ -220,6 +290,14 @@ def main():
                 print(f"Session file: {session.filepath}")
                 summary = session.get_summary()
                 print(f"Messages: {summary['message_count']}")
+                if voice_engine and voice_engine.cache:
+                    cache = voice_engine.cache.stats()
+                    print(f"Voice cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%})")
+                if voice_engine:
+                    requests_made = voice_engine.get_stats()
+                    if requests_made["requests"]:
+                        print(f"Voice requests: {requests_made['requests']} (median {requests_made['median_ms']:.0f}ms, "
+                              f"{requests_made['retries']} retries, {requests_made['failed']} failed)")
                 print("")
 
                 if voice_engine:
@@ -236,9 +314,7 @@ def main():
 
             ## ====== COMMAND: clear ======
             if user_input.lower() == "clear":
-                session._messages = []
-                session._rag_context = ""
-                session._save()
+                session.clear()
                 print("Session cleared. RAG and history reset.")
                 continue
 
@@ -266,6 +342,7 @@ def main():
                     if len(results) > 2000:
                         print(f"\n[...{len(results) - 2000} more chars...]")
                     print("─" * 50)
+                    print(f"Search: {rag.timing_summary()}")
 
                     ## Add to session context
                     session.add_context(results, topic=topic)
@@ -306,6 +383,26 @@ def main():
 
                 continue
 
+            ## ====== COMMAND: history <query> ======
+            if user_input.lower().startswith("history "):
+                query = user_input[8:].strip()
+                if not query:
+                    print("Usage: history <query>")
+                    continue
+
+                hits = history.search(query)
+                print(f"\nPAST ANSWERS FOR: {query}")
+                print("═" * 50)
+                if not hits:
+                    print("  (nothing in earlier sessions)")
+                for hit in hits:
+                    print(f"[session {hit['session']}] George: {hit['question'][:80]}")
+                    print(f"Digger: {hit['answer'][:500]}")
+                    if len(hit["answer"]) > 500:
+                        print(f"[...{len(hit['answer']) - 500} more chars...]")
+                    print("─" * 50)
+                continue
+
             ## ====== COMMAND: show files ======
             if user_input.lower() == "show files":
                 print("\nKNOWLEDGE BASE FILES:")
@@ -348,12 +445,23 @@ def main():
             print("Digger:")
             print("─" * 50)
 
+            ## Voice streaming: speak each sentence as soon as it's written
+            speech = None
+            if voice_engine and config["voice_streaming"]:
+                speech = SpeechPipeline(voice_engine)
+
             try:
-                response = ollama.chat(context)
+                if speech:
+                    response = ollama.chat(context, on_piece=speech.feed)
+                    speech.finish()
+                else:
+                    response = ollama.chat(context)
                 print("")  ## Ensure newline after streaming
             except KeyboardInterrupt:
                 print("\n[Interrupted]")
                 response = ""
+                if speech:
+                    speech.cancel()
 
             print("─" * 50)
 
@@ -361,8 +469,12 @@ def main():
             if response:
                 session.add_message("Digger", response)
 
-                ## Voice output (non-blocking)
-                if voice_engine:
+                ## Fold old turns into the summary while George reads
+                if summarizer:
+                    summarizer.maybe_start(session)
+
+                ## Voice output (non-blocking) - already playing if streamed
+                if voice_engine and not speech:
                     voice_engine.speak(response)
 
         except EOFError:
@@ -374,6 +486,8 @@ def main():
             ## Ctrl+C - skip voice if playing, return to prompt
             if voice_engine:
                 voice_engine.skip()
+            ## Get this turn's journal writes to disk
+            session.flush()
             print("")
             ## Reset readline line buffer (not history)
             try:
@@ -394,6 +508,9 @@ def main():
     if voice_engine:
         voice_engine.skip()
 
+    ## Flush the session journal to disk
+    session.close()
+
     print("")
     print("=" * 60)
 
@@ -33,6 +33,26 @@ DEFAULT_CONFIG = {
     "voice_enabled": True,
     "voice_stability": 0.4,
     "voice_similarity": 0.8,
+    "voice_streaming": True,    ## Speak sentence by sentence while the model writes
+    "voice_in_flight": 3,       ## TTS requests running at once
+    "voice_cache_dir": str(PACKAGE_DIR / ".cache" / "tts"),  ## Synthesized clips
+    "voice_cache_mb": 50,       ## Clip cache size cap (0 = off)
+    "voice_stream": True,       ## Pipe audio into mpg123 as it downloads
+    "rag_mode": "bm25",     ## "bm25" (ranked sections), "keyword", "vector" or "hybrid"
+    "embed_model": "nomic-embed-text",      ## Ollama model for vector mode
+    "ollama_host": "http://localhost:11434",  ## Ollama server (HTTP API)
+    "ollama_transport": "subprocess",  ## "subprocess" (ollama run) or "http" (server API)
+    "ollama_reuse_context": True,      ## http: send only the new turn when possible
+    "ollama_keep_alive": "30m",        ## Keep the model loaded between turns
+    "ollama_warm_up": True,            ## Preload the model while starting up
+    "num_ctx": 4096,                   ## Model context window (tokens) - see Modelfile
+    "summarize": True,                 ## Summarize old turns in the background
+    "summary_model": "",               ## Model for summaries ("" = same as model)
+    "session_fsync": "interval",       ## Session journal: "always", "interval" or "never"
+    "session_write_behind": True,      ## Write the journal from a background thread
+    "rag_cache_size": 128,      ## Cached 'load' results (0 = off)
+    "rag_cache_persist": True,  ## Keep the cache in RAG/.digger between runs
+    "rag_history": False,       ## Add matching past answers to 'load' results
 }
 
 ## ============================================================
@@ -135,6 +155,7 @@ def _merge_env_config(config):
     - DIGGER_RAG_DIR: RAG directory path
     - DIGGER_MEMORY_DIR: Memory directory path
     - DIGGER_VOICE_ENABLED: "true" or "false"
+    - OLLAMA_HOST: Ollama server URL
     """
     ## Map of env var name -> config key
     env_mapping = {
@@ -143,6 +164,7 @@ def _merge_env_config(config):
         "DIGGER_RAG_DIR": "rag_dir",
         "DIGGER_MEMORY_DIR": "memory_dir",
         "DIGGER_VOICE_ID": "voice_id",
+        "OLLAMA_HOST": "ollama_host",
     }
 
     for env_var, config_key in env_mapping.items():
@@ -200,6 +222,21 @@ def _validate_config(config):
         print("Warning: No ELEVENLABS_API_KEY set. Voice disabled.")
         config["voice_enabled"] = False
 
+    ## Unknown search mode falls back to ranked search
+    if config.get("rag_mode") not in ("bm25", "keyword", "vector", "hybrid"):
+        print(f"Warning: Unknown rag_mode '{config.get('rag_mode')}'. Using bm25.")
+        config["rag_mode"] = "bm25"
+
+    ## Unknown fsync policy falls back to the default
+    if config.get("session_fsync") not in ("always", "interval", "never"):
+        print(f"Warning: Unknown session_fsync '{config.get('session_fsync')}'. Using interval.")
+        config["session_fsync"] = "interval"
+
+    ## Unknown transport falls back to the ollama CLI
+    if config.get("ollama_transport") not in ("subprocess", "http"):
+        print(f"Warning: Unknown ollama_transport '{config.get('ollama_transport')}'. Using subprocess.")
+        config["ollama_transport"] = "subprocess"
+
     ## Ensure directories exist
     rag_dir = Path(config["rag_dir"])
     memory_dir = Path(config["memory_dir"])
@@ -243,11 +280,69 @@ model: "mistral"
 ## Knowledge base directory
 rag_dir: "./RAG"
 
+## Knowledge search: "bm25" (best sections first), "keyword",
+## "vector" (semantic - needs numpy + an Ollama embedding model)
+## or "hybrid" (bm25 + vector, fused)
+rag_mode: "bm25"
+embed_model: "nomic-embed-text"
+
+## Ollama server address
+ollama_host: "http://localhost:11434"
+
+## How to talk to the model: "subprocess" (ollama run per turn) or
+## "http" (streams from the server above over a kept-alive connection)
+ollama_transport: "subprocess"
+
+## http only: reuse the server's context tokens so each turn sends just
+## the new message (full resend whenever loaded knowledge changes)
+ollama_reuse_context: true
+
+## Load the model in the background at startup, and keep it loaded
+## this long after each answer ("-1" = until ollama stops)
+ollama_warm_up: true
+ollama_keep_alive: "30m"
+
+## Model context window in tokens (PARAMETER num_ctx in the Modelfile).
+## Knowledge and old messages are trimmed to fit.
+num_ctx: 4096
+
+## Fold older messages into a running summary in the background
+## (summary_model: smaller/faster model for this, "" = same as model)
+summarize: true
+summary_model: ""
+
+## Session journal durability: "always" (fsync every message),
+## "interval" (at most once a second) or "never" (leave it to the OS)
+session_fsync: "interval"
+
+## Write the session file from a background thread (flushed on exit)
+session_write_behind: true
+
+## Search result cache (repeat 'load's are instant; cleared on KB change)
+rag_cache_size: 128
+rag_cache_persist: true
+
+## Add matching answers from earlier sessions to 'load' results
+rag_history: false
+
 ## Session memory directory
 memory_dir: "./memory"
 
 ## Voice enabled by default
 voice_enabled: true
+
+## Speak each sentence as soon as the model writes it
+voice_streaming: true
+
+## TTS requests running at once (speech is queued, never blocks)
+voice_in_flight: 3
+
+## Reuse synthesized clips for repeated lines (0 = off)
+voice_cache_dir: "./.cache/tts"
+voice_cache_mb: 50
+
+## Stream audio into the player as it downloads (no temp files)
+voice_stream: true
 """
 
     with open(config_file, "w") as f:
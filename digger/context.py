@@ -0,0 +1,236 @@
+## ============================================================
+## CONTEXT.PY - Token-budgeted context builder
+## ============================================================
+## Session.get_context() used to glue together the system prompt,
+## every 'load' result and every message with no limit. The model
+## only sees num_ctx tokens (4096 in models/digger.Modelfile), so
+## long sessions were silently cut off - usually the system prompt
+## and oldest knowledge went first.
+##
+## This builds the same text, but within a token budget:
+##
+##   num_ctx - reply_tokens   total the prompt may use
+##   - system prompt          always included
+##   - knowledge              up to knowledge_share of what's left
+##                            (more if the history is short)
+##   - history                the rest, newest messages first;
+##                            the latest message is always kept
+##
+## KNOWLEDGE DEDUPE:
+## 'load tcp' then 'load tcp handshake' returns many of the same
+## [SOURCE: ...] sections twice. Sections are deduped newest-first,
+## so the newest load keeps them and older loads shrink. Over budget,
+## whole loads are dropped oldest first.
+##
+## TOKENS:
+## estimate_tokens() is a cheap ~4 chars/token heuristic. Pass any
+## callable text -> int as `tokenizer` for exact counts.
+## ============================================================
+
+import re
+
+
+## ============================================================
+## BUDGET SETTINGS
+## ============================================================
+DEFAULT_NUM_CTX = 4096        ## Matches models/digger.Modelfile
+REPLY_TOKENS = 512            ## Kept free for the model's answer
+KNOWLEDGE_SHARE = 0.5         ## Knowledge's share of the prompt budget
+CHARS_PER_TOKEN = 4           ## Heuristic for English/markdown
+
+## A 'load' result is a run of "[SOURCE: ...]" sections
+SOURCE_SPLIT_PATTERN = re.compile(r"\n\n(?=\[SOURCE: )")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count: ~4 characters per token, at least one per word.
+
+    Args:
+        text: Any string
+
+    Returns:
+        int: Estimated tokens
+    """
+    if not text:
+        return 0
+    return max((len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN, len(text.split()))
+
+
+def format_knowledge(topic, content):
+    """
+    Wrap a knowledge block in the markers the model is told about.
+
+    Args:
+        topic: What was loaded
+        content: The RAG results
+
+    Returns:
+        str: Marked-up block
+    """
+    return f"\n=== KNOWLEDGE ON '{topic}' ===\n{content}\n=== END KNOWLEDGE ===\n"
+
+
+class ContextBuilder:
+    """
+    Assembles system prompt + knowledge + history within num_ctx.
+
+    Example:
+        builder = ContextBuilder(num_ctx=4096)
+        context = builder.build(SYSTEM_PROMPT, [("TCP", results)], messages)
+        print(builder.last_report)   # tokens per part, what was dropped
+    """
+
+    def __init__(self, num_ctx=DEFAULT_NUM_CTX, reply_tokens=REPLY_TOKENS,
+                 knowledge_share=KNOWLEDGE_SHARE, tokenizer=None):
+        """
+        Initialize the builder.
+
+        Args:
+            num_ctx: Model context window in tokens
+            reply_tokens: Tokens left free for the answer
+            knowledge_share: Fraction of the prompt budget (after the
+                             system prompt) knowledge may claim
+            tokenizer: Callable text -> token count (default: estimate)
+        """
+        self.num_ctx = num_ctx
+        self.reply_tokens = reply_tokens
+        self.knowledge_share = knowledge_share
+        self.count = tokenizer or estimate_tokens
+
+        ## Token breakdown of the last build()
+        self.last_report = {}
+
+    def build(self, system_prompt, knowledge, messages, summary=""):
+        """
+        Build the context string for the model.
+
+        Args:
+            system_prompt: Personality/rules text (always included)
+            knowledge: List of (topic, content) blocks, oldest first
+            messages: List of (role, content) tuples, oldest first
+            summary: Summary of earlier conversation, if any
+
+        Returns:
+            str: System prompt, knowledge, then conversation
+        """
+        budget = self.num_ctx - self.reply_tokens
+        system_tokens = self.count(system_prompt)
+        available = max(0, budget - system_tokens)
+
+        lines = [f"{role}: {content}" for role, content in messages]
+        line_tokens = [self.count(line) for line in lines]
+        summary_text = f"[Earlier in this session: {summary}]" if summary else ""
+        summary_tokens = self.count(summary_text)
+
+        ## Knowledge gets its share - or everything the history doesn't need
+        history_need = sum(line_tokens) + summary_tokens
+        knowledge_budget = max(int(available * self.knowledge_share), available - history_need)
+        blocks, knowledge_tokens, dropped_blocks = self._fit_knowledge(knowledge, knowledge_budget)
+
+        ## History fills the rest, newest first
+        history_budget = available - knowledge_tokens
+        kept, history_tokens = self._fit_history(line_tokens, history_budget - summary_tokens)
+        if summary_text and history_tokens + summary_tokens <= history_budget:
+            history_tokens += summary_tokens
+        else:
+            summary_text = ""
+
+        dropped_messages = len(lines) - kept
+        parts = [system_prompt]
+        parts.extend(blocks)
+        if summary_text:
+            parts.append(summary_text)
+        if dropped_messages and not summary_text:
+            parts.append(f"[{dropped_messages} earlier messages not shown]")
+        parts.extend(lines[len(lines) - kept:])
+
+        self.last_report = {
+            "budget": budget,
+            "system": system_tokens,
+            "knowledge": knowledge_tokens,
+            "history": history_tokens,
+            "total": system_tokens + knowledge_tokens + history_tokens,
+            "dropped_knowledge": dropped_blocks,
+            "dropped_messages": dropped_messages,
+        }
+        return "\n".join(parts)
+
+    def _fit_knowledge(self, knowledge, budget):
+        """
+        Dedupe knowledge sections and fit whole blocks, newest first.
+
+        Args:
+            knowledge: List of (topic, content), oldest first
+            budget: Tokens available
+
+        Returns:
+            tuple: (formatted blocks oldest first, tokens used,
+                    blocks dropped)
+        """
+        seen = set()
+        fitted = []
+        used = 0
+        dropped = 0
+
+        for topic, content in reversed(knowledge):
+            ## Keep only sections no newer block already has
+            sections = []
+            for section in SOURCE_SPLIT_PATTERN.split(content.strip()):
+                key = " ".join(section.split())
+                if key and key not in seen:
+                    seen.add(key)
+                    sections.append(section)
+            if not sections:
+                continue  ## Entirely repeated - nothing new
+
+            content = "\n\n".join(sections)
+            block = format_knowledge(topic, content)
+            tokens = self.count(block)
+
+            if used + tokens > budget:
+                remaining = budget - used - self.count(format_knowledge(topic, ""))
+                if fitted or remaining <= 0:
+                    dropped += 1
+                    continue
+                ## Newest block alone is too big - keep its head
+                block = format_knowledge(topic, self._truncate(content, remaining))
+                tokens = self.count(block)
+
+            fitted.append(block)
+            used += tokens
+
+        fitted.reverse()
+        return fitted, used, dropped
+
+    def _fit_history(self, line_tokens, budget):
+        """
+        Count how many of the newest messages fit.
+
+        The latest message always fits - it's the question.
+
+        Args:
+            line_tokens: Tokens per message, oldest first
+            budget: Tokens available
+
+        Returns:
+            tuple: (messages kept, tokens used)
+        """
+        kept = 0
+        used = 0
+        for tokens in reversed(line_tokens):
+            if kept and used + tokens > budget:
+                break
+            kept += 1
+            used += tokens
+        return kept, used
+
+    def _truncate(self, text, tokens):
+        """
+        Cut text down to about `tokens` tokens.
+        """
+        total = self.count(text)
+        if total <= tokens:
+            return text
+        keep = int(len(text) * tokens / total) - len("\n[...truncated...]")
+        return text[:max(0, keep)] + "\n[...truncated...]"
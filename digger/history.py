@@ -0,0 +1,493 @@
+## ============================================================
+## HISTORY.PY - Searchable index over past study sessions
+## ============================================================
+## Every Digger answer ever given sits in memory/session_*. This
+## indexes them, so an old explanation can be found (and reused)
+## instead of asking the model again.
+##
+## UNIT = one answer: the George question before it + Digger's reply,
+## ranked with BM25 like the RAG sections (index.py).
+##
+## ON DISK:
+##   memory/.digger/history.json
+##   {
+##     "version": 1,
+##     "generation": 12,
+##     "files":    {"session_x.jsonl": {"mtime": ..., "size": ..., "inode": ...,
+##                                      "offset": 5120, "messages": 14,
+##                                      "question": "...", "docs": ["x:3", ...]}},
+##     "docs":     {"x:3": {"session": "x", "question": "...",
+##                          "answer": "...", "length": 87}},
+##     "postings": {"tcp": {"x:3": 2}}
+##   }
+##   memory/.digger/history_updates.jsonl - changes since the snapshot
+##   {"generation": 13, "file": "session_x.jsonl", "reset": false,
+##    "meta": {...}, "docs": {"x:5": {...}}}
+##
+## INCREMENTAL UPDATES:
+## Session journals (.jsonl) only grow, so refresh() reads from the
+## stored byte offset - a turn costs one small read, however long the
+## session. A compacted journal (new inode, or shorter than the offset)
+## and old .txt sessions are re-indexed whole. A .txt that has been
+## converted to .jsonl (--resume) is left to its journal.
+##
+## Each change is appended to history_updates.jsonl (just the new
+## answers) instead of rewriting history.json; the log is folded into
+## a new snapshot every HISTORY_MAX_PENDING_UPDATES records.
+##
+## THE LIVE SESSION:
+## The session in progress (exclude) is not read at all - its turns
+## are in the context already, and re-indexing it every turn would
+## cost a write per answer. finish_session() indexes it once it has
+## been closed; a resumed session keeps the answers indexed before.
+##
+## Used by the 'history <query>' command, and optionally merged into
+## 'load' results by RAGSearch (rag_history in config).
+## ============================================================
+
+import os
+import json
+import math
+import heapq
+from pathlib import Path
+
+from digger.index import INDEX_DIRNAME, BM25_K1, BM25_B, tokenize
+from digger.session import read_legacy_session
+
+
+## ============================================================
+## HISTORY SETTINGS
+## ============================================================
+HISTORY_FILENAME = "history.json"
+HISTORY_UPDATES_FILENAME = "history_updates.jsonl"
+HISTORY_MAX_PENDING_UPDATES = 50  ## Fold the update log in after this many
+HISTORY_VERSION = 1           ## Bump when the on-disk format changes
+HISTORY_RESULTS = 2           ## Past answers merged into 'load' results
+HISTORY_ANSWER_CHARS = 1500   ## Cap per merged answer
+
+
+class HistoryIndex:
+    """
+    Inverted index over the answers in a memory directory.
+
+    Example:
+        history = HistoryIndex("./memory")
+        for hit in history.search("tcp handshake"):
+            print(hit["session"], hit["question"], hit["answer"])
+    """
+
+    def __init__(self, memory_dir="./memory", exclude=None):
+        """
+        Initialize the index (nothing is read until refresh/search).
+
+        Args:
+            memory_dir: Directory holding session files
+            exclude: Session id left out of results (the one in
+                     progress - its turns are in the context already)
+        """
+        self.memory_dir = Path(memory_dir)
+        self.index_path = self.memory_dir / INDEX_DIRNAME / HISTORY_FILENAME
+        self.updates_path = self.memory_dir / INDEX_DIRNAME / HISTORY_UPDATES_FILENAME
+        self.exclude = exclude
+
+        ## files: filename -> read position + the docs it produced
+        ## docs: doc id -> {"session", "question", "answer", "length"}
+        ## postings: term -> {doc id: term frequency}
+        self.files = {}
+        self.docs = {}
+        self.postings = {}
+        self.generation = 0
+        self.loaded = False
+        self.has_snapshot = False  ## history.json loaded or written
+        self.pending_updates = 0   ## Records in history_updates.jsonl
+
+    def refresh(self):
+        """
+        Load the index, then pick up new and changed session files.
+
+        Returns:
+            bool: True if anything changed
+        """
+        if not self.loaded:
+            self.loaded = True
+            self.has_snapshot = self.load()
+
+        records = []
+        current = self._scan_files()
+
+        for filename in list(self.files):
+            if filename not in current and not self._is_excluded(filename):
+                self._remove_file(filename)
+                records.append({"file": filename, "reset": True, "meta": None, "docs": {}})
+
+        for filename, stat in current.items():
+            record = self._update_file(filename, stat)
+            if record:
+                records.append(record)
+
+        if records:
+            self.generation += 1
+            self._log_updates(records)
+        return bool(records)
+
+    def finish_session(self):
+        """
+        Index the excluded session now that it has been closed.
+        """
+        exclude, self.exclude = self.exclude, None
+        try:
+            self.refresh()
+        finally:
+            self.exclude = exclude
+
+    def search(self, query, limit=5):
+        """
+        Find the past answers that best match a query (BM25).
+
+        Args:
+            query: Search words
+            limit: Number of answers to return
+
+        Returns:
+            list: Dicts with session, question, answer, score - best first
+        """
+        self.refresh()
+        if not self.docs:
+            return []
+
+        avg_length = sum(doc["length"] for doc in self.docs.values()) / len(self.docs) or 1.0
+        scores = {}
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+
+            for doc_id, tf in postings.items():
+                doc = self.docs[doc_id]
+                if doc["session"] == self.exclude:
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * doc["length"] / avg_length
+                score = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [dict(self.docs[doc_id], score=score) for doc_id, score in best]
+
+    def format_results(self, query, limit=HISTORY_RESULTS):
+        """
+        Format matching past answers like RAG search results.
+
+        Args:
+            query: Search words
+            limit: Number of answers
+
+        Returns:
+            str: "[SOURCE: session <id>]" sections, or empty string
+        """
+        results = []
+        for hit in self.search(query, limit):
+            answer = hit["answer"]
+            if len(answer) > HISTORY_ANSWER_CHARS:
+                answer = answer[:HISTORY_ANSWER_CHARS] + "\n[...truncated...]"
+            results.append(f"[SOURCE: session {hit['session']}]\nGeorge: {hit['question']}\nDigger: {answer}")
+        return "\n\n".join(results)
+
+    def load(self):
+        """
+        Load the index from disk, then replay the update log.
+
+        Returns:
+            bool: True if a valid index was loaded
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != HISTORY_VERSION:
+            return False  ## Old format - refresh() re-indexes everything
+
+        self.files = data.get("files", {})
+        self.docs = data.get("docs", {})
+        self.postings = data.get("postings", {})
+        self.generation = data.get("generation", 0)
+        self._replay_updates()
+        return True
+
+    def save(self):
+        """
+        Write the index to disk (temp file + rename) and clear the
+        update log.
+        """
+        data = {
+            "version": HISTORY_VERSION,
+            "generation": self.generation,
+            "files": self.files,
+            "docs": self.docs,
+            "postings": self.postings,
+        }
+
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+
+            ## Snapshot now contains every logged update
+            if self.updates_path.exists():
+                os.unlink(self.updates_path)
+            self.pending_updates = 0
+            self.has_snapshot = True
+        except OSError as e:
+            print(f"Warning: Could not save history index: {e}")
+
+    def get_stats(self):
+        """
+        Get statistics about the history index.
+
+        Returns:
+            dict: Sessions, answers and terms indexed
+        """
+        self.refresh()
+        return {
+            "sessions": len(self.files),
+            "answers": len(self.docs),
+            "indexed_terms": len(self.postings),
+        }
+
+    def _scan_files(self):
+        """
+        Find the session files to index.
+
+        Returns:
+            dict: filename -> os.stat_result
+        """
+        found = {}
+        for path in self.memory_dir.glob("session_*.jsonl"):
+            found[path.name] = path.stat()
+        for path in self.memory_dir.glob("session_*.txt"):
+            if path.with_suffix(".jsonl").name not in found:  ## Converted
+                found[path.name] = path.stat()
+        return {name: stat for name, stat in found.items() if not self._is_excluded(name)}
+
+    def _is_excluded(self, filename):
+        """
+        Check whether a file belongs to the session in progress.
+        """
+        return self.exclude is not None and _session_id(filename) == self.exclude
+
+    def _update_file(self, filename, stat):
+        """
+        Bring one session file's answers up to date.
+
+        Returns:
+            dict: Update record for the log, or None if unchanged
+        """
+        meta = self.files.get(filename)
+        if meta and meta["mtime"] == stat.st_mtime and meta["size"] == stat.st_size:
+            return None
+
+        appendable = (
+            meta and filename.endswith(".jsonl")
+            and meta["inode"] == stat.st_ino and stat.st_size >= meta["offset"]
+        )
+        existed = filename in self.files
+        if not appendable:
+            self._remove_file(filename)
+            meta = None
+        known = len(meta["docs"]) if meta else 0
+
+        if not self._index_file(filename, stat, meta):
+            if existed and not appendable:
+                return {"file": filename, "reset": True, "meta": None, "docs": {}}
+            return None
+
+        meta = self.files[filename]
+        return {
+            "file": filename,
+            "reset": not appendable,
+            "meta": meta,
+            "docs": {doc_id: self.docs[doc_id] for doc_id in meta["docs"][known:]},
+        }
+
+    def _log_updates(self, records):
+        """
+        Append update records to history_updates.jsonl.
+
+        Falls back to a full snapshot when there is none yet, or the
+        log has grown past HISTORY_MAX_PENDING_UPDATES.
+        """
+        if not self.has_snapshot or self.pending_updates + len(records) > HISTORY_MAX_PENDING_UPDATES:
+            self.save()
+            return
+
+        try:
+            with open(self.updates_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    record = dict(record, generation=self.generation)
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self.pending_updates += len(records)
+        except OSError as e:
+            print(f"Warning: Could not log history update: {e}")
+            self.save()
+
+    def _replay_updates(self):
+        """
+        Apply history_updates.jsonl on top of the loaded snapshot.
+
+        Records at or below the snapshot generation are already in it
+        (crash between snapshot and log cleanup) and are skipped.
+        """
+        try:
+            with open(self.updates_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+
+        snapshot = self.generation
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  ## Torn final write - ignore the rest
+
+            if record["generation"] <= snapshot:
+                continue
+
+            filename = record["file"]
+            if record["reset"]:
+                self._remove_file(filename)
+            for doc_id, doc in record["docs"].items():
+                self._add_doc(doc_id, doc["session"], doc["question"], doc["answer"])
+            if record["meta"] is not None:
+                self.files[filename] = record["meta"]
+            self.generation = record["generation"]
+            self.pending_updates += 1
+
+    def _index_file(self, filename, stat, meta):
+        """
+        Index a session file, or just what was appended since `meta`.
+
+        Args:
+            filename: Session file name
+            stat: Its os.stat_result
+            meta: Previous state to continue from, or None (whole file)
+
+        Returns:
+            bool: True if the file was read
+        """
+        filepath = self.memory_dir / filename
+        session_id = _session_id(filename)
+        meta = meta or {"offset": 0, "messages": 0, "question": "", "docs": []}
+
+        try:
+            if filename.endswith(".txt"):
+                records = read_legacy_session(filepath)
+                offset = stat.st_size
+            else:
+                records, offset = self._read_appended(filepath, meta["offset"])
+        except OSError:
+            return False
+
+        for record in records:
+            if record.get("type") != "message":
+                continue
+            meta["messages"] += 1
+            if record["role"] == "George":
+                meta["question"] = record["content"]
+            elif record["role"] == "Digger":
+                doc_id = f"{session_id}:{meta['messages']}"
+                self._add_doc(doc_id, session_id, meta["question"], record["content"])
+                meta["docs"].append(doc_id)
+
+        meta.update({"mtime": stat.st_mtime, "size": stat.st_size, "inode": stat.st_ino, "offset": offset})
+        self.files[filename] = meta
+        return True
+
+    def _read_appended(self, filepath, offset):
+        """
+        Read the complete journal lines after a byte offset.
+
+        A torn last line (still being written) is left for next time.
+
+        Returns:
+            tuple: (records, offset after the last complete line)
+        """
+        with open(filepath, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, offset + end
+
+    def _add_doc(self, doc_id, session_id, question, answer):
+        """
+        Add one answer to the postings.
+        """
+        terms = tokenize(f"{question}\n{answer}")
+        self.docs[doc_id] = {"session": session_id, "question": question, "answer": answer, "length": len(terms)}
+
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def _remove_file(self, filename):
+        """
+        Drop a file's answers from the index.
+        """
+        meta = self.files.pop(filename, None)
+        if not meta:
+            return
+
+        for doc_id in meta["docs"]:
+            doc = self.docs.pop(doc_id, None)
+            if not doc:
+                continue
+            for term in set(tokenize(f"{doc['question']}\n{doc['answer']}")):
+                postings = self.postings.get(term)
+                if postings:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+
+def _session_id(filename):
+    """
+    Session id from a file name ("session_<id>.jsonl" -> "<id>").
+    """
+    return Path(filename).stem.replace("session_", "", 1)
+
+
+## ============================================================
+## QUICK TEST - Run this file directly to search ./memory
+## ============================================================
+if __name__ == "__main__":
+    import sys
+    import time
+
+    memory_dir = sys.argv[1] if len(sys.argv) > 1 else "./memory"
+    query = " ".join(sys.argv[2:]) or "tcp"
+
+    history = HistoryIndex(memory_dir)
+    start = time.time()
+    history.refresh()
+    print(f"Indexed in {(time.time() - start) * 1000:.1f}ms: {history.get_stats()}")
+
+    start = time.time()
+    hits = history.search(query)
+    print(f"Search '{query}': {len(hits)} hits in {(time.time() - start) * 1000:.1f}ms")
+    print("=" * 50)
+    for hit in hits:
+        print(f"[{hit['session']}] ({hit['score']:.2f}) George: {hit['question'][:60]}")
+        print(f"  Digger: {hit['answer'][:150]}")
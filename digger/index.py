@@ -0,0 +1,1078 @@
+## ============================================================
+## INDEX.PY - Persistent inverted index for the knowledge base
+## ============================================================
+## Maps every term in the RAG .md files to the lines it appears on,
+## so a lookup only touches the postings for the query terms instead
+## of re-reading every file on every 'load'.
+##
+## ON DISK:
+##   RAG/.digger/index.json      - full snapshot
+##   {
+##     "version": 5,
+##     "epoch": "9f1c...",
+##     "generation": 7,
+##     "files":    {"6_Networking.md": {"mtime": ..., "size": ...,
+##                                      "sha1": ..., "lines": 412,
+##                                      "sections": [[0, 35, 0, "TCP"], ...],
+##                                      "chunker": {...}}},
+##     "postings": {"tcp": {"6_Networking.md": [12, 12, 40]}},
+##     "df":       {"tcp": 4}
+##   }
+##   RAG/.digger/updates.jsonl   - appended notes since the snapshot
+##
+## Postings hold ONE ENTRY PER OCCURRENCE (sorted line numbers), so
+## the same list answers "which lines" and "how many times".
+##
+## INCREMENTAL UPDATES:
+## - refresh() only re-tokenizes files whose mtime/size changed
+##   (and whose sha1 differs - a plain 'touch' is not a change)
+## - append_update() indexes just the bytes add_note() appended and
+##   logs them to updates.jsonl instead of rewriting the snapshot
+## - The log is folded into a new snapshot every MAX_PENDING_UPDATES
+##
+## "generation" goes up by one on every change, so callers can tell
+## when the knowledge base moved under them. It starts again at 1
+## whenever the index is built from scratch (index.json deleted, new
+## INDEX_VERSION), so each build also gets a random "epoch" - the pair
+## in RAGIndex.state names exactly one version of the index. Anything
+## derived from it (vectors, cached results) is checked against that.
+##
+## QUERIES:
+## match() evaluates query trees from query.py (AND / OR / phrase /
+## prefix) with set operations on postings - a complex query costs
+## about the same as a single word. Phrases are checked against the
+## text of their candidate lines only. A prefix expands to at most
+## MAX_PREFIX_TERMS words; when more match ("a*"), the ones in the most
+## sections (highest df) are kept, so rare words are what gets dropped.
+##
+## SECTIONS:
+## chunker.py splits each file into heading-scoped sections. Each is
+## stored as [start_line, token_count, start_byte, title], so pulling
+## a section out is a slice of the mmap'd file (read_sections()) -
+## only the bytes returned are copied and decoded, never the whole
+## file. "chunker" keeps the splitter's state so appends carry on.
+##
+## BM25 RANKING:
+## "df" counts the sections each term appears in, so rank() only
+## needs the postings of the query terms to score every section.
+##
+## The index lives in a hidden folder so the *.md glob never sees it.
+## ============================================================
+
+import os
+import re
+import glob
+import json
+import math
+import mmap
+import heapq
+import codecs
+import bisect
+import hashlib
+import uuid
+from pathlib import Path
+
+from digger.chunker import MarkdownChunker
+
+
+## ============================================================
+## INDEX SETTINGS
+## ============================================================
+INDEX_DIRNAME = ".digger"       ## Hidden folder inside the RAG dir
+INDEX_FILENAME = "index.json"   ## Postings + file signatures
+UPDATES_FILENAME = "updates.jsonl"  ## Appended notes since last snapshot
+INDEX_VERSION = 5               ## Bump when the on-disk format changes
+MAX_PENDING_UPDATES = 100       ## Fold the update log in after this many
+MAX_PREFIX_TERMS = 50           ## Cap on words a "hand*" prefix expands to (most common kept)
+
+## BM25 tuning (standard values)
+BM25_K1 = 1.5                   ## Term frequency saturation
+BM25_B = 0.75                   ## Section length normalisation
+
+## Terms are lowercase runs of letters/digits ("TCP/IP" -> tcp, ip)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase index terms.
+
+    Args:
+        text: Any string (a line, a query)
+
+    Returns:
+        list: Terms in order of appearance (duplicates kept)
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class RAGIndex:
+    """
+    On-disk inverted index over a RAG directory.
+
+    Example:
+        index = RAGIndex("./RAG")
+        index.refresh()                    # Load, re-index changed files
+        hits = index.lookup(["tcp"])       # {"6_Networking.md": [12, 40]}
+        best = index.rank(["tcp", "handshake"], limit=5)
+        hits = index.match(parse_query('tcp OR "three way"'))
+    """
+
+    def __init__(self, rag_dir="./RAG"):
+        """
+        Initialize the index (nothing is read until refresh/load).
+
+        Args:
+            rag_dir: Directory containing .md knowledge files
+        """
+        self.rag_dir = Path(rag_dir)
+        self.index_dir = self.rag_dir / INDEX_DIRNAME
+        self.index_path = self.index_dir / INDEX_FILENAME
+        self.updates_path = self.index_dir / UPDATES_FILENAME
+
+        ## files: filename -> {"mtime", "size", "sha1", "lines", "sections", "chunker"}
+        ## postings: term -> {filename: [line, line, ...]}
+        ## df: term -> number of sections containing it
+        self.files = {}
+        self.postings = {}
+        self.df = {}
+        self.epoch = None       ## New random id per full build
+        self.generation = 0
+
+        ## Derived from the above, rebuilt lazily after each change
+        self._section_starts = {}
+        self._corpus_stats = None
+        self._vocabulary = None
+        self.pending_updates = 0  ## Records in updates.jsonl
+        self.loaded = False
+
+        ## filename -> terms with postings in it, so removing a file
+        ## touches only its own terms (built once, then kept up to date)
+        self._file_terms = None
+
+    def refresh(self):
+        """
+        Make sure the index matches the files on disk.
+
+        Loads the saved index on first call, then re-tokenizes only
+        the files that were added or modified and drops deleted ones.
+        Only stat() calls are made when nothing changed.
+
+        Returns:
+            bool: True if anything was re-indexed
+        """
+        if not self.loaded:
+            if not self.load():
+                self._new_epoch()  ## Indexing from scratch
+            self.loaded = True
+
+        current = self._scan_files()
+        changed = False
+
+        ## Deleted files
+        for filename in set(self.files) - set(current):
+            self._remove_file(filename)
+            changed = True
+
+        ## New or modified files
+        for filename, signature in current.items():
+            indexed = self.files.get(filename)
+
+            if indexed:
+                if (indexed["mtime"], indexed["size"]) == (signature["mtime"], signature["size"]):
+                    continue
+
+                ## Same size, new mtime - check content before re-tokenizing
+                if indexed["size"] == signature["size"] and \
+                        indexed.get("sha1") == _hash_file(self.rag_dir / filename):
+                    indexed["mtime"] = signature["mtime"]
+                    changed = True
+                    continue
+
+                self._remove_file(filename)
+
+            self._add_file(filename)
+            changed = True
+
+        if changed:
+            self._bump_generation()
+            self.save()
+
+        return changed
+
+    def append_update(self, filename):
+        """
+        Index text that was just appended to a file (see add_note).
+
+        Only the new bytes are tokenized; the postings are extended in
+        place and logged to updates.jsonl. Falls back to re-indexing
+        the one file if it wasn't a clean append.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+        """
+        if not self.loaded:
+            self.refresh()
+
+        filepath = self.rag_dir / filename
+        indexed = self.files.get(filename)
+
+        if not indexed:
+            ## Brand new file - nothing to append to
+            new_postings, df_delta = self._add_file(filename)
+            self._log_update(filename, new_postings, df_delta)
+            return
+
+        try:
+            with open(filepath, "rb") as f:
+                if indexed["size"]:
+                    f.seek(indexed["size"] - 1)
+                    last_byte = f.read(1)
+                else:
+                    last_byte = b"\n"
+                appended = f.read()
+        except OSError as e:
+            print(f"Warning: Could not index {filename}: {e}")
+            return
+
+        ## bytes.splitlines() splits exactly like open() in text mode
+        lines = appended.splitlines(keepends=True)
+        first_byte = indexed["size"]
+
+        ## Old last line had no newline: the append must start by
+        ## ending it, otherwise words were glued together - re-index
+        if last_byte not in (b"\n", b"\r"):
+            if not lines or lines[0] not in (b"\n", b"\r\n", b"\r"):
+                self._remove_file(filename)
+                self._add_file(filename)
+                self._bump_generation()
+                self.save()
+                return
+            first_byte += len(lines[0])
+            lines = lines[1:]
+
+        chunker = MarkdownChunker(indexed.get("chunker"))
+        new_postings, df_delta = self._index_lines(
+            filename, lines, indexed["lines"], first_byte, indexed["sections"], chunker
+        )
+        indexed["chunker"] = chunker.state()
+
+        indexed["lines"] += len(lines)
+        indexed["size"] += len(appended)
+        indexed["mtime"] = _file_signature(filepath)["mtime"]
+        indexed["sha1"] = _hash_file(filepath)
+
+        self._log_update(filename, new_postings, df_delta)
+
+    def load(self):
+        """
+        Load the index snapshot from disk, then replay updates.jsonl.
+
+        Returns:
+            bool: True if a valid index was loaded
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != INDEX_VERSION or not data.get("epoch"):
+            return False  ## Old format - refresh() re-indexes everything
+
+        self.files = data.get("files", {})
+        self.postings = data.get("postings", {})
+        self.df = data.get("df", {})
+        self.epoch = data["epoch"]
+        self.generation = data.get("generation", 0)
+        self._replay_updates()
+        self._section_starts = {}
+        self._corpus_stats = None
+        self._vocabulary = None
+        self._file_terms = None
+        return True
+
+    def save(self):
+        """
+        Write a full snapshot to disk and clear the update log.
+
+        Written to a temp file then renamed, so a crash mid-write
+        never leaves a half-written index behind.
+        """
+        data = {
+            "version": INDEX_VERSION,
+            "epoch": self.epoch,
+            "generation": self.generation,
+            "files": self.files,
+            "postings": self.postings,
+            "df": self.df,
+        }
+
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+
+            ## Snapshot now contains every logged update
+            if self.updates_path.exists():
+                os.unlink(self.updates_path)
+            self.pending_updates = 0
+        except OSError as e:
+            print(f"Warning: Could not save RAG index: {e}")
+
+    def build(self):
+        """
+        Rebuild the whole index from the .md files.
+        """
+        self.files = {}
+        self.postings = {}
+        self.df = {}
+        self._file_terms = {}
+        self._new_epoch()
+
+        for filename in self._scan_files():
+            self._add_file(filename)
+
+        self._bump_generation()
+        self.loaded = True
+
+    def lookup(self, terms):
+        """
+        Find lines containing ALL of the given terms.
+
+        Args:
+            terms: List of terms (already tokenized)
+
+        Returns:
+            dict: filename -> sorted list of matching line numbers
+        """
+        if not terms:
+            return {}
+        hits = self.match(("all", list(terms)))
+        return {filename: sorted(lines) for filename, lines in hits.items()}
+
+    def match(self, query, by_section=False):
+        """
+        Evaluate a query tree (see query.py) against the postings.
+
+        Args:
+            query: Tree from parse_query()
+            by_section: Match whole sections instead of single lines,
+                        e.g. "tcp AND udp" anywhere in one section
+
+        Returns:
+            dict: filename -> set of matching line numbers
+                  (or section indexes if by_section)
+        """
+        kind = query[0]
+
+        if kind == "term":
+            return self._to_units(self.postings.get(query[1], {}), by_section)
+
+        if kind == "prefix":
+            hits = {}
+            for term in self.expand_prefix(query[1]):
+                _union(hits, self._to_units(self.postings[term], by_section))
+            return hits
+
+        if kind == "phrase":
+            ## Candidates hold every word; keep lines where they're adjacent
+            hits = {}
+            for filename, lines in self.match(("all", query[1])).items():
+                verified = self._phrase_lines(filename, lines, query[1])
+                if verified:
+                    hits[filename] = verified
+            return self._to_units(hits, by_section)
+
+        if kind == "or":
+            hits = {}
+            for child in query[1]:
+                _union(hits, self.match(child, by_section))
+            return hits
+
+        ## "all" / "and" - intersect, smallest first so the sets shrink fast
+        if kind == "all":
+            children = [("term", term) for term in dict.fromkeys(query[1])]
+        else:
+            children = query[1]
+
+        child_hits = [self.match(child, by_section) for child in children]
+        child_hits.sort(key=lambda hits: sum(len(units) for units in hits.values()))
+
+        hits = child_hits[0] if child_hits else {}
+        for other in child_hits[1:]:
+            hits = {
+                filename: units & other[filename]
+                for filename, units in hits.items()
+                if filename in other and units & other[filename]
+            }
+            if not hits:
+                break
+        return hits
+
+    def query_terms(self, query):
+        """
+        All index terms a query mentions, with prefixes expanded.
+
+        Used as the scoring terms for ranked search.
+
+        Args:
+            query: Tree from parse_query()
+
+        Returns:
+            list: Terms (deduplicated, in query order)
+        """
+        kind = query[0]
+        if kind == "term":
+            terms = [query[1]]
+        elif kind == "prefix":
+            terms = self.expand_prefix(query[1])
+        elif kind in ("all", "phrase"):
+            terms = list(query[1])
+        else:
+            terms = []
+            for child in query[1]:
+                terms.extend(self.query_terms(child))
+        return list(dict.fromkeys(terms))
+
+    def expand_prefix(self, prefix):
+        """
+        Find indexed terms starting with a prefix.
+
+        Args:
+            prefix: e.g. "hand"
+
+        Returns:
+            list: Up to MAX_PREFIX_TERMS terms, alphabetical - the
+                  highest-df ones if more than that match
+        """
+        vocabulary = self._get_vocabulary()
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + "\uffff", start)
+        terms = vocabulary[start:end]
+
+        if len(terms) > MAX_PREFIX_TERMS:
+            terms = sorted(heapq.nlargest(MAX_PREFIX_TERMS, terms, key=lambda term: self.df.get(term, 0)))
+        return terms
+
+    def rank(self, terms, limit=10, allowed=None):
+        """
+        Score sections against the terms with BM25.
+
+        Any term can contribute (OR semantics); sections containing
+        more, rarer terms score higher.
+
+        Args:
+            terms: List of terms (already tokenized)
+            limit: Number of sections to return
+            allowed: Optional filename -> set of section indexes
+                     (from match(..., by_section=True)) to rank within
+
+        Returns:
+            list: (score, filename, section_index) tuples, best first
+        """
+        section_count, token_count = self._get_corpus_stats()
+        if not section_count:
+            return []
+        avg_length = token_count / section_count or 1.0
+
+        scores = {}
+        for term in set(terms):
+            df = self.df.get(term)
+            if not df:
+                continue
+            idf = math.log(1 + (section_count - df + 0.5) / (df + 0.5))
+
+            for filename, lines in self.postings[term].items():
+                if allowed is not None and filename not in allowed:
+                    continue
+                starts = self._get_section_starts(filename)
+                sections = self.files[filename]["sections"]
+
+                ## Term frequency per section from the occurrence list
+                frequencies = {}
+                for line_no in lines:
+                    index = bisect.bisect_right(starts, line_no) - 1
+                    frequencies[index] = frequencies.get(index, 0) + 1
+
+                for index, tf in frequencies.items():
+                    if allowed is not None and index not in allowed[filename]:
+                        continue
+                    length_norm = 1 - BM25_B + BM25_B * sections[index][1] / avg_length
+                    score = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+                    key = (filename, index)
+                    scores[key] = scores.get(key, 0.0) + score
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+        return [(score, filename, index) for (filename, index), score in best]
+
+    def sections_for_lines(self, filename, lines):
+        """
+        Map line numbers to the sections containing them.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+            lines: Sorted line numbers
+
+        Returns:
+            list: Section indexes, in order, without duplicates
+        """
+        starts = self._get_section_starts(filename)
+        indexes = (bisect.bisect_right(starts, line_no) - 1 for line_no in lines)
+        return list(dict.fromkeys(indexes))
+
+    def section_span(self, filename, index):
+        """
+        Byte range and title of one section.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+            index: Section index within the file
+
+        Returns:
+            tuple: (start_byte, end_byte, title, is_continuation)
+                   is_continuation is True when the section was split
+                   off a long one and doesn't begin with its heading
+        """
+        sections = self.files[filename]["sections"]
+        start_line, _, start_byte, title = sections[index]
+        if index + 1 < len(sections):
+            end_byte = sections[index + 1][2]
+        else:
+            end_byte = self.files[filename]["size"]
+
+        ## Continuation chunks share the previous section's title
+        is_continuation = index > 0 and title and sections[index - 1][3] == title
+        return start_byte, end_byte, title, bool(is_continuation)
+
+    def section_text(self, filename, index, max_bytes=None):
+        """
+        Read one section straight from its byte offsets.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+            index: Section index within the file
+            max_bytes: Only read this much of the section
+
+        Returns:
+            str: Section text, or "" if the file can't be read
+        """
+        return self.read_sections(filename, [index], max_bytes).get(index, "")
+
+    def read_sections(self, filename, indexes, max_bytes=None):
+        """
+        Read several sections of one file with a single mmap.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+            indexes: Section indexes within the file
+            max_bytes: Only read this much of each section
+
+        Returns:
+            dict: section index -> text ({} if the file can't be read)
+        """
+        spans = {}
+        for index in indexes:
+            start_byte, end_byte = self.section_span(filename, index)[:2]
+            if max_bytes is not None:
+                end_byte = min(end_byte, start_byte + max_bytes)
+            spans[index] = (start_byte, end_byte)
+
+        raw = self._read_spans(filename, spans)
+        return {index: _decode(data) for index, data in raw.items()}
+
+    def _add_file(self, filename):
+        """
+        Tokenize one file and add its postings.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+
+        Returns:
+            tuple: (term -> [line, ...] added, term -> df change)
+        """
+        filepath = self.rag_dir / filename
+
+        try:
+            with open(filepath, "rb") as f:
+                raw = f.read()
+            signature = _file_signature(filepath)
+        except OSError as e:
+            print(f"Warning: Could not index {filename}: {e}")
+            return {}, {}
+
+        ## bytes.splitlines() splits exactly like open() in text mode
+        lines = raw.splitlines(keepends=True)
+
+        sections = []
+        chunker = MarkdownChunker()
+        new_postings, df_delta = self._index_lines(filename, lines, 0, 0, sections, chunker)
+
+        self.files[filename] = {
+            "mtime": signature["mtime"],
+            "size": len(raw),
+            "sha1": hashlib.sha1(raw).hexdigest(),
+            "lines": len(lines),
+            "sections": sections,
+            "chunker": chunker.state(),
+        }
+
+        return new_postings, df_delta
+
+    def _index_lines(self, filename, lines, first_line, first_byte, sections, chunker):
+        """
+        Tokenize lines into postings, sections and document frequencies.
+
+        Lines before the first section break continue the file's
+        last section (when appending); the chunker decides the breaks.
+
+        Args:
+            filename: File the lines belong to
+            lines: Raw byte lines (with line endings), in order
+            first_line: Line number of lines[0]
+            first_byte: Byte offset of lines[0] in the file
+            sections: The file's [start_line, token_count, start_byte,
+                      title] list, extended in place
+            chunker: MarkdownChunker positioned at lines[0]
+
+        Returns:
+            tuple: (term -> [line, ...] added, term -> df change)
+        """
+        old_section_count = len(sections)
+        extend_from = sections[-1][0] if sections else None
+
+        new_postings = {}
+        section_terms = []  ## One set per section touched, in order
+        texts = [line.decode("utf-8", errors="replace") for line in lines]
+        byte = first_byte
+
+        for offset, line in enumerate(texts):
+            line_no = first_line + offset
+            next_line = texts[offset + 1] if offset + 1 < len(texts) else None
+
+            if chunker.feed(line, next_line) or not sections:
+                sections.append([line_no, 0, byte, chunker.title])
+                section_terms.append(set())
+            elif not section_terms:
+                section_terms.append(set())  ## Continuing the old last section
+            byte += len(lines[offset])
+
+            terms = tokenize(line)
+            sections[-1][1] += len(terms)
+            section_terms[-1].update(terms)
+            for term in terms:
+                new_postings.setdefault(term, []).append(line_no)
+
+        ## Did the first touched section already exist?
+        extended = len(section_terms) > len(sections) - old_section_count
+
+        df_delta = {}
+        for position, terms in enumerate(section_terms):
+            for term in terms:
+                if position == 0 and extended:
+                    ## Already counted if the old section had it
+                    existing = self.postings.get(term, {}).get(filename)
+                    if existing and existing[-1] >= extend_from:
+                        continue
+                df_delta[term] = df_delta.get(term, 0) + 1
+
+        ## New line numbers are all past the old ones - lists stay sorted
+        for term, line_numbers in new_postings.items():
+            self.postings.setdefault(term, {}).setdefault(filename, []).extend(line_numbers)
+        self._apply_df(df_delta)
+        if self._file_terms is not None:
+            self._file_terms.setdefault(filename, set()).update(new_postings)
+
+        return new_postings, df_delta
+
+    def _remove_file(self, filename):
+        """
+        Drop a file's postings and signature.
+
+        Only the file's own terms are visited, not the vocabulary.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+        """
+        meta = self.files.pop(filename, None)
+        starts = [section[0] for section in meta["sections"]] if meta else []
+
+        df_delta = {}
+        for term in self._get_file_terms().pop(filename, ()):
+            postings = self.postings.get(term)
+            lines = postings.pop(filename, None) if postings else None
+            if lines is None:
+                continue
+
+            ## Sections of this file that counted towards df
+            sections_hit = {bisect.bisect_right(starts, line_no) for line_no in lines}
+            df_delta[term] = -len(sections_hit)
+
+            if not postings:
+                del self.postings[term]
+
+        self._apply_df(df_delta)
+
+    def _to_units(self, file_lines, by_section):
+        """
+        Convert line numbers to sets of lines or section indexes.
+
+        Args:
+            file_lines: filename -> iterable of line numbers
+            by_section: Map lines to section indexes
+
+        Returns:
+            dict: filename -> set of units
+        """
+        if not by_section:
+            return {filename: set(lines) for filename, lines in file_lines.items()}
+
+        units = {}
+        for filename, lines in file_lines.items():
+            starts = self._get_section_starts(filename)
+            units[filename] = {bisect.bisect_right(starts, line_no) - 1 for line_no in lines}
+        return units
+
+    def _phrase_lines(self, filename, lines, terms):
+        """
+        Keep the candidate lines where terms appear consecutively.
+
+        Only the candidate lines' text is tokenized.
+
+        Args:
+            filename: File the lines belong to
+            lines: Candidate line numbers (contain every term)
+            terms: Phrase terms, in order
+
+        Returns:
+            set: Line numbers containing the phrase
+        """
+        sections = self.files[filename]["sections"]
+        starts = self._get_section_starts(filename)
+        size = len(terms)
+        verified = set()
+
+        ## Only the sections holding candidates are read
+        wanted = {}
+        for line_no in lines:
+            index = bisect.bisect_right(starts, line_no) - 1
+            wanted.setdefault(index, []).append(line_no)
+
+        spans = {index: self.section_span(filename, index)[:2] for index in wanted}
+        raw = self._read_spans(filename, spans)
+
+        for index, data in raw.items():
+            section_lines = data.splitlines()
+            for line_no in wanted[index]:
+                offset = line_no - sections[index][0]
+                if offset >= len(section_lines):
+                    continue  ## File shrank since indexing
+                tokens = tokenize(_decode(section_lines[offset]))
+                if any(tokens[i:i + size] == terms for i in range(len(tokens) - size + 1)):
+                    verified.add(line_no)
+
+        return verified
+
+    def _read_spans(self, filename, spans):
+        """
+        Copy byte ranges out of a file through mmap.
+
+        The map is opened per call and closed straight after, so a
+        file rewritten between searches is never read through a
+        stale (or truncated) mapping.
+
+        Args:
+            filename: Name of .md file inside rag_dir
+            spans: key -> (start_byte, end_byte)
+
+        Returns:
+            dict: key -> bytes ({} if the file can't be read)
+        """
+        try:
+            with open(self.rag_dir / filename, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    return {key: b"" for key in spans}  ## Can't mmap empty files
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return {
+                        key: mapped[min(start, size):min(end, size)]
+                        for key, (start, end) in spans.items()
+                    }
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read {filename}: {e}")
+            return {}
+
+    def _get_vocabulary(self):
+        """
+        Sorted list of every indexed term (cached for prefix lookups).
+
+        Returns:
+            list: Terms, alphabetical
+        """
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def _get_file_terms(self):
+        """
+        Terms per file, built from the postings on first use.
+
+        Returns:
+            dict: filename -> set of terms
+        """
+        if self._file_terms is None:
+            self._file_terms = {}
+            for term, postings in self.postings.items():
+                for filename in postings:
+                    self._file_terms.setdefault(filename, set()).add(term)
+        return self._file_terms
+
+    def _apply_df(self, df_delta):
+        """
+        Add per-term changes to the document frequencies.
+
+        Args:
+            df_delta: term -> change in section count
+        """
+        for term, change in df_delta.items():
+            count = self.df.get(term, 0) + change
+            if count > 0:
+                self.df[term] = count
+            else:
+                self.df.pop(term, None)
+
+    @property
+    def state(self):
+        """
+        Identify the current contents of the index.
+
+        Returns:
+            tuple: (epoch, generation) - never repeats across rebuilds,
+                   unlike generation alone
+        """
+        return (self.epoch, self.generation)
+
+    def _new_epoch(self):
+        """
+        Start a fresh build: new epoch, generation counted from 0.
+        """
+        self.epoch = uuid.uuid4().hex
+        self.generation = 0
+
+    def _bump_generation(self):
+        """
+        Record that the index changed and drop derived caches.
+        """
+        self.generation += 1
+        self._section_starts = {}
+        self._corpus_stats = None
+        self._vocabulary = None
+
+    def _get_section_starts(self, filename):
+        """
+        Start lines of a file's sections (cached for bisect).
+
+        Returns:
+            list: Sorted start line numbers
+        """
+        starts = self._section_starts.get(filename)
+        if starts is None:
+            starts = [section[0] for section in self.files[filename]["sections"]]
+            self._section_starts[filename] = starts
+        return starts
+
+    def _get_corpus_stats(self):
+        """
+        Total sections and tokens across the knowledge base (cached).
+
+        Returns:
+            tuple: (section_count, token_count)
+        """
+        if self._corpus_stats is None:
+            section_count = 0
+            token_count = 0
+            for meta in self.files.values():
+                section_count += len(meta["sections"])
+                token_count += sum(section[1] for section in meta["sections"])
+            self._corpus_stats = (section_count, token_count)
+        return self._corpus_stats
+
+    def _log_update(self, filename, new_postings, df_delta):
+        """
+        Record an in-place update in updates.jsonl.
+
+        Args:
+            filename: File that was updated
+            new_postings: term -> [line, ...] that were added
+            df_delta: term -> change in section count
+        """
+        self._bump_generation()
+
+        if self.pending_updates >= MAX_PENDING_UPDATES:
+            self.save()  ## Fold everything into a fresh snapshot
+            return
+
+        ## No snapshot yet - the log would have nothing to apply to
+        if not self.index_path.exists():
+            self.save()
+            return
+
+        record = {
+            "epoch": self.epoch,
+            "generation": self.generation,
+            "file": filename,
+            "meta": self.files[filename],
+            "postings": new_postings,
+            "df": df_delta,
+        }
+
+        try:
+            with open(self.updates_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.pending_updates += 1
+        except OSError as e:
+            print(f"Warning: Could not log RAG index update: {e}")
+            self.save()
+
+    def _replay_updates(self):
+        """
+        Apply updates.jsonl on top of the loaded snapshot.
+
+        Records at or below the snapshot generation are already in it
+        (crash between snapshot and log cleanup) and are skipped, as
+        are records left over from an earlier build (other epoch).
+        """
+        try:
+            with open(self.updates_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  ## Torn final write - ignore the rest
+
+            if record.get("epoch") != self.epoch or record["generation"] <= self.generation:
+                continue
+
+            filename = record["file"]
+            for term, line_numbers in record["postings"].items():
+                self.postings.setdefault(term, {}).setdefault(filename, []).extend(line_numbers)
+            self._apply_df(record["df"])
+            self.files[filename] = record["meta"]
+            self.generation = record["generation"]
+            self.pending_updates += 1
+
+    def _scan_files(self):
+        """
+        Stat every .md file in the RAG directory.
+
+        Returns:
+            dict: filename -> {"mtime", "size"}
+        """
+        signatures = {}
+
+        for filepath in glob.glob(str(self.rag_dir / "*.md")):
+            try:
+                signatures[os.path.basename(filepath)] = _file_signature(filepath)
+            except OSError:
+                continue
+
+        return signatures
+
+
+def _union(hits, other):
+    """
+    Merge other into hits in place (set union per file).
+
+    Args:
+        hits: filename -> set, updated
+        other: filename -> set
+    """
+    for filename, units in other.items():
+        hits.setdefault(filename, set()).update(units)
+
+
+def _decode(data):
+    """
+    Decode UTF-8 bytes, dropping a character cut off at the end.
+
+    Sections trimmed with max_bytes can end mid-character; a plain
+    decode would turn that into a replacement char.
+
+    Args:
+        data: Bytes from _read_spans()
+
+    Returns:
+        str: Decoded text
+    """
+    return codecs.getincrementaldecoder("utf-8")(errors="replace").decode(data, final=False)
+
+
+def _file_signature(filepath):
+    """
+    Cheap change detector for a file.
+
+    Returns:
+        dict: {"mtime", "size"} from os.stat()
+    """
+    stat = os.stat(filepath)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def _hash_file(filepath):
+    """
+    SHA-1 of a file's contents (read in blocks).
+
+    Returns:
+        str: Hex digest, or "" if the file can't be read
+    """
+    digest = hashlib.sha1()
+    try:
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    except OSError:
+        return ""
+    return digest.hexdigest()
+
+
+## ============================================================
+## QUICK TEST - Run this file directly to build/inspect the index
+## ============================================================
+if __name__ == "__main__":
+    import sys
+    import time
+
+    rag_dir = sys.argv[1] if len(sys.argv) > 1 else "./RAG"
+
+    print("Testing RAG index...")
+    print("=" * 50)
+
+    index = RAGIndex(rag_dir)
+
+    start = time.time()
+    changed = index.refresh()
+    print(f"Refresh: {time.time() - start:.3f}s (re-indexed: {changed})")
+    print(f"Files: {len(index.files)} | Terms: {len(index.postings)}")
+
+    query = sys.argv[2] if len(sys.argv) > 2 else "tcp"
+    start = time.time()
+    hits = index.lookup(tokenize(query))
+    print(f"\nLookup '{query}': {time.time() - start:.4f}s")
+    for filename, lines in sorted(hits.items()):
+        print(f"  {filename}: {len(lines)} lines")
+
+    start = time.time()
+    ranked = index.rank(tokenize(query), limit=5)
+    print(f"\nBM25 '{query}': {time.time() - start:.4f}s")
+    for score, filename, section in ranked:
+        start_byte, end_byte, title, _ = index.section_span(filename, section)
+        print(f"  {score:6.2f}  {filename} [{title}] bytes {start_byte}-{end_byte}")
+
+    print("=" * 50)
@@ -0,0 +1,281 @@
+## ============================================================
+## JOURNAL.PY - Write-behind JSON Lines journal for sessions
+## ============================================================
+## Session decides WHAT to record; this does the disk I/O.
+##
+## WRITE-BEHIND (background=True):
+## append() and rewrite() only put the record on a queue and return,
+## so the REPL goes straight from Enter to the model request. A
+## writer thread drains the queue in batches of up to
+## WRITE_BATCH_MAX records - one write() + flush per batch.
+## The queue is bounded (WRITE_QUEUE_MAX); if the disk falls that far
+## behind, append() waits instead of growing memory forever.
+##
+## CRASH SAFETY:
+## - Appends only ever add whole lines; a crash can at worst leave a
+##   torn last line, which read_journal() reports and skips
+## - rewrite() (compaction) writes a temp file, fsyncs it, then
+##   renames it over the journal - old file or new, never half
+## - flush() waits for the queue to drain; close() also fsyncs
+##
+## FSYNC POLICY:
+##   "always"   - fsync after every batch
+##   "interval" - fsync at most every FSYNC_INTERVAL seconds + on flush
+##   "never"    - leave it to the OS
+## ============================================================
+
+import os
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+
+
+## ============================================================
+## JOURNAL SETTINGS
+## ============================================================
+FSYNC_POLICIES = ("always", "interval", "never")
+FSYNC_INTERVAL = 1.0          ## Seconds between fsyncs ("interval")
+WRITE_BATCH_MAX = 64          ## Records per write() in the writer thread
+WRITE_QUEUE_MAX = 1024        ## Pending records before append() waits
+
+
+def read_journal(filepath):
+    """
+    Read every record from a journal file.
+
+    Args:
+        filepath: Path to a .jsonl journal
+
+    Returns:
+        tuple: (list of record dicts, torn) - torn is True if a line
+               was half-written (skipped) or the file lacks its final
+               newline, so it needs a rewrite before appending
+
+    Raises:
+        OSError: File missing or unreadable
+    """
+    records = []
+    torn = False
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                torn = True  ## Half-written line from a crash
+                continue
+            torn = torn or not line.endswith("\n")
+
+    return records, torn
+
+
+class JournalWriter:
+    """
+    Appends JSON records to a file, inline or from a writer thread.
+
+    Example:
+        writer = JournalWriter("memory/session_x.jsonl", background=True)
+        writer.append({"type": "message", "role": "George", "content": "hi"})
+        writer.close()   # drains the queue and fsyncs
+    """
+
+    def __init__(self, filepath, fsync="interval", background=False):
+        """
+        Initialize the writer (the file is opened on first write).
+
+        Args:
+            filepath: Journal path
+            fsync: "always", "interval" or "never"
+            background: Write from a thread instead of inline
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.filepath = Path(filepath)
+        self.fsync = fsync
+        self.background = background
+
+        self._file = None
+        self._last_fsync = 0.0
+        self._io_lock = threading.Lock()  ## One batch on disk at a time
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_MAX)
+        self._thread = None
+
+    def append(self, record):
+        """
+        Add one record to the end of the journal.
+
+        Args:
+            record: JSON-serialisable dict
+        """
+        self._submit(("append", record))
+
+    def rewrite(self, records):
+        """
+        Replace the whole journal with these records (atomically).
+
+        Queued like appends, so it lands after everything before it.
+
+        Args:
+            records: List of record dicts
+        """
+        self._submit(("rewrite", records))
+
+    def flush(self):
+        """
+        Wait until every queued record is written, then fsync.
+
+        Skips the fsync only under the "never" policy.
+        """
+        if self.background and self._thread:
+            self._queue.join()
+
+        with self._io_lock:
+            self._sync(force=True)
+
+    def close(self):
+        """
+        Flush, stop the writer thread and close the file.
+
+        Later writes reopen it, so calling this twice is harmless.
+        """
+        self.flush()
+
+        if self._thread:
+            self._queue.put(None)  ## Stop marker
+            self._thread.join()
+            self._thread = None
+
+        with self._io_lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _submit(self, op):
+        """
+        Write an operation now, or queue it for the writer thread.
+        """
+        if not self.background:
+            self._write_batch([op])
+            return
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+            self._thread.start()
+        self._queue.put(op)
+
+    def _run(self):
+        """
+        Writer thread: drain the queue in bounded batches.
+        """
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            self._write_batch([op for op in batch if op is not None])
+            for _ in batch:
+                self._queue.task_done()
+
+            if stop:
+                return
+
+    def _write_batch(self, ops):
+        """
+        Apply a batch of operations to disk.
+
+        Args:
+            ops: ("append", record) / ("rewrite", records) tuples, in order
+        """
+        with self._io_lock:
+            try:
+                lines = []
+                for kind, payload in ops:
+                    if kind == "append":
+                        lines.append(json.dumps(payload, ensure_ascii=False) + "\n")
+                    else:
+                        self._write_lines(lines)
+                        lines = []
+                        self._replace(payload)
+                self._write_lines(lines)
+                self._sync()
+            except OSError as e:
+                print(f"Warning: Could not save session: {e}")
+
+    def _write_lines(self, lines):
+        """
+        Append lines with one write() + flush.
+        """
+        if not lines:
+            return
+        if self._file is None:
+            self._file = open(self.filepath, "a", encoding="utf-8")
+        self._file.write("".join(lines))
+        self._file.flush()
+
+    def _replace(self, records):
+        """
+        Rewrite the journal: temp file, fsync, rename over the old one.
+        """
+        if self._file:
+            self._file.close()
+            self._file = None
+
+        tmp_path = self.filepath.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.fsync != "never":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+
+    def _sync(self, force=False):
+        """
+        fsync the open file according to the policy.
+
+        Args:
+            force: Sync now unless the policy is "never"
+        """
+        if self.fsync == "never" or not self._file:
+            return
+
+        now = time.monotonic()
+        if force or self.fsync == "always" or now - self._last_fsync >= FSYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+
+## ============================================================
+## QUICK TEST - Run this file directly to time inline vs write-behind
+## ============================================================
+if __name__ == "__main__":
+    import tempfile
+
+    count = 2000
+    print(f"Journal benchmark: {count} appends")
+    print("=" * 50)
+
+    for fsync in FSYNC_POLICIES:
+        for background in (False, True):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                writer = JournalWriter(Path(tmpdir) / "journal.jsonl", fsync=fsync, background=background)
+                start = time.time()
+                for i in range(count):
+                    writer.append({"type": "message", "role": "George", "content": f"question {i}"})
+                queued = time.time() - start
+                writer.close()
+                total = time.time() - start
+
+                records, torn = read_journal(writer.filepath)
+                assert len(records) == count and not torn
+                mode = "write-behind" if background else "inline"
+                print(f"  {fsync:>8} {mode:>12}: {queued * 1e6 / count:7.1f} us/append, {total:.3f}s to disk")
+
+    print("=" * 50)
@@ -3,10 +3,32 @@
 ## ============================================================
 ## Handles communication with Ollama LLM.
 ##
-## PERFORMANCE NOTE:
-## Subprocess is 2-3x faster than HTTP API.
-## Direct pipe avoids serialization overhead.
-## Streaming remains native-like.
+## TRANSPORTS (config: ollama_transport):
+## - "subprocess": `ollama run <model>` per turn, context on stdin.
+##   Needs only the ollama binary, but pays process spawn + CLI
+##   startup + model attach every turn.
+## - "http": streams /api/generate from the Ollama server over a
+##   pooled keep-alive connection (requests.Session), so each turn
+##   is one request on an already-open socket.
+##
+## Compare time-to-first-token for both on your machine:
+##   python -m digger.ollama mistral --bench
+##
+## INCREMENTAL TURNS (http, ollama_reuse_context):
+## /api/generate returns a "context" token array - the prompt and
+## reply as the model saw them. When the next context is the last
+## one plus our reply plus a new turn, only the new turn is sent,
+## with those tokens, so the server prefills just the new text
+## instead of the whole system prompt + RAG + transcript again.
+## Anything else - new RAG knowledge, trimmed history, an
+## interrupted reply - falls back to sending the full context.
+##
+## WARM-UP / KEEP-ALIVE:
+## start_warm_up() asks the server to load the model in a background
+## thread (an /api/generate with no prompt), so the load happens while
+## the CLI starts up instead of inside the first question. keep_alive
+## ("30m", "-1" = forever) goes with every request so the model isn't
+## evicted between turns.
 ##
 ## STDIN DEADLOCK FIX:
 ## process.stdin.write(context + "\n")
@@ -14,10 +36,63 @@
 ## process.stdin.close()   # <-- Critical!
 ##
 ## This eliminates readline() deadlock.
+##
+## STREAMING:
+## stream() yields text pieces as they arrive - chat() prints them,
+## other callers (voice, logging) can consume the same generator.
+## The subprocess pipe is read in chunks of whatever is available
+## (one syscall per chunk, not per byte) through an incremental
+## UTF-8 decoder, so a multi-byte character split across two reads
+## comes out whole instead of as replacement chars.
 ## ============================================================
 
+import os
+import json
+import time
+import codecs
+import threading
 import subprocess
 import sys
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+## ============================================================
+## OLLAMA SETTINGS
+## ============================================================
+TRANSPORTS = ("subprocess", "http")
+DEFAULT_TRANSPORT = "subprocess"
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+DEFAULT_OLLAMA_PORT = 11434   ## For OLLAMA_HOST values without one
+READ_CHUNK_BYTES = 4096       ## Max bytes per pipe read (returns early)
+MAX_REPLY_OFFSET = 64         ## Max chars before our reply in a continuation ("\nDigger: ")
+CONNECT_TIMEOUT = 5           ## Seconds to reach the server
+READ_TIMEOUT = 300            ## Seconds between streamed chunks (model load)
+
+
+def normalize_host(host):
+    """
+    Turn an OLLAMA_HOST value into a base URL.
+
+    OLLAMA_HOST is often just "host:port", or only a host
+    ("0.0.0.0" to expose the server) - add the scheme, and Ollama's
+    port if none was given. A full URL keeps its scheme's port, as
+    with Ollama's own client.
+
+    Args:
+        host: e.g. "0.0.0.0", "127.0.0.1:11434" or "http://localhost:11434/"
+
+    Returns:
+        str: e.g. "http://0.0.0.0:11434"
+    """
+    if "://" not in host:
+        host = f"http://{host}"
+        parts = urlsplit(host)
+        if parts.port is None:
+            host = parts._replace(netloc=f"{parts.netloc}:{DEFAULT_OLLAMA_PORT}").geturl()
+    return host.rstrip("/")
 
 
 class OllamaClient:
@@ -28,43 +103,309 @@ class OllamaClient:
         ollama = OllamaClient(model="mistral")
         response = ollama.chat("What is TCP?")
         print(response)
+
+        ollama = OllamaClient(model="mistral", transport="http")  # Server API
     """
 
-    def __init__(self, model="mistral"):
+    def __init__(self, model="mistral", transport=DEFAULT_TRANSPORT, host=DEFAULT_OLLAMA_HOST,
+                 reuse_context=True, keep_alive=None):
         """
         Initialize Ollama client.
 
         Args:
             model: Ollama model name (e.g., "mistral", "llama3")
+            transport: "subprocess" (ollama run) or "http" (server API)
+            host: Ollama server URL for the http transport
+            reuse_context: http only - send just the new turn when the
+                           context continues the last one (see header)
+            keep_alive: How long the server keeps the model loaded
+                        after a request, e.g. "30m" (default: server's)
         """
-        self.model = model
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown Ollama transport: {transport}")
 
-    def chat(self, context, stream=True):
+        self.model = model
+        self.transport = transport
+        self.host = normalize_host(host)
+        self.reuse_context = reuse_context
+        self.keep_alive = keep_alive
+        self.warm_up_thread = None
+
+        ## Last completed http turn: {"context", "reply", "tokens"}
+        self.conversation = None
+        self.reply_tokens = None  ## "context" from the last done line
+
+        ## Prompt stats of the last http turn ("incremental" or "full",
+        ## chars sent, server prompt_eval_count / prompt_eval_ms)
+        self.last_stats = {}
+
+        ## One kept-alive connection, reused every turn
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+    def chat(self, context, stream=True, on_piece=None):
         """
         Send context to model and get response.
 
         Args:
             context: Full context string (RAG + conversation)
             stream: If True, print response as it arrives
+            on_piece: Optional callable given each piece as it arrives
+                      (e.g. SpeechPipeline.feed)
 
         Returns:
             str: Complete response text
         """
+        ## Collect pieces in a list - one join at the end, not a
+        ## string copy per piece
+        pieces = []
+
+        for piece in self.stream(context):
+            pieces.append(piece)
+            if stream:
+                sys.stdout.write(piece)
+                sys.stdout.flush()
+            if on_piece:
+                on_piece(piece)
+
+        return "".join(pieces).strip()
+
+    def stream(self, context):
+        """
+        Send context to model and yield the response as it arrives.
+
+        Errors are printed (with a hint) and end the stream, like chat().
+
+        Args:
+            context: Full context string (RAG + conversation)
+
+        Yields:
+            str: Pieces of response text, in order
+
+        Example:
+            for piece in ollama.stream(context):
+                print(piece, end="", flush=True)
+        """
         if not context or not context.strip():
-            return ""
+            return
 
         try:
-            ## Start ollama process
-            ## bufsize=0 for unbuffered char-by-char streaming
-            process = subprocess.Popen(
-                ["ollama", "run", self.model],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=False,  ## Binary mode for char-by-char
-                bufsize=0    ## Unbuffered
+            yield from self._stream(context)
+
+        except FileNotFoundError:
+            print("[Error: Ollama not installed. Visit https://ollama.ai]")
+
+        except requests.ConnectionError:
+            print("\n[Error: Ollama not running]")
+            print("[Run: ollama serve]")
+
+        except Exception as e:
+            print(f"[Ollama error: {e}]")
+
+    def _stream(self, context):
+        """
+        Stream the reply with the configured transport.
+
+        Args:
+            context: Full context string
+
+        Yields:
+            str: Pieces of response text as they arrive
+        """
+        if self.transport == "http":
+            return self._stream_conversation(context)
+        return self._stream_subprocess(context)
+
+    def warm_up(self):
+        """
+        Load the model into memory without generating anything.
+
+        Returns:
+            bool: True if the server loaded (or already had) the model
+        """
+        payload = {"model": self.model}
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+
+        try:
+            response = self.session.post(
+                f"{self.host}/api/generate",
+                json=payload,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
             )
+            return response.status_code == 200
+        except requests.RequestException:
+            return False  ## Server down - the first chat() will say so
 
+    def start_warm_up(self):
+        """
+        Run warm_up() in a background thread.
+
+        Returns:
+            threading.Thread: The (daemon) warm-up thread
+        """
+        self.warm_up_thread = threading.Thread(target=self.warm_up, name="ollama-warm-up", daemon=True)
+        self.warm_up_thread.start()
+        return self.warm_up_thread
+
+    def reset_conversation(self):
+        """
+        Forget the server-side tokens; the next turn sends everything.
+        """
+        self.conversation = None
+
+    def _stream_conversation(self, context):
+        """
+        Stream an http reply, sending only the new turn when possible.
+
+        Args:
+            context: Full context string
+
+        Yields:
+            str: Pieces of response text as they arrive
+        """
+        prompt, tokens = self._continuation(context)
+
+        ## Invalid until this turn completes - Ctrl+C means full rebuild
+        self.conversation = None
+        self.last_stats = {
+            "mode": "incremental" if tokens else "full",
+            "prompt_chars": len(prompt),
+        }
+
+        self.reply_tokens = None
+
+        pieces = []
+        for piece in self._stream_http(prompt, tokens):
+            pieces.append(piece)
+            yield piece
+
+        if self.reuse_context and self.reply_tokens:
+            self.conversation = {
+                "context": context,
+                "reply": "".join(pieces).strip(),
+                "tokens": self.reply_tokens,
+            }
+
+    def _continuation(self, context):
+        """
+        Work out what to send for this context.
+
+        Incremental only if the context is the last one, then our
+        reply (after a short role label), then something new.
+
+        Args:
+            context: Full context string
+
+        Returns:
+            tuple: (prompt, tokens) - tokens is None for a full send
+        """
+        last = self.conversation
+        if not self.reuse_context or not last or not last["reply"]:
+            return context, None
+        if not context.startswith(last["context"]):
+            return context, None  ## Earlier text changed (e.g. new RAG)
+
+        added = context[len(last["context"]):]
+        offset = added.find(last["reply"])
+        if offset < 0 or offset > MAX_REPLY_OFFSET:
+            return context, None  ## Our reply isn't next - can't continue
+
+        new_turn = added[offset + len(last["reply"]):].strip()
+        if not new_turn:
+            return context, None
+        return new_turn, last["tokens"]
+
+    def _stream_http(self, prompt, tokens=None):
+        """
+        Stream a reply from the server's /api/generate endpoint.
+
+        The server sends one JSON object per line; each carries the
+        next bit of text in "response" until "done" is true. The done
+        line's "context" lands in self.reply_tokens and its prompt
+        timings in self.last_stats.
+
+        Args:
+            prompt: Text to send
+            tokens: "context" tokens from an earlier reply to continue
+
+        Yields:
+            str: Pieces of response text as they arrive
+
+        Raises:
+            requests.RequestException: Server unreachable or errored
+        """
+        payload = {"model": self.model, "prompt": prompt, "stream": True}
+        if tokens:
+            payload["context"] = tokens
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+
+        response = self.session.post(
+            f"{self.host}/api/generate",
+            json=payload,
+            stream=True,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+
+        with response:
+            if response.status_code == 404:
+                print(f"\n[Error: Model '{self.model}' not found]")
+                print(f"[Run: ollama pull {self.model}]")
+                return
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+
+                if data.get("error"):
+                    print(f"\n[Ollama error: {data['error']}]")
+                    return
+
+                if data.get("response"):
+                    yield data["response"]
+
+                if data.get("done"):
+                    self.reply_tokens = data.get("context")
+                    self.last_stats["prompt_eval_count"] = data.get("prompt_eval_count")
+                    if data.get("prompt_eval_duration") is not None:
+                        self.last_stats["prompt_eval_ms"] = data["prompt_eval_duration"] / 1e6
+
+                ## After "done" the loop still reads to the end of the
+                ## stream, so the connection goes back to the pool
+
+    def _stream_subprocess(self, context):
+        """
+        Stream a reply from an `ollama run` process.
+
+        Args:
+            context: Full context string
+
+        Yields:
+            str: Pieces of response text as they arrive
+
+        Raises:
+            FileNotFoundError: ollama binary not installed
+        """
+        ## Start ollama process
+        ## bufsize=0 so nothing sits in a Python-side buffer
+        command = ["ollama", "run", self.model]
+        if self.keep_alive:
+            command += ["--keepalive", self.keep_alive]
+
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=False,  ## Binary mode - decoded incrementally below
+            bufsize=0    ## Unbuffered
+        )
+
+        try:
             ## ============================================
             ## CRITICAL: stdin flush fix for deadlock
             ## ============================================
@@ -72,19 +413,21 @@ class OllamaClient:
             process.stdin.flush()
             process.stdin.close()
 
-            ## Collect response
-            response = ""
-
-            ## Stream output CHARACTER BY CHARACTER (typing effect)
+            ## Stream output in chunks: os.read returns whatever is in
+            ## the pipe (up to READ_CHUNK_BYTES) as soon as there's any
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            stdout_fd = process.stdout.fileno()
             while True:
-                char = process.stdout.read(1)
-                if not char:
+                chunk = os.read(stdout_fd, READ_CHUNK_BYTES)
+                if not chunk:
                     break
-                decoded = char.decode('utf-8', errors='replace')
-                response += decoded
-                if stream:
-                    sys.stdout.write(decoded)
-                    sys.stdout.flush()
+                text = decoder.decode(chunk)  ## Holds back a split character
+                if text:
+                    yield text
+
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
 
             ## Wait for process to complete
             process.wait()
@@ -94,15 +437,11 @@ class OllamaClient:
             if stderr_output:
                 self._handle_stderr(stderr_output)
 
-            return response.strip()
-
-        except FileNotFoundError:
-            print("[Error: Ollama not installed. Visit https://ollama.ai]")
-            return ""
-
-        except Exception as e:
-            print(f"[Ollama error: {e}]")
-            return ""
+        finally:
+            ## Caller stopped early (Ctrl+C) - don't leave it running
+            if process.poll() is None:
+                process.kill()
+                process.wait()
 
     def _handle_stderr(self, stderr_output):
         """
@@ -255,6 +594,50 @@ class OllamaClient:
             return False
 
 
+def benchmark_ttft(clients, context, runs=3):
+    """
+    Time-to-first-token and total time for each client.
+
+    Each client streams the same context `runs` times; the median is
+    reported so one cold model load doesn't skew the result.
+
+    Args:
+        clients: dict label -> OllamaClient
+        context: Prompt to send
+        runs: Replies per client
+
+    Returns:
+        dict: label -> {"ttft_ms": float, "total_ms": float, "chars": int}
+              (ttft_ms is None if the client produced no text)
+    """
+    results = {}
+
+    for label, client in clients.items():
+        ttfts = []
+        totals = []
+        chars = 0
+
+        for _ in range(runs):
+            started = time.perf_counter()
+            first = None
+            chars = 0
+            for piece in client.stream(context):
+                if first is None:
+                    first = time.perf_counter()
+                chars += len(piece)
+            totals.append((time.perf_counter() - started) * 1000)
+            if first is not None:
+                ttfts.append((first - started) * 1000)
+
+        results[label] = {
+            "ttft_ms": sorted(ttfts)[len(ttfts) // 2] if ttfts else None,
+            "total_ms": sorted(totals)[len(totals) // 2],
+            "chars": chars,
+        }
+
+    return results
+
+
 ## ============================================================
 ## QUICK TEST - Run this file directly to test Ollama
 ## ============================================================
@@ -263,9 +646,20 @@ if __name__ == "__main__":
     print("=" * 50)
 
     ## Use mistral by default
-    model = sys.argv[1] if len(sys.argv) > 1 else "mistral"
+    model = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith("--") else "mistral"
     ollama = OllamaClient(model=model)
 
+    ## Transport benchmark: python -m digger.ollama mistral --bench
+    if "--bench" in sys.argv:
+        host = os.environ.get("OLLAMA_HOST", DEFAULT_OLLAMA_HOST)
+        clients = {transport: OllamaClient(model, transport, host) for transport in TRANSPORTS}
+        print(f"\n--- Time to first token ({model}, median of 3) ---")
+        for label, result in benchmark_ttft(clients, "Say hello in 5 words or less").items():
+            ttft = f"{result['ttft_ms']:.0f}ms" if result["ttft_ms"] is not None else "n/a"
+            print(f"  {label:<11} first token {ttft:>7} | total {result['total_ms']:.0f}ms")
+        print("=" * 50)
+        sys.exit(0)
+
     ## List models
     print("\n--- Available Models ---")
     print(ollama.list_models())
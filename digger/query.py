@@ -0,0 +1,117 @@
+## ============================================================
+## QUERY.PY - Query parser for RAG search
+## ============================================================
+## Turns the text after 'load' into a small query tree that
+## RAGIndex.match() evaluates with postings-list set operations.
+##
+## SYNTAX:
+##   tcp handshake          both words (bag of words)
+##   tcp AND handshake      both words, explicitly
+##   tcp OR udp             either word
+##   "three way handshake"  exact phrase (on one line)
+##   hand*                  any word starting with "hand"
+##
+## OR binds loosest: "tcp handshake OR udp" = (tcp AND handshake) OR udp
+## Operators must be UPPERCASE - lowercase "or" is just a word.
+##
+## QUERY TREE (plain tuples):
+##   ("all", ["tcp", "handshake"])   bare words only
+##   ("term", "tcp")
+##   ("prefix", "hand")
+##   ("phrase", ["three", "way", "handshake"])
+##   ("and", [node, node, ...])
+##   ("or", [node, node, ...])
+## ============================================================
+
+import re
+
+from digger.index import tokenize
+
+
+## Quoted phrases (closing quote optional) or bare words
+QUERY_TOKEN_PATTERN = re.compile(r'"[^"]*"?|\S+')
+
+
+def parse_query(text):
+    """
+    Parse a search topic into a query tree.
+
+    Args:
+        text: Raw topic, e.g. 'tcp OR "three way handshake"'
+
+    Returns:
+        tuple: Query tree (see header), or None if nothing searchable
+    """
+    groups = [[]]        ## Atoms of each OR branch
+    explicit = [False]   ## Branch used an explicit AND
+
+    for token in QUERY_TOKEN_PATTERN.findall(text or ""):
+        if token == "OR":
+            groups.append([])
+            explicit.append(False)
+            continue
+        if token == "AND":
+            explicit[-1] = True
+            continue
+
+        if token.startswith('"'):
+            atom = _words_atom(tokenize(token.strip('"')))
+        elif token.endswith("*") and len(tokenize(token)) == 1:
+            atom = ("prefix", tokenize(token)[0])
+        else:
+            atom = _words_atom(tokenize(token))
+
+        if atom:
+            groups[-1].append(atom)
+
+    branches = []
+    for atoms, is_explicit in zip(groups, explicit):
+        if not atoms:
+            continue
+        if not is_explicit and all(atom[0] == "term" for atom in atoms):
+            branches.append(("all", [atom[1] for atom in atoms]))
+        elif len(atoms) == 1:
+            branches.append(atoms[0])
+        else:
+            branches.append(("and", atoms))
+
+    if not branches:
+        return None
+    if len(branches) == 1:
+        return branches[0]
+    return ("or", branches)
+
+
+def is_plain(query):
+    """
+    Check whether a query is just bare words (no operators).
+
+    Ranked search scores bare words freely; anything else also
+    filters sections to those that satisfy the query.
+
+    Args:
+        query: Query tree from parse_query()
+
+    Returns:
+        bool: True for ("all", [...]) queries
+    """
+    return query is not None and query[0] == "all"
+
+
+def _words_atom(terms):
+    """
+    Build the atom for one word or quoted string.
+
+    "TCP/IP" tokenizes to two terms, so it becomes a phrase.
+
+    Args:
+        terms: Tokenized word(s)
+
+    Returns:
+        tuple: ("term", t), ("phrase", [...]) or None if empty
+    """
+    if not terms:
+        return None
+    if len(terms) == 1:
+        return ("term", terms[0])
+    return ("phrase", terms)
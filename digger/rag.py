@@ -3,28 +3,75 @@
 ## ============================================================
 ## Searches knowledge base (.md files) for relevant content.
 ##
+## Lookups go through the inverted index in index.py, so only files
+## that actually contain the query terms are opened. Results are whole
+## markdown sections (see chunker.py) read by byte offset - no tables
+## or headings cut in half.
+##
+## SEARCH MODES:
+## - "bm25":    Rank heading-scoped sections by BM25, best first
+## - "keyword": Sections with lines matching the query, by file name
+## - "vector":  Sections closest in meaning (embeddings, vectors.py)
+## - "hybrid":  bm25 and vector run side by side, merged with
+##              reciprocal rank fusion (RRF)
+##
+## Topics support AND / OR / "phrases" / prefix* (see query.py).
+##
 ## BOUNDS LIMITS (prevent context overflow):
 ## - MAX_MATCHES_PER_FILE: Max matching sections per file
-## - MAX_CONTEXT_LINES: Lines of context around each match
 ## - APPROX_CHAR_LIMIT: Total character limit (~2000 tokens)
 ## - MAX_FILES: Maximum number of files to include
+## - MAX_SECTIONS: Maximum ranked sections (bm25 mode)
+## - MAX_SECTION_CHARS: Cap per section
 ##
 ## These limits prevent small models from choking on huge context.
+##
+## RESULT CACHE:
+## Repeat searches come from an LRU cache (cache.py) keyed on the
+## parsed query, mode, limits and index state - any file edit, add_note()
+## or index rebuild makes old entries unreachable. Optionally saved to
+## RAG/.digger/query_cache.json (by close() at exit) so it survives
+## restarts.
+##
+## PAST ANSWERS (optional):
+## Given a HistoryIndex (history.py), the best matching answers from
+## earlier sessions are added after the knowledge base results. They
+## are looked up on every search, outside the cache, so a new answer
+## shows up straight away.
+##
+## TIMINGS:
+## Every search records per-stage milliseconds in self.timings
+## (refresh, cache, lexical, vector, fuse, read, history, total); the CLI prints
+## them after 'load'.
 ## ============================================================
 
-import os
-import glob
-import re
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from digger.index import RAGIndex, INDEX_VERSION
+from digger.cache import QueryCache, QUERY_CACHE_FILENAME, QUERY_CACHE_SIZE
+from digger.query import parse_query, is_plain
+from digger.vectors import VectorIndex, OllamaEmbedder
+
 
 ## ============================================================
 ## BOUNDS LIMITS - Prevent context overflow
 ## ============================================================
 MAX_MATCHES_PER_FILE = 3      ## Max matching sections per file
-MAX_CONTEXT_LINES = 5         ## Lines before/after each match
 APPROX_CHAR_LIMIT = 8000      ## ~2000 tokens max total
 MAX_FILES = 5                 ## Max files to include in results
+MAX_SECTIONS = 6              ## Max ranked sections in results
+MAX_SECTION_CHARS = 2500      ## One huge section can't eat the budget
+
+## Search modes
+SEARCH_MODES = ("bm25", "keyword", "vector", "hybrid")
+DEFAULT_MODE = "bm25"
+
+## Hybrid mode
+HYBRID_CANDIDATES = 20        ## Top-k taken from each retriever
+RRF_K = 60                    ## Fusion damping - standard RRF constant
 
 
 class RAGSearch:
@@ -35,26 +82,77 @@ class RAGSearch:
         rag = RAGSearch("./RAG")
         results = rag.search("TCP")
         print(results)
+
+        rag.search("TCP handshake", mode="keyword")  # Exact-line matching
+        rag.search('"three way handshake" OR syn*')  # Boolean query
+        rag.search("firewall rules", mode="vector")  # Finds "ACL" too
+        rag.search("ACL syntax", mode="hybrid")      # Both, fused
+        print(rag.timings)                           # {"lexical": 1.2, ...}
     """
 
-    def __init__(self, rag_dir="./RAG"):
+    def __init__(self, rag_dir="./RAG", mode=DEFAULT_MODE, embedder=None,
+                 cache_size=QUERY_CACHE_SIZE, persist_cache=False, history=None):
         """
         Initialize RAG search.
 
         Args:
             rag_dir: Directory containing .md knowledge files
+            mode: Default search mode ("bm25", "keyword", "vector"
+                  or "hybrid")
+            embedder: Callable texts -> vectors for vector mode
+                      (default: OllamaEmbedder())
+            cache_size: Search results kept in the LRU cache (0 = off)
+            persist_cache: Save the cache in RAG/.digger between runs
+            history: HistoryIndex whose past answers are added to
+                     results (default: knowledge base only)
         """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown RAG search mode: {mode}")
+
         self.rag_dir = Path(rag_dir)
+        self.mode = mode
 
         ## Create directory if it doesn't exist
         self.rag_dir.mkdir(parents=True, exist_ok=True)
 
-    def search(self, topic):
+        ## Load (or build) the inverted index once at startup
+        self.index = RAGIndex(self.rag_dir)
+        self.index.refresh()
+
+        ## Vector index is built on first use - embedding is slow
+        self.embedder = embedder
+        self.vectors = None
+        self.pool = None  ## Hybrid mode worker threads, made on first use
+
+        ## Milliseconds per stage of the last search
+        self.timings = {}
+        self.vector_fallback = False  ## Last search wanted vectors, got bm25
+
+        ## Repeat searches skip ranking entirely
+        cache_path = self.index.index_dir / QUERY_CACHE_FILENAME if persist_cache else None
+        self.cache = QueryCache(capacity=cache_size, path=cache_path)
+
+        self.history = history
+
+    def search(self, topic, mode=None):
         """
         Search all .md files for a topic.
 
+        "bm25" returns the best-scoring sections for any of the terms.
+        "keyword" returns lines containing every term of the topic
+        (case insensitive), e.g. "TCP handshake" needs both words.
+        "vector" returns the sections closest in meaning to the topic;
+        it falls back to "bm25" if embeddings aren't available.
+        "hybrid" runs "bm25" and "vector" at the same time and fuses
+        the two rankings (falls back to "bm25" the same way).
+
+        Operators (AND, OR, "phrase", prefix*) restrict bm25/keyword
+        to matching lines/sections - see query.py.
+
         Args:
-            topic: Search term (case insensitive)
+            topic: Search term(s) or query
+            mode: "bm25", "keyword", "vector" or "hybrid"
+                  (default: self.mode)
 
         Returns:
             str: Formatted results with source labels, or empty string
@@ -66,30 +164,322 @@ class RAGSearch:
             [SOURCE: protocols.md]
             TCP provides reliable delivery...
         """
+        self.timings = {}
+
         if not topic or not topic.strip():
             return ""
 
-        topic = topic.strip()
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown RAG search mode: {mode}")
+
+        query = parse_query(topic)
+        if not query:
+            return ""
+
+        started = time.perf_counter()
+
+        ## Pick up files changed since startup (stat only if unchanged)
+        self.index.refresh()
+        self._mark("refresh", started)
+
+        ## A new index state means some file changed - old results are stale
+        self.cache.set_state((INDEX_VERSION, *self.index.state))
+        lookup_started = time.perf_counter()
+        key = self._cache_key(query, mode)
+        results = self.cache.get(key)
+        if results is not None:
+            self._mark("cache", lookup_started)
+        else:
+            self.vector_fallback = False
+            if mode == "hybrid":
+                results = self._search_hybrid(topic, query)
+            elif mode == "vector":
+                results = self._search_vector(topic, query)
+            elif mode == "bm25":
+                results = self._search_ranked(query)
+            else:
+                results = self._search_keyword(query)
+
+            ## Don't pin bm25 stand-ins - the embedder may be back next time
+            if not self.vector_fallback:
+                self.cache.put(key, results)
+
+        results = self._merge_history(topic, results)
+        self._mark("total", started)
+        return results
+
+    def _cache_key(self, query, mode):
+        """
+        Build the result-cache key for a parsed query.
+
+        Uses the query tree rather than the raw topic, so case and
+        spacing differences share an entry.
+
+        Args:
+            query: Tree from parse_query()
+            mode: Search mode
+
+        Returns:
+            str: Key covering everything that shapes the result
+        """
+        params = [mode, MAX_SECTIONS, MAX_FILES, MAX_MATCHES_PER_FILE, APPROX_CHAR_LIMIT, MAX_SECTION_CHARS]
+        if mode in ("vector", "hybrid"):
+            params.append(getattr(self.embedder, "model", None))
+        return json.dumps([*self.index.state, params, query], separators=(",", ":"))
+
+    def timing_summary(self):
+        """
+        One-line summary of the last search's stage timings.
+
+        Returns:
+            str: e.g. "total 41ms (refresh 0ms, lexical 2ms, vector 40ms,
+                 fuse 0ms, read 1ms)", or "" before any search
+        """
+        if "total" not in self.timings:
+            return ""
+        stages = ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in self.timings.items() if stage != "total")
+        return f"total {self.timings['total']:.0f}ms ({stages})"
+
+    def _mark(self, stage, started):
+        """
+        Record milliseconds since `started` for a search stage.
+        """
+        self.timings[stage] = (time.perf_counter() - started) * 1000
+
+    def _search_vector(self, topic, query):
+        """
+        Return the sections closest in meaning to the topic.
+
+        Args:
+            topic: Raw topic text (the embedder sees it unparsed)
+            query: Tree from parse_query() for the bm25 fallback
+
+        Returns:
+            str: Formatted results, best section first
+        """
+        started = time.perf_counter()
+        vectors = self._get_vectors()
+        if not vectors:
+            self.vector_fallback = True
+            return self._search_ranked(query)
+
+        ranked = vectors.search(topic, k=MAX_SECTIONS)
+        self._mark("vector", started)
+        return self._format_ranked(ranked)
+
+    def _search_hybrid(self, topic, query):
+        """
+        Run bm25 and vector search concurrently and fuse the rankings.
+
+        The vector side is mostly waiting on the embedding server, so
+        with both in flight the search costs about as much as the
+        slower of the two rather than their sum.
+
+        Args:
+            topic: Raw topic text (for the embedder)
+            query: Tree from parse_query() (for the lexical side)
+
+        Returns:
+            str: Formatted results, best fused section first
+        """
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag")
+
+        lexical = self.pool.submit(self._timed, "lexical", self._rank_lexical, query, HYBRID_CANDIDATES)
+        vector = self.pool.submit(self._timed, "vector", self._rank_vector, topic, HYBRID_CANDIDATES)
+        lexical_ranked = lexical.result()
+        vector_ranked = vector.result()
+
+        if vector_ranked is None:
+            ## No embeddings - plain bm25
+            self.vector_fallback = True
+            return self._format_ranked(lexical_ranked[:MAX_SECTIONS])
+
+        started = time.perf_counter()
+        if not is_plain(query):
+            ## Operators filter the vector side too
+            allowed = self.index.match(query, by_section=True)
+            vector_ranked = [hit for hit in vector_ranked if hit[2] in allowed.get(hit[1], ())]
+
+        fused = reciprocal_rank_fusion([lexical_ranked, vector_ranked])
+        self._mark("fuse", started)
+        return self._format_ranked(fused[:MAX_SECTIONS])
+
+    def _merge_history(self, topic, results):
+        """
+        Add matching answers from past sessions after the results.
+
+        Args:
+            topic: Search term(s)
+            results: Knowledge base results
+
+        Returns:
+            str: Results, then past answers (if self.history is set)
+        """
+        if not self.history:
+            return results
+
+        started = time.perf_counter()
+        past = self.history.format_results(topic)
+        self._mark("history", started)
+        return "\n\n".join(part for part in (results, past) if part)
+
+    def _timed(self, stage, func, *args):
+        """
+        Call func(*args) and record how long it took under `stage`.
+        """
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._mark(stage, started)
+
+    def _rank_lexical(self, query, limit):
+        """
+        BM25-rank sections for a query.
+
+        Bare words are ranked freely; queries with operators only rank
+        sections that satisfy them.
+
+        Args:
+            query: Tree from parse_query()
+            limit: Max sections
+
+        Returns:
+            list: (score, filename, section_index) tuples, best first
+        """
+        allowed = None
+        if not is_plain(query):
+            allowed = self.index.match(query, by_section=True)
+            if not allowed:
+                return []
+
+        terms = self.index.query_terms(query)
+        return self.index.rank(terms, limit=limit, allowed=allowed)
+
+    def _rank_vector(self, topic, limit):
+        """
+        Embedding-rank sections for a topic.
+
+        Args:
+            topic: Raw topic text
+            limit: Max sections
+
+        Returns:
+            list: (score, filename, section_index) tuples, best first,
+                  or None if vector search isn't available
+        """
+        vectors = self._get_vectors()
+        if not vectors:
+            return None
+        return vectors.search(topic, k=limit)
+
+    def _get_vectors(self):
+        """
+        Create/refresh the vector index for vector mode.
+
+        Returns:
+            VectorIndex: Ready to search, or None if unavailable
+        """
+        if not VectorIndex.available():
+            print("Warning: numpy not installed - vector search disabled, using bm25.")
+            return None
+
+        if self.vectors is None:
+            self.vectors = VectorIndex(self.index, self.embedder or OllamaEmbedder())
+
+        self.vectors.refresh()
+        if not self.vectors.is_current():
+            return None  ## Embedder down - never embedded, or behind the KB
+        return self.vectors
+
+    def _search_ranked(self, query):
+        """
+        Return the top BM25 sections that fit in APPROX_CHAR_LIMIT.
+
+        Args:
+            query: Tree from parse_query()
+
+        Returns:
+            str: Formatted results, best section first
+        """
+        ranked = self._timed("lexical", self._rank_lexical, query, MAX_SECTIONS)
+        return self._format_ranked(ranked)
+
+    def _format_ranked(self, ranked):
+        """
+        Format ranked sections, best first, within APPROX_CHAR_LIMIT.
+
+        Args:
+            ranked: (score, filename, section_index) tuples
+
+        Returns:
+            str: Formatted results
+        """
+        started = time.perf_counter()
+        results = []
+        total_chars = 0
+
+        for score, filename, section in ranked:
+            if total_chars >= APPROX_CHAR_LIMIT:
+                break
+
+            label, text = self._read_sections(filename, [section])[0]
+            if not text:
+                continue
+
+            ## Check if adding this would exceed limit
+            if total_chars + len(text) > APPROX_CHAR_LIMIT:
+                remaining = APPROX_CHAR_LIMIT - total_chars
+                if remaining > 200:  ## Only include if meaningful
+                    text = text[:remaining] + "\n[...truncated...]"
+                else:
+                    break
+
+            formatted = f"[SOURCE: {label}]\n{text}"
+            results.append(formatted)
+            total_chars += len(formatted)
+
+        self._mark("read", started)
+        return "\n\n".join(results)
+
+    def _search_keyword(self, query):
+        """
+        Return the sections holding lines that match the query, per file.
+
+        Args:
+            query: Tree from parse_query()
+
+        Returns:
+            str: Formatted results, files in name order
+        """
+        started = time.perf_counter()
         results = []
         total_chars = 0
         files_included = 0
 
-        ## Find all .md files
-        md_files = sorted(glob.glob(str(self.rag_dir / "*.md")))
+        ## Postings set operations - only files with matching lines
+        hits = self.index.match(query)
+        self._mark("lexical", started)
 
-        if not md_files:
+        if not hits:
             return ""
 
-        ## Search each file
-        for filepath in md_files:
+        started = time.perf_counter()
+
+        ## Search each matching file
+        for filename in sorted(hits):
             ## Check if we've hit limits
             if files_included >= MAX_FILES:
                 break
             if total_chars >= APPROX_CHAR_LIMIT:
                 break
 
-            ## Search this file
-            matches = self._search_file(filepath, topic)
+            ## Whole sections around the indexed hits
+            sections = self.index.sections_for_lines(filename, sorted(hits[filename]))
+            extracted = self._read_sections(filename, sections[:MAX_MATCHES_PER_FILE])
+            matches = "\n--\n".join(text for label, text in extracted if text)
 
             if matches:
                 ## Check if adding this would exceed limit
@@ -101,68 +491,47 @@ class RAGSearch:
                     else:
                         break
 
-                filename = os.path.basename(filepath)
                 formatted = f"[SOURCE: {filename}]\n{matches}"
                 results.append(formatted)
                 total_chars += len(formatted)
                 files_included += 1
 
+        self._mark("read", started)
         return "\n\n".join(results)
 
-    def _search_file(self, filepath, topic):
+    def _read_sections(self, filename, sections):
         """
-        Search a single file for topic matches.
+        Pull sections out of a file by their stored byte offsets.
 
-        Returns matching lines with context (lines before/after).
+        Only MAX_SECTION_CHARS bytes of each section are read and
+        decoded, however big the section or file is.
 
         Args:
-            filepath: Path to .md file
-            topic: Search term
+            filename: Name of .md file
+            sections: Section indexes from the index
 
         Returns:
-            str: Matching content with context, or empty string
+            list: (source label, text) per section, in order.
+                  Split-off chunks get their heading in the label
+                  so the model still knows what they're about.
         """
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-        except Exception as e:
-            print(f"Warning: Could not read {filepath}: {e}")
-            return ""
-
-        ## Find matching line numbers (case insensitive)
-        pattern = re.compile(re.escape(topic), re.IGNORECASE)
-        match_indices = []
-
-        for i, line in enumerate(lines):
-            if pattern.search(line):
-                match_indices.append(i)
-
-        if not match_indices:
-            return ""
+        texts = self.index.read_sections(filename, sections, max_bytes=MAX_SECTION_CHARS)
 
-        ## Limit matches per file
-        match_indices = match_indices[:MAX_MATCHES_PER_FILE]
-
-        ## Extract matches with context
-        extracted = []
-        seen_ranges = set()  ## Avoid duplicate lines
+        results = []
+        for section in sections:
+            start_byte, end_byte, title, is_continuation = self.index.section_span(filename, section)
+            text = texts.get(section, "").strip()
 
-        for idx in match_indices:
-            ## Calculate context range
-            start = max(0, idx - MAX_CONTEXT_LINES)
-            end = min(len(lines), idx + MAX_CONTEXT_LINES + 1)
+            if end_byte - start_byte > MAX_SECTION_CHARS:
+                text += "\n[...truncated...]"
 
-            ## Extract lines we haven't seen
-            section_lines = []
-            for i in range(start, end):
-                if i not in seen_ranges:
-                    seen_ranges.add(i)
-                    section_lines.append(lines[i].rstrip())
+            label = filename
+            if is_continuation:
+                label = f"{filename} | {title} (cont.)"
 
-            if section_lines:
-                extracted.append("\n".join(section_lines))
+            results.append((label, text))
 
-        return "\n--\n".join(extracted)
+        return results
 
     def list_files(self):
         """
@@ -171,17 +540,13 @@ class RAGSearch:
         Returns:
             list: List of (filename, line_count, size_kb) tuples
         """
-        files = []
-        md_files = glob.glob(str(self.rag_dir / "*.md"))
+        ## Line counts come from the index - no need to read every file
+        self.index.refresh()
 
-        for filepath in sorted(md_files):
-            try:
-                filename = os.path.basename(filepath)
-                line_count = sum(1 for _ in open(filepath))
-                size_kb = os.path.getsize(filepath) / 1024
-                files.append((filename, line_count, f"{size_kb:.1f}KB"))
-            except Exception:
-                pass
+        files = []
+        for filename, meta in sorted(self.index.files.items()):
+            size_kb = meta["size"] / 1024
+            files.append((filename, meta["lines"], f"{size_kb:.1f}KB"))
 
         return files
 
@@ -218,11 +583,29 @@ class RAGSearch:
 
         filepath = self.rag_dir / filename
 
+        ## Catch up on outside edits first so the append is all that's new
+        self.index.refresh()
+
         ## Append with timestamp
         with open(filepath, "a", encoding="utf-8") as f:
             f.write(f"\n## {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
             f.write(f"{note}\n")
 
+        ## Index just the appended section - no full rebuild
+        self.index.append_update(filename)
+
+        ## New generation - cached results no longer cover this note
+        self.cache.set_state((INDEX_VERSION, *self.index.state))
+
+    def close(self):
+        """
+        Save the result cache and stop the hybrid worker threads.
+        """
+        self.cache.flush()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
     def get_stats(self):
         """
         Get statistics about the knowledge base.
@@ -230,25 +613,50 @@ class RAGSearch:
         Returns:
             dict: Stats about files, size, etc.
         """
-        md_files = glob.glob(str(self.rag_dir / "*.md"))
-        total_lines = 0
-        total_size = 0
-
-        for filepath in md_files:
-            try:
-                total_lines += sum(1 for _ in open(filepath))
-                total_size += os.path.getsize(filepath)
-            except Exception:
-                pass
+        self.index.refresh()
+        files = self.index.files.values()
+        total_lines = sum(meta["lines"] for meta in files)
+        total_size = sum(meta["size"] for meta in files)
+        cache = self.cache.stats()
 
         return {
-            "file_count": len(md_files),
+            "file_count": len(self.index.files),
             "total_lines": total_lines,
             "total_size_kb": f"{total_size / 1024:.1f}KB",
+            "indexed_terms": len(self.index.postings),
+            "cache_hits": cache["hits"],
+            "cache_misses": cache["misses"],
+            "cache_hit_rate": f"{cache['hit_rate']:.0%}",
             "rag_dir": str(self.rag_dir),
         }
 
 
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merge ranked lists by reciprocal rank fusion.
+
+    Each section scores sum(1 / (k + rank)) over the lists it appears
+    in, so raw scores (BM25 vs cosine) never have to be compared -
+    only positions. A section near the top of both lists wins.
+
+    Args:
+        rankings: Lists of (score, filename, section_index), best first
+        k: Damping constant - higher flattens the rank curve
+
+    Returns:
+        list: (fused score, filename, section_index), best first
+    """
+    fused = {}
+    for ranked in rankings:
+        for rank, (_, filename, section) in enumerate(ranked, start=1):
+            key = (filename, section)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+
+    ## Ties keep first-seen order (lexical list first)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])
+    return [(score, filename, section) for (filename, section), score in ordered]
+
+
 ## ============================================================
 ## QUICK TEST - Run this file directly to test RAG search
 ## ============================================================
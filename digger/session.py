@@ -7,17 +7,139 @@
 ## 1. Creates a unique session ID (timestamp)
 ## 2. Tracks all messages (George + Digger)
 ## 3. Stores RAG context that was loaded
-## 4. Saves everything to a file for persistence
+## 4. Journals every change to a file for persistence
 ## 5. Provides the full context to send to the model
 ##
-## The model sees: RAG content + conversation history
+## SESSION FILE (memory/session_<id>.jsonl) - append-only journal:
+##   {"type": "header", "version": 1, "id": "...", "started": "..."}
+##   {"type": "knowledge", "topic": "tcp", "content": "..."}
+##   {"type": "message", "role": "George", "content": "..."}
+##   {"type": "summary", "summary": "...", "upto": 12}
+##   {"type": "clear"}              messages + knowledge + summary
+##   {"type": "clear_knowledge"}
+## Each change appends one line, so a turn costs one small write no
+## matter how long the session is. Once enough lines are dead (old
+## summaries, cleared turns) the file is compacted: rewritten as a
+## snapshot of the live state (temp file + rename).
+## Session.load() replays a journal; a torn last line from a crash
+## is skipped.
+##
+## RESUMING (digger --resume [id|latest]):
+## Session.resume() finds a session in the memory dir and replays it -
+## knowledge included, so nothing needs re-'load'ing. Old free-form
+## session_<id>.txt files are parsed once and converted to .jsonl
+## next to them; later resumes read the journal.
+##
+## The disk I/O lives in journal.py. With write_behind=True the
+## records are queued for a writer thread, so add_message() returns
+## before anything touches the disk; flush()/close() drain the queue.
+## session_fsync ("always", "interval", "never") is passed through.
+##
+## The model sees: RAG content + conversation history, trimmed to
+## the model's context window by context.py (oldest turns and
+## repeated knowledge go first)
+##
+## Older turns can be folded into a running summary by summary.py
+## (in a background thread) - the model then sees the summary plus
+## only the recent messages. The summary is saved in the session file.
 ## ============================================================
 
-import os
+import re
+import threading
 from datetime import datetime
 from pathlib import Path
 
 from digger.config import SYSTEM_PROMPT
+from digger.context import ContextBuilder, format_knowledge
+from digger.journal import JournalWriter, read_journal
+
+
+## ============================================================
+## JOURNAL SETTINGS
+## ============================================================
+JOURNAL_VERSION = 1
+COMPACT_MIN_DEAD = 32         ## Dead records before compacting...
+COMPACT_DEAD_RATIO = 0.5      ## ...if they're also this share of the file
+
+## Old session_<id>.txt format (before the journal)
+LEGACY_KNOWLEDGE_PATTERN = re.compile(r"=== KNOWLEDGE ON '(.*?)' ===\n(.*?)\n=== END KNOWLEDGE ===", re.DOTALL)
+LEGACY_MESSAGE_PATTERN = re.compile(r"^(George|Digger): ?(.*)$")
+
+
+def find_session(memory_dir, ref="latest"):
+    """
+    Find a saved session file.
+
+    Args:
+        memory_dir: Directory holding session files
+        ref: "latest", a session id (or the start of one), or a path
+
+    Returns:
+        Path: The .jsonl journal, or the old .txt if never converted
+
+    Raises:
+        FileNotFoundError: No matching session
+    """
+    if ref != "latest" and Path(ref).is_file():
+        return Path(ref)
+
+    ## id -> file; a converted .txt is shadowed by its .jsonl
+    sessions = {}
+    for pattern in ("session_*.txt", "session_*.jsonl"):
+        for path in Path(memory_dir).glob(pattern):
+            sessions[path.stem.replace("session_", "", 1)] = path
+
+    ids = sorted(sessions)  ## Ids are timestamps - sorted = oldest first
+    if ref != "latest":
+        ids = [session_id for session_id in ids if session_id.startswith(ref)]
+    if not ids:
+        raise FileNotFoundError(f"No session '{ref}' in {memory_dir}")
+
+    return sessions[ids[-1]]
+
+
+def read_legacy_session(filepath):
+    """
+    Parse an old free-form session_<id>.txt into journal records.
+
+    Args:
+        filepath: Path to the .txt file
+
+    Returns:
+        list: Records, as Session._live_records() would write them
+
+    Raises:
+        OSError: File missing or unreadable
+    """
+    filepath = Path(filepath)
+    with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+
+    started = re.search(r"^## Started: (.*)$", text, re.MULTILINE)
+    rag_text, _, conversation = text.partition("## === CONVERSATION ===\n")
+
+    records = [{
+        "type": "header",
+        "version": JOURNAL_VERSION,
+        "id": filepath.stem.replace("session_", "", 1),
+        "started": started.group(1) if started else datetime.now().isoformat(),
+    }]
+    for topic, content in LEGACY_KNOWLEDGE_PATTERN.findall(rag_text):
+        records.append({"type": "knowledge", "topic": topic, "content": content})
+
+    ## Answers span lines - anything that isn't a new "Role: " continues one
+    messages = []
+    for line in conversation.splitlines():
+        match = LEGACY_MESSAGE_PATTERN.match(line)
+        if match:
+            messages.append([match.group(1), match.group(2)])
+        elif messages:
+            messages[-1][1] += "\n" + line
+    for role, content in messages:
+        if content.strip():
+            records.append({"type": "message", "role": role, "content": content.strip()})
+
+    return records
 
 
 class Session:
@@ -31,34 +153,124 @@ class Session:
         session.add_message("Digger", "TCP is...")    # Add model response
 
         context = session.get_context()  # Get full context for model
+
+        session = Session.load("memory/session_20260121_143052.jsonl")
     """
 
-    def __init__(self, memory_dir="./memory"):
+    def __init__(self, memory_dir="./memory", builder=None, fsync="interval", write_behind=False):
         """
         Initialize a new session.
 
         Args:
             memory_dir: Directory to store session files
+            builder: ContextBuilder that fits get_context() into the
+                     model's window (default: 4096-token budget)
+            fsync: "always", "interval" or "never" (see journal.py)
+            write_behind: Write the journal from a background thread
         """
         ## Create unique session ID from timestamp
         ## Format: YYYYMMDD_HHMMSS (e.g., 20260121_143052)
-        self.id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._setup(datetime.now().strftime("%Y%m%d_%H%M%S"), memory_dir, builder, fsync, write_behind)
+
+        ## Create the session file (header only)
+        self._compact()
+
+    @classmethod
+    def load(cls, filepath, builder=None, fsync="interval", write_behind=False):
+        """
+        Rebuild a session from its journal; new changes append to it.
+
+        Args:
+            filepath: Path to a session_<id>.jsonl file
+            builder: ContextBuilder (default: 4096-token budget)
+            fsync: fsync policy for further changes
+            write_behind: Write further changes from a background thread
+
+        Returns:
+            Session: The session as it was when last written
+
+        Raises:
+            OSError: File missing or unreadable
+        """
+        filepath = Path(filepath)
+        session = cls.__new__(cls)
+        session._setup(filepath.stem.replace("session_", "", 1), filepath.parent, builder, fsync, write_behind)
+
+        records, torn = read_journal(filepath)
+        for record in records:
+            session._apply(record)
+        session._records = len(records)
+
+        ## Don't append after a torn line - rewrite it clean first
+        if torn:
+            session._compact()
+
+        return session
+
+    @classmethod
+    def resume(cls, memory_dir, ref="latest", builder=None, fsync="interval", write_behind=False):
+        """
+        Pick up a saved session where it left off.
+
+        Args:
+            memory_dir: Directory holding session files
+            ref: "latest", a session id (or the start of one), or a path
+            builder: ContextBuilder (default: 4096-token budget)
+            fsync: fsync policy for further changes
+            write_behind: Write further changes from a background thread
+
+        Returns:
+            Session: The saved session; new changes append to its journal
+
+        Raises:
+            FileNotFoundError: No matching session
+            OSError: File unreadable
+        """
+        filepath = find_session(memory_dir, ref)
+
+        ## Old text session - convert it once, then it's a normal journal
+        if filepath.suffix == ".txt":
+            records = read_legacy_session(filepath)
+            filepath = filepath.with_suffix(".jsonl")
+            writer = JournalWriter(filepath, fsync=fsync)
+            writer.rewrite(records)
+            writer.close()
+
+        return cls.load(filepath, builder=builder, fsync=fsync, write_behind=write_behind)
+
+    def _setup(self, session_id, memory_dir, builder, fsync, write_behind):
+        """
+        Set up empty session state (shared by __init__ and load()).
+        """
+        self.id = session_id
+        self.started = datetime.now().isoformat()
 
         ## Setup paths
         self.memory_dir = Path(memory_dir)
-        self.filepath = self.memory_dir / f"session_{self.id}.txt"
+        self.filepath = self.memory_dir / f"session_{self.id}.jsonl"
 
         ## Ensure memory directory exists
         self.memory_dir.mkdir(parents=True, exist_ok=True)
 
+        ## Journal state
+        self._writer = JournalWriter(self.filepath, fsync=fsync, background=write_behind)
+        self._records = 0        ## Lines in the journal (written or queued)
+
         ## Initialize context storage
-        ## _rag_context: Knowledge loaded from RAG files
+        ## _knowledge: List of (topic, content) loaded from RAG files
         ## _messages: List of (role, content) tuples
-        self._rag_context = ""
+        self._knowledge = []
         self._messages = []
 
-        ## Create empty session file
-        self._save()
+        ## _history_summary covers _messages[:_summarized]
+        self._history_summary = ""
+        self._summarized = 0
+
+        ## The summarizer thread updates the session too
+        self._lock = threading.RLock()
+
+        ## Keeps get_context() inside the model's context window
+        self.builder = builder or ContextBuilder()
 
     def add_context(self, content, topic=""):
         """
@@ -74,11 +286,15 @@ class Session:
         if not content:
             return
 
-        ## Format with clear markers so model knows this is reference material
-        formatted = f"\n=== KNOWLEDGE ON '{topic}' ===\n{content}\n=== END KNOWLEDGE ===\n"
+        self._record({"type": "knowledge", "topic": topic, "content": content})
 
-        self._rag_context += formatted
-        self._save()
+    @property
+    def _rag_context(self):
+        """
+        All loaded knowledge, formatted with clear markers so the model
+        knows it's reference material (untrimmed - for the session file).
+        """
+        return "".join(format_knowledge(topic, content) for topic, content in self._knowledge)
 
     def add_message(self, role, content):
         """
@@ -91,13 +307,15 @@ class Session:
         if not content or not content.strip():
             return
 
-        self._messages.append((role, content.strip()))
-        self._save()
+        self._record({"type": "message", "role": role, "content": content.strip()})
 
     def get_context(self):
         """
         Get the full context to send to the model.
 
+        Knowledge and history are trimmed to fit self.builder's token
+        budget; see self.builder.last_report for what was kept.
+
         Returns:
             str: System prompt + RAG content + conversation history
 
@@ -115,21 +333,53 @@ class Session:
             Digger: answer
             George: next question
         """
-        ## Build context string
-        context_parts = []
+        ## System prompt FIRST (sets personality), then RAG (so model
+        ## has knowledge before questions), then the conversation -
+        ## summary of older turns first, if there is one
+        with self._lock:
+            return self.builder.build(
+                SYSTEM_PROMPT,
+                self._knowledge,
+                self._messages[self._summarized:],
+                summary=self._history_summary
+            )
+
+    def get_unsummarized(self, keep_recent):
+        """
+        Get the messages a summary update would fold in.
 
-        ## Add system prompt FIRST (sets personality)
-        context_parts.append(SYSTEM_PROMPT)
+        Args:
+            keep_recent: Newest messages to leave out of the summary
 
-        ## Add RAG context (so model has knowledge before questions)
-        if self._rag_context:
-            context_parts.append(self._rag_context)
+        Returns:
+            tuple: (start, end, current summary, messages[start:end])
+                   - pass start/end back to apply_summary()
+        """
+        with self._lock:
+            start = self._summarized
+            end = max(start, len(self._messages) - keep_recent)
+            return start, end, self._history_summary, list(self._messages[start:end])
 
-        ## Add conversation history
-        for role, content in self._messages:
-            context_parts.append(f"{role}: {content}")
+    def apply_summary(self, summary, start, end):
+        """
+        Replace messages[:end] in the context with a summary.
 
-        return "\n".join(context_parts)
+        Ignored if the session changed underneath (cleared, or another
+        summary landed first) since get_unsummarized().
+
+        Args:
+            summary: Summary of everything up to `end`
+            start: start from get_unsummarized()
+            end: end from get_unsummarized()
+
+        Returns:
+            bool: True if applied
+        """
+        with self._lock:
+            if self._summarized != start or end > len(self._messages) or not summary:
+                return False
+            self._record({"type": "summary", "summary": summary, "upto": end})
+            return True
 
     def get_last_message(self, role=None):
         """
@@ -161,35 +411,100 @@ class Session:
 
         Useful if context gets too long.
         """
-        self._rag_context = ""
-        self._save()
+        self._record({"type": "clear_knowledge"})
 
-    def _save(self):
+    def clear(self):
         """
-        Save the current session to disk.
+        Clear RAG context and conversation history.
+        """
+        self._record({"type": "clear"})
+
+    def flush(self):
+        """
+        Block until every change so far is on disk (and fsynced).
+        """
+        self._writer.flush()
+
+    def close(self):
+        """
+        Flush the journal, stop the writer thread and close the file.
+
+        Later changes reopen it, so calling this twice is harmless.
+        """
+        self._writer.close()
+
+    def _record(self, record):
+        """
+        Apply a change in memory and append it to the journal.
+
+        Args:
+            record: Journal record (see header)
+        """
+        with self._lock:
+            self._apply(record)
+            self._writer.append(record)
+            self._records += 1
+
+            if self._should_compact():
+                self._compact()
 
-        Called automatically after each modification.
+    def _apply(self, record):
         """
-        try:
-            with open(self.filepath, "w") as f:
-                ## Write session header
-                f.write(f"## Session: {self.id}\n")
-                f.write(f"## Started: {datetime.now().isoformat()}\n")
-                f.write("\n")
+        Apply one journal record to the in-memory state.
+        """
+        kind = record.get("type")
+
+        if kind == "header":
+            self.started = record.get("started", self.started)
+        elif kind == "knowledge":
+            self._knowledge.append((record["topic"], record["content"]))
+        elif kind == "message":
+            self._messages.append((record["role"], record["content"]))
+        elif kind == "summary":
+            self._history_summary = record["summary"]
+            self._summarized = record["upto"]
+        elif kind == "clear_knowledge":
+            self._knowledge = []
+        elif kind == "clear":
+            self._knowledge = []
+            self._messages = []
+            self._history_summary = ""
+            self._summarized = 0
+
+    def _live_records(self):
+        """
+        The records that rebuild the current state.
 
-                ## Write RAG context
-                if self._rag_context:
-                    f.write("## === RAG CONTEXT ===\n")
-                    f.write(self._rag_context)
-                    f.write("\n")
+        Returns:
+            list: Header, knowledge, messages, then the summary
+        """
+        records = [{"type": "header", "version": JOURNAL_VERSION, "id": self.id, "started": self.started}]
+        records += [{"type": "knowledge", "topic": topic, "content": content} for topic, content in self._knowledge]
+        records += [{"type": "message", "role": role, "content": content} for role, content in self._messages]
+        if self._history_summary:
+            records.append({"type": "summary", "summary": self._history_summary, "upto": self._summarized})
+        return records
+
+    def _should_compact(self):
+        """
+        Check whether enough of the journal is dead to rewrite it.
+        """
+        live = 1 + len(self._knowledge) + len(self._messages) + bool(self._history_summary)
+        dead = self._records - live
+        return dead >= COMPACT_MIN_DEAD and dead >= self._records * COMPACT_DEAD_RATIO
 
-                ## Write conversation
-                f.write("## === CONVERSATION ===\n")
-                for role, content in self._messages:
-                    f.write(f"{role}: {content}\n")
+    def _compact(self):
+        """
+        Rewrite the journal as a snapshot of the live state.
 
-        except Exception as e:
-            print(f"Warning: Could not save session: {e}")
+        Written to a temp file, fsynced, then renamed over the journal,
+        so a crash leaves either the old file or the new one. Queued
+        behind any pending appends when writing behind.
+        """
+        with self._lock:
+            records = self._live_records()
+            self._writer.rewrite(records)
+            self._records = len(records)
 
     def get_summary(self):
         """
@@ -202,8 +517,11 @@ class Session:
             "id": self.id,
             "filepath": str(self.filepath),
             "message_count": len(self._messages),
-            "has_rag_context": bool(self._rag_context),
+            "has_rag_context": bool(self._knowledge),
+            "knowledge_blocks": len(self._knowledge),
             "rag_context_length": len(self._rag_context),
+            "context_tokens": self.builder.last_report.get("total", 0),
+            "summarized_messages": self._summarized,
         }
 
 
@@ -234,5 +552,6 @@ if __name__ == "__main__":
     for key, value in session.get_summary().items():
         print(f"  {key}: {value}")
 
+    session.close()
     print("\n" + "=" * 50)
     print(f"Session saved to: {session.filepath}")
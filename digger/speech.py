@@ -0,0 +1,212 @@
+## ============================================================
+## SPEECH.PY - Sentence-level streaming TTS
+## ============================================================
+## Speaking the whole answer means waiting for full generation, then
+## one big ElevenLabs request, then playback. This speaks while the
+## model is still writing:
+##
+##   model pieces -> SentenceSplitter -> sentences -> voice.speak()
+##
+## VoiceEngine does the rest: up to TTS_IN_FLIGHT requests at once,
+## clips played in the order they were queued, skip() drops them all.
+## Time to first audio drops to about one sentence of generation plus
+## one short TTS request.
+##
+## SENTENCES:
+## Split after . ! ? or a line break, once at least SENTENCE_MIN_CHARS
+## have built up - "Right." on its own isn't worth a request. A ```
+## code block is kept whole, so the voice filter can drop all of it.
+## ============================================================
+
+import re
+import time
+
+
+## ============================================================
+## SPEECH SETTINGS
+## ============================================================
+SENTENCE_MIN_CHARS = 40       ## Shorter sentences wait for the next one
+
+## End of a sentence (with closing quotes/brackets) or of a line
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed text into sentences as they complete.
+
+    Example:
+        splitter = SentenceSplitter()
+        for piece in ollama.stream(context):
+            for sentence in splitter.feed(piece):
+                print(sentence)
+        print(splitter.flush())
+    """
+
+    def __init__(self, min_chars=SENTENCE_MIN_CHARS):
+        """
+        Initialize the splitter.
+
+        Args:
+            min_chars: Sentences shorter than this are joined to the next
+        """
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """
+        Add streamed text.
+
+        Args:
+            text: Next piece of the answer
+
+        Returns:
+            list: Sentences completed by this piece (may be empty)
+        """
+        self.buffer += text
+        sentences = []
+
+        while True:
+            end = self._boundary()
+            if end is None:
+                break
+            sentence = self.buffer[:end].strip()
+            self.buffer = self.buffer[end:]
+            if sentence:
+                sentences.append(sentence)
+
+        return sentences
+
+    def flush(self):
+        """
+        Return whatever is left at the end of the answer.
+
+        Returns:
+            str: Last (possibly unfinished) sentence, or empty string
+        """
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest
+
+    def _boundary(self):
+        """
+        Find where the first complete, long-enough sentence ends.
+
+        Returns:
+            int: Index just past it in the buffer, or None
+        """
+        for match in SENTENCE_END.finditer(self.buffer):
+            if self.buffer.count("```", 0, match.start()) % 2:
+                continue  ## Inside a code block - wait for the closing fence
+            if len(self.buffer[:match.start()].strip()) >= self.min_chars:
+                return match.end()
+        return None
+
+
+class SpeechPipeline:
+    """
+    Speaks one answer sentence by sentence while it streams in.
+
+    Example:
+        speech = SpeechPipeline(voice_engine)
+        response = ollama.chat(context, on_piece=speech.feed)
+        speech.finish()        # returns at once; audio plays on
+    """
+
+    def __init__(self, voice, min_chars=SENTENCE_MIN_CHARS):
+        """
+        Initialize the pipeline.
+
+        Args:
+            voice: VoiceEngine that synthesizes and plays the sentences
+            min_chars: Minimum sentence length (see SentenceSplitter)
+        """
+        self.voice = voice
+        self.splitter = SentenceSplitter(min_chars)
+        self.sentences = 0
+
+        ## Seconds from creation until the first clip started playing
+        self.started = time.perf_counter()
+        self.first_audio = None
+
+    def feed(self, text):
+        """
+        Add a streamed piece; complete sentences are queued to speak.
+
+        Args:
+            text: Next piece of the answer
+        """
+        for sentence in self.splitter.feed(text):
+            self._speak(sentence)
+
+    def finish(self):
+        """
+        Mark the end of the answer (doesn't wait for playback).
+        """
+        rest = self.splitter.flush()
+        if rest:
+            self._speak(rest)
+
+    def cancel(self):
+        """
+        Stop speaking this answer (and anything queued before it).
+        """
+        self.voice.skip()
+
+    def _speak(self, sentence):
+        """
+        Queue one sentence; the first one queued times first audio.
+        """
+        on_play = None if self.sentences else self._on_first_audio
+        if self.voice.speak(sentence, on_play=on_play):
+            self.sentences += 1
+
+    def _on_first_audio(self):
+        """
+        Player thread callback: the first sentence started playing.
+        """
+        self.first_audio = time.perf_counter() - self.started
+
+
+## ============================================================
+## QUICK TEST - Run this file directly for a simulated timing run
+## ============================================================
+if __name__ == "__main__":
+    from digger.voice import VoiceEngine
+
+    answer = (
+        "Righto George, TCP is the reliable one, mate. "
+        "It sets up a connection with a three-way handshake before sending anything. "
+        "Every segment gets a sequence number, so lost ones are sent again. "
+        "UDP just fires packets off and hopes for the best, ya drongo. "
+    ) * 2
+    tokens = answer.split(" ")
+    token_delay, tts_delay, play_delay = 0.03, 0.4, 0.2
+
+    class FakeVoice(VoiceEngine):
+        """Sleeps instead of calling ElevenLabs and mpg123."""
+
+        def _tts_request(self, text, retry_count=0, stream=False, token=None, wait_turn=None):
+            time.sleep(tts_delay)
+            return text.encode()
+
+        def _play_audio(self, audio_data):
+            return True
+
+        def _wait_clip(self):
+            time.sleep(play_delay)
+
+    print(f"Simulated answer: {len(tokens)} tokens at {token_delay * 1000:.0f}ms each, TTS {tts_delay * 1000:.0f}ms")
+    print("=" * 50)
+
+    generation = len(tokens) * token_delay
+    print(f"Whole answer:   first audio after ~{generation + tts_delay:.2f}s (generation + one TTS request)")
+
+    voice = FakeVoice({"elevenlabs_api_key": "fake"})
+    speech = SpeechPipeline(voice)
+    for token in tokens:
+        time.sleep(token_delay)
+        speech.feed(token + " ")
+    speech.finish()
+    voice.wait()
+    print(f"Sentence-level: first audio after {speech.first_audio:.2f}s")
+    print("=" * 50)
@@ -0,0 +1,122 @@
+## ============================================================
+## SUMMARY.PY - Rolling background summary of old turns
+## ============================================================
+## Long study sessions fill the context window with old chat. Once
+## enough messages pile up, the older George/Digger exchanges are
+## folded into a running summary by an Ollama model (can be a
+## smaller/faster one than the tutor). The model then sees:
+##
+##   system prompt + knowledge + [summary] + last few messages
+##
+## WHEN:
+## cli.py calls maybe_start() right after an answer is printed, so
+## the summary is written while George reads - in a daemon thread,
+## never blocking the prompt. One summary runs at a time; if the
+## session changed meanwhile (e.g. 'clear'), the result is dropped.
+##
+## The summary is stored in the session journal as a
+## {"type": "summary", "summary": ..., "upto": n} record
+## (Session.apply_summary()), so --resume picks it up.
+## ============================================================
+
+import threading
+
+
+## ============================================================
+## SUMMARY SETTINGS
+## ============================================================
+SUMMARY_KEEP_RECENT = 6       ## Newest messages always sent word for word
+SUMMARY_MIN_BATCH = 6         ## Old messages needed before summarizing
+SUMMARY_MAX_CHARS = 1500      ## Cap on the summary the model writes
+
+SUMMARY_PROMPT = """Summarise this tutoring conversation between George (student) and Digger (tutor) in under 150 words.
+Keep: topics covered, key facts explained, what George got wrong or asked about twice.
+Plain notes, no insults, no dialogue.
+
+{previous}CONVERSATION:
+{transcript}
+
+SUMMARY:"""
+
+
+class Summarizer:
+    """
+    Folds older session messages into a running summary, off-thread.
+
+    Example:
+        summarizer = Summarizer(OllamaClient(model="mistral"))
+        ...
+        session.add_message("Digger", response)
+        summarizer.maybe_start(session)   # returns immediately
+    """
+
+    def __init__(self, client, keep_recent=SUMMARY_KEEP_RECENT, min_batch=SUMMARY_MIN_BATCH):
+        """
+        Initialize the summarizer.
+
+        Args:
+            client: OllamaClient used only for summaries (its own, so
+                    the tutor client's conversation state isn't touched)
+            keep_recent: Newest messages left out of the summary
+            min_batch: Old messages needed before a summary runs
+        """
+        self.client = client
+        self.keep_recent = keep_recent
+        self.min_batch = min_batch
+        self.thread = None
+
+    def maybe_start(self, session):
+        """
+        Start a background summary if enough old messages piled up.
+
+        Args:
+            session: Session to summarize
+
+        Returns:
+            threading.Thread: The summary thread, or None if not needed
+                              or one is already running
+        """
+        if self.thread and self.thread.is_alive():
+            return None
+
+        start, end, previous, messages = session.get_unsummarized(self.keep_recent)
+        if len(messages) < self.min_batch:
+            return None
+
+        self.thread = threading.Thread(
+            target=self._run,
+            args=(session, start, end, previous, messages),
+            name="session-summary",
+            daemon=True
+        )
+        self.thread.start()
+        return self.thread
+
+    def summarize(self, previous, messages):
+        """
+        Ask the model for an updated summary.
+
+        Args:
+            previous: Existing summary ("" if none)
+            messages: (role, content) tuples to fold in
+
+        Returns:
+            str: New summary, or "" if the model failed
+        """
+        transcript = "\n".join(f"{role}: {content}" for role, content in messages)
+        previous_text = f"SUMMARY SO FAR:\n{previous}\n\n" if previous else ""
+        prompt = SUMMARY_PROMPT.format(previous=previous_text, transcript=transcript)
+
+        summary = self.client.chat(prompt, stream=False)
+        return " ".join(summary.split())[:SUMMARY_MAX_CHARS]
+
+    def _run(self, session, start, end, previous, messages):
+        """
+        Thread body: summarize and hand the result to the session.
+        """
+        try:
+            summary = self.summarize(previous, messages)
+        except Exception as e:
+            print(f"\n[Summary failed: {e}]")
+            return
+        session.apply_summary(summary, start, end)
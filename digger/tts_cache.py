@@ -0,0 +1,202 @@
+## ============================================================
+## TTS_CACHE.PY - On-disk cache of synthesized speech
+## ============================================================
+## Digger says the same lines over and over - the startup rant,
+## "Session complete.", "Note added.", "Knowledge loaded on TCP." -
+## and every one cost an ElevenLabs round trip and quota.
+## VoiceEngine looks here before any request.
+##
+## KEYS (content-addressed):
+## sha256 of the voice id + everything in the request that shapes the
+## audio (text, model_id, voice_settings). Change the voice or its
+## settings and old clips simply stop matching.
+##
+## ON DISK:
+##   <cache_dir>/<sha256>.mp3
+## A file's mtime is its last use. Over max_bytes, the least recently
+## used clips are deleted first. Writes go to a temp file + rename, so
+## a crash never leaves half a clip behind.
+## ============================================================
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+## ============================================================
+## TTS CACHE SETTINGS
+## ============================================================
+AUDIO_CACHE_MAX_BYTES = 50 * 1024 * 1024   ## 50MB of MP3 (~1 hour of speech)
+AUDIO_SUFFIX = ".mp3"
+
+
+def audio_key(voice_id, payload):
+    """
+    Build the cache key for a TTS request.
+
+    Args:
+        voice_id: ElevenLabs voice id
+        payload: Request body (text, model_id, voice_settings, ...)
+
+    Returns:
+        str: Hex sha256
+    """
+    data = json.dumps([voice_id, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Size-capped, least-recently-used MP3 cache in a directory.
+
+    Example:
+        cache = AudioCache("./.cache/tts")
+        key = audio_key(voice_id, payload)
+        audio = cache.get(key)
+        if audio is None:
+            audio = request_tts()
+            cache.put(key, audio)
+    """
+
+    def __init__(self, cache_dir, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        """
+        Initialize the cache (the directory is scanned on first use).
+
+        Args:
+            cache_dir: Directory for the .mp3 files
+            max_bytes: Size cap (0 disables caching)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.entries = None  ## key -> size, least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()  ## Synthesis workers share the cache
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Look up a clip and mark it recently used.
+
+        Args:
+            key: Key from audio_key()
+
+        Returns:
+            bytes: MP3 audio, or None on a miss
+        """
+        if self.max_bytes <= 0:
+            return None
+
+        with self.lock:
+            self._scan()
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                os.utime(path)  ## mtime = last use, for the next scan
+            except OSError:
+                self._forget(key)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return audio
+
+    def put(self, key, audio):
+        """
+        Store a clip, evicting the least recently used over the cap.
+
+        Args:
+            key: Key from audio_key()
+            audio: MP3 bytes
+        """
+        if self.max_bytes <= 0 or not audio or len(audio) > self.max_bytes:
+            return
+
+        with self.lock:
+            self._scan()
+            path = self._path(key)
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"[Voice cache: could not save clip: {e}]")
+                return
+
+            self._forget(key)
+            self.entries[key] = len(audio)
+            self.total_bytes += len(audio)
+            self._evict()
+
+    def stats(self):
+        """
+        Get hit/miss counts since startup and the cache size.
+
+        Returns:
+            dict: hits, misses, hit_rate (0-1), clips, bytes
+        """
+        with self.lock:
+            self._scan()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "clips": len(self.entries),
+                "bytes": self.total_bytes,
+            }
+
+    def _scan(self):
+        """
+        Load the clip list from disk once, oldest use first.
+        """
+        if self.entries is not None:
+            return
+
+        clips = []
+        try:
+            for path in self.cache_dir.glob(f"*{AUDIO_SUFFIX}"):
+                stat = path.stat()
+                clips.append((stat.st_mtime, path.stem, stat.st_size))
+        except OSError:
+            pass
+
+        clips.sort()
+        self.entries = OrderedDict((key, size) for _, key, size in clips)
+        self.total_bytes = sum(self.entries.values())
+        self._evict()  ## max_bytes may have shrunk since last run
+
+    def _evict(self):
+        """
+        Delete least recently used clips until under max_bytes.
+        """
+        while self.total_bytes > self.max_bytes and self.entries:
+            key = next(iter(self.entries))
+            self._forget(key)
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _forget(self, key):
+        """
+        Drop a key from the in-memory list (not the file).
+        """
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}{AUDIO_SUFFIX}"
@@ -0,0 +1,381 @@
+## ============================================================
+## VECTORS.PY - Embedding-based semantic search for the RAG index
+## ============================================================
+## Keyword search misses synonyms ("firewall rules" vs "ACL"). This
+## embeds every section from index.py once and answers queries with
+## a cosine top-k over the whole matrix in one NumPy call.
+##
+## ON DISK (next to the keyword index):
+##   RAG/.digger/vectors.npy    float16 [sections x dims], unit rows
+##   RAG/.digger/vectors.json   {"model", "epoch", "generation", "keys"}
+##     keys[i] = [filename, section_index, sha1 of section text]
+##
+## When the keyword index moves on (a new RAGIndex.state), sections
+## whose text hash is unchanged keep their vector - only new or edited
+## sections go back through the embedder. Until that has succeeded the
+## old keys may point past the end of a file, so stale vectors are
+## never searched - callers fall back to bm25.
+##
+## LARGE KBs:
+## Past ANN_MIN_ROWS sections, search goes through the IVF index in
+## ann.py (RAG/.digger/ann.npz) instead of scoring every row.
+##
+## EMBEDDERS:
+## Any callable texts -> list of vectors. OllamaEmbedder talks to the
+## local Ollama server; tests pass a stub.
+##
+## REQUIRES:
+## - numpy (pip install numpy) - vector mode is skipped without it
+## - An Ollama embedding model (ollama pull nomic-embed-text)
+## ============================================================
+
+import os
+import json
+import hashlib
+
+import requests
+
+from digger.ollama import DEFAULT_OLLAMA_HOST, normalize_host
+from digger.ann import IVFIndex, ANN_FILENAME, ANN_MIN_ROWS, ANN_NPROBE
+
+try:
+    import numpy as np
+except ImportError:  ## Optional - RAGSearch falls back to bm25
+    np = None
+
+
+## ============================================================
+## VECTOR SETTINGS
+## ============================================================
+VECTORS_FILENAME = "vectors.npy"
+VECTORS_META_FILENAME = "vectors.json"
+EMBED_BATCH_SIZE = 32         ## Sections per embedding request
+EMBED_MAX_BYTES = 2000        ## Text per section sent to the model
+DEFAULT_EMBED_MODEL = "nomic-embed-text"
+
+
+class OllamaEmbedder:
+    """
+    Embeds text with a local Ollama embedding model.
+
+    Example:
+        embed = OllamaEmbedder(model="nomic-embed-text")
+        vectors = embed(["TCP is reliable", "UDP is not"])
+    """
+
+    def __init__(self, model=DEFAULT_EMBED_MODEL, host=DEFAULT_OLLAMA_HOST):
+        """
+        Initialize the embedder.
+
+        Args:
+            model: Ollama embedding model name
+            host: Ollama server URL
+        """
+        self.model = model
+        self.host = normalize_host(host)
+        self.session = requests.Session()  ## Reuse the connection
+
+    def __call__(self, texts):
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: List of strings
+
+        Returns:
+            list: One vector (list of floats) per text
+
+        Raises:
+            requests.RequestException: Server unreachable or errored
+        """
+        response = self.session.post(
+            f"{self.host}/api/embed",
+            json={"model": self.model, "input": texts},
+            timeout=120
+        )
+
+        ## Older Ollama builds only have the single-prompt endpoint
+        if response.status_code == 404:
+            return [self._embed_one(text) for text in texts]
+
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def _embed_one(self, text):
+        """
+        Embed one text with the legacy /api/embeddings endpoint.
+        """
+        response = self.session.post(
+            f"{self.host}/api/embeddings",
+            json={"model": self.model, "prompt": text},
+            timeout=120
+        )
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+
+class VectorIndex:
+    """
+    Dense vectors for every section of a RAGIndex.
+
+    Example:
+        vectors = VectorIndex(rag.index, OllamaEmbedder())
+        vectors.refresh()
+        for score, filename, section in vectors.search("firewall rules", k=5):
+            print(score, filename, section)
+    """
+
+    def __init__(self, index, embedder, model_name=None,
+                 nprobe=ANN_NPROBE, ann_min_rows=ANN_MIN_ROWS):
+        """
+        Initialize the vector index (nothing is embedded until refresh).
+
+        Args:
+            index: RAGIndex to embed sections from
+            embedder: Callable texts -> list of vectors
+            model_name: Label stored with the vectors; a different
+                        model invalidates them (default: embedder.model)
+            nprobe: IVF clusters searched per query (recall vs speed)
+            ann_min_rows: Sections needed before the IVF index is used
+        """
+        self.index = index
+        self.embedder = embedder
+        self.model_name = model_name or getattr(embedder, "model", "custom")
+        self.vectors_path = index.index_dir / VECTORS_FILENAME
+        self.meta_path = index.index_dir / VECTORS_META_FILENAME
+        self.ann_path = index.index_dir / ANN_FILENAME
+        self.nprobe = nprobe
+        self.ann_min_rows = ann_min_rows
+
+        ## matrix row i belongs to keys[i] = (filename, section, sha1)
+        self.matrix = None
+        self.keys = []
+        self.epoch = None          ## Index state the keys were read from
+        self.generation = None
+        self.loaded = False
+        self.ann = None  ## IVFIndex once the KB is big enough
+
+    @staticmethod
+    def available():
+        """
+        Check whether vector search can run here.
+
+        Returns:
+            bool: True if numpy is installed
+        """
+        return np is not None
+
+    def refresh(self):
+        """
+        Bring the vectors in line with the keyword index.
+
+        Loads saved vectors on first call; after that only acts when
+        the index state changed, and then only embeds sections whose
+        text is new.
+
+        Returns:
+            bool: True if vectors were (re)computed
+        """
+        if not self.loaded:
+            self.load()
+            self.loaded = True
+
+        if self.is_current():
+            return False
+
+        ## Reuse vectors for section text we've already embedded
+        known = {}
+        if self.matrix is not None:
+            for row, key in enumerate(self.keys):
+                known[key[2]] = self.matrix[row]
+
+        keys = []
+        texts = {}  ## sha1 -> text still to embed
+        for filename in sorted(self.index.files):
+            sections = range(len(self.index.files[filename]["sections"]))
+            section_texts = self.index.read_sections(filename, sections, max_bytes=EMBED_MAX_BYTES)
+            for section in sections:
+                text = self._embed_text(filename, section, section_texts.get(section, ""))
+                digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+                keys.append((filename, section, digest))
+                if digest not in known:
+                    texts[digest] = text
+
+        new_vectors = self._embed_all(texts)
+        if new_vectors is None:
+            return False  ## Embedder failed - keep what we had
+        known.update(new_vectors)
+
+        rows = [known[digest] for _, _, digest in keys]
+        if rows:
+            self.matrix = np.vstack(rows).astype(np.float16)
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float16)
+        self.keys = keys
+        self.epoch, self.generation = self.index.state
+        self.save()
+        self._update_ann()
+        return True
+
+    def search(self, text, k=10):
+        """
+        Find the sections closest in meaning to the text.
+
+        Args:
+            text: Query text (not tokenized - the model sees it raw)
+            k: Number of sections to return
+
+        Returns:
+            list: (score, filename, section_index) tuples, best first;
+                  [] if the query can't be embedded
+        """
+        if not self.is_current() or not len(self.keys):
+            return []
+
+        query = self._embed_all({"query": text})
+        if query is None:
+            return []
+
+        if self.ann is not None:
+            scores, rows = self.ann.search(self.matrix, query["query"], k, self.nprobe)
+            return [(float(score), self.keys[row][0], self.keys[row][1]) for score, row in zip(scores, rows)]
+
+        ## Rows are unit length, so a dot product is the cosine
+        scores = self.matrix.astype(np.float32) @ query["query"].astype(np.float32)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(float(scores[row]), self.keys[row][0], self.keys[row][1]) for row in top]
+
+    def is_current(self):
+        """
+        Check the vectors were built for the index as it is now.
+
+        Returns:
+            bool: True if every key matches a current section
+        """
+        return self.matrix is not None and (self.epoch, self.generation) == self.index.state
+
+    def load(self):
+        """
+        Load saved vectors from disk.
+
+        Returns:
+            bool: True if vectors for this model were loaded
+        """
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(self.vectors_path)
+        except (OSError, ValueError):
+            return False
+
+        if meta.get("model") != self.model_name or len(meta.get("keys", [])) != len(matrix):
+            return False  ## Different model or mismatched files - re-embed
+
+        self.matrix = matrix
+        self.keys = [tuple(key) for key in meta["keys"]]
+        self.epoch = meta.get("epoch")
+        self.generation = meta.get("generation")
+
+        ## The IVF lists are only valid for the vectors they were built on
+        if len(self.keys) >= self.ann_min_rows:
+            ann = IVFIndex()
+            if ann.load(self.ann_path) and ann.state == (self.epoch, self.generation) \
+                    and len(ann.order) == len(self.keys):
+                self.ann = ann
+            else:
+                self._update_ann()
+        return True
+
+    def save(self):
+        """
+        Write vectors and their keys to disk (temp file + rename).
+        """
+        meta = {
+            "model": self.model_name,
+            "epoch": self.epoch,
+            "generation": self.generation,
+            "keys": self.keys,
+        }
+
+        try:
+            self.index.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_vectors = self.vectors_path.with_suffix(".tmp.npy")
+            np.save(tmp_vectors, self.matrix)
+            os.replace(tmp_vectors, self.vectors_path)
+
+            tmp_meta = self.meta_path.with_suffix(".tmp")
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, separators=(",", ":"))
+            os.replace(tmp_meta, self.meta_path)
+        except OSError as e:
+            print(f"Warning: Could not save RAG vectors: {e}")
+
+    def _update_ann(self):
+        """
+        Build or re-file the IVF index after the vectors changed.
+
+        Small KBs drop it (brute force is faster). Otherwise rows are
+        re-filed under the existing centroids; k-means only re-runs
+        when the matrix has doubled since it was trained.
+        """
+        rows = len(self.keys)
+        if rows < self.ann_min_rows:
+            self.ann = None
+            return
+
+        ann = self.ann
+        if ann is None:
+            ann = IVFIndex()
+            ann.load(self.ann_path)  ## Reuse saved centroids if any
+            if ann.centroids is not None and ann.centroids.shape[1] != self.matrix.shape[1]:
+                ann = IVFIndex()  ## Different embedding model
+
+        if ann.needs_training(rows):
+            ann.train(self.matrix)
+        ann.assign(self.matrix, state=(self.epoch, self.generation))
+        ann.save(self.ann_path)
+        self.ann = ann
+
+    def _embed_text(self, filename, section, text):
+        """
+        Text sent to the embedder for one section.
+
+        Split-off chunks don't start with their heading, so it's
+        prepended to keep them on topic.
+        """
+        _, _, title, is_continuation = self.index.section_span(filename, section)
+        if is_continuation:
+            return f"{title}\n{text}"
+        return text
+
+    def _embed_all(self, texts):
+        """
+        Embed texts in batches and normalise to unit length.
+
+        Args:
+            texts: key -> text
+
+        Returns:
+            dict: key -> float32 unit vector, or None on failure
+        """
+        keys = list(texts)
+        vectors = {}
+
+        for start in range(0, len(keys), EMBED_BATCH_SIZE):
+            batch = keys[start:start + EMBED_BATCH_SIZE]
+            try:
+                embedded = self.embedder([texts[key] for key in batch])
+            except Exception as e:
+                print(f"Warning: Embedding failed: {e}")
+                return None
+
+            for key, vector in zip(batch, embedded):
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vectors[key] = vector / norm if norm else vector
+
+        return vectors
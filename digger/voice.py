@@ -6,10 +6,38 @@
 ## FEATURES:
 ## - ElevenLabs API integration
 ## - Structured error handling (401/429/422/timeout)
-## - Rate limit retry logic
+## - Pooled keep-alive HTTP session - one TLS handshake, reused by
+##   every sentence's request
+## - Retries with exponential backoff (429, 5xx, dropped connections)
+## - Per-request timings (get_stats)
 ## - Text filtering (removes code blocks, markdown)
 ## - Skip functionality (kill playback mid-speech)
 ## - Subprocess-based playback (non-blocking)
+## - Sentence-level streaming while the model writes (speech.py)
+## - On-disk cache of synthesized clips (tts_cache.py) - repeated
+##   lines never hit the API twice
+##
+## STREAMING (voice_stream):
+## Uses the /stream endpoint and pipes each chunk straight into
+## "mpg123 -" as it arrives - no temp file, and playback starts on the
+## first chunk instead of after the whole MP3 downloaded. The request
+## is still made ahead by a synthesis worker; the player reads the
+## body when the clip's turn comes. An open stream holds a connection
+## until then, so a clip's request only starts once it is within
+## voice_in_flight clips of the one playing - never more streams open
+## than that. Cached clips skip the wait. mpg123 reads the pipe, not the terminal, so it still
+## can't steal the keyboard.
+##
+## NON-BLOCKING:
+## speak() only queues the text and returns - the REPL is back at
+## "You>" straight away. Behind it:
+##   - a pool of TTS_IN_FLIGHT synthesis workers makes the requests
+##   - one player thread plays the clips in the order speak() was
+##     called, one at a time (answers never talk over each other)
+## Each queued clip carries the cancel token current when it was
+## queued. skip() (Ctrl+C) cancels that token - so everything queued
+## so far is dropped - kills the playing clip, and starts a new token
+## for whatever is said next.
 ##
 ## REQUIRES:
 ## - mpg123 installed (apt install mpg123)
@@ -19,10 +47,79 @@
 import os
 import re
 import time
+import queue
 import tempfile
+import threading
 import subprocess
 import requests
-from pathlib import Path
+from collections import deque
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError
+
+from digger.tts_cache import AudioCache, audio_key
+
+
+## ============================================================
+## VOICE SETTINGS
+## ============================================================
+TTS_IN_FLIGHT = 3             ## TTS requests running at once
+STREAM_CHUNK_BYTES = 4096     ## Audio piped to the player per read
+PLAYER_COMMAND = ("mpg123", "-q")  ## File path or "-" (stdin) is appended
+
+## HTTP (one pooled session per VoiceEngine)
+CONNECT_TIMEOUT = 5           ## Seconds to connect to ElevenLabs
+READ_TIMEOUT = 30             ## Seconds to wait for audio to start arriving
+RETRY_ATTEMPTS = 4            ## Tries per request (1 + 3 retries)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_BASE = 0.5            ## First retry wait, doubled each time
+BACKOFF_MAX = 8.0             ## Longest wait (Retry-After is capped too)
+REQUEST_LOG_SIZE = 200        ## Recent requests kept for get_stats()
+
+
+class AudioStream:
+    """
+    MP3 chunks of a streaming TTS response, handed to the cache once
+    the whole clip has arrived.
+    """
+
+    def __init__(self, response, on_complete=None):
+        """
+        Args:
+            response: requests.Response opened with stream=True
+            on_complete: Optional callable given the full MP3 bytes
+        """
+        self.response = response
+        self.on_complete = on_complete
+
+    def __iter__(self):
+        chunks = []
+        try:
+            for chunk in self.response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                if chunk:
+                    chunks.append(chunk)
+                    yield chunk
+        finally:
+            self.close()
+
+        if self.on_complete:
+            self.on_complete(b"".join(chunks))
+
+    def close(self):
+        """
+        Release the connection (also when the clip was never played).
+        """
+        self.response.close()
+
+
+def _close_stream(future):
+    """
+    Done-callback for skipped clips: close an unread AudioStream.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return
+    audio = future.result()
+    if isinstance(audio, AudioStream):
+        audio.close()
 
 
 class VoiceEngine:
@@ -30,9 +127,11 @@ class VoiceEngine:
     Text-to-Speech engine using ElevenLabs API.
 
     Example:
-        voice = VoiceEngine(api_key="sk_...", voice_id="abc123")
-        voice.speak("Hello you absolute drongo!")
-        voice.skip()  # Kill playback
+        voice = VoiceEngine(config)
+        voice.speak("Hello you absolute drongo!")   # returns at once
+        voice.speak("Second line plays after.")
+        voice.skip()  # Drop the queue, kill playback
+        voice.wait()  # Block until everything queued has played
     """
 
     def __init__(self, config):
@@ -45,6 +144,10 @@ class VoiceEngine:
                 - voice_id: Voice ID from ElevenLabs
                 - voice_stability: Stability setting (0-1)
                 - voice_similarity: Similarity boost (0-1)
+                - voice_in_flight: TTS requests running at once
+                - voice_cache_dir: Where synthesized clips are kept
+                - voice_cache_mb: Clip cache size cap (0 = off)
+                - voice_stream: Pipe audio to the player as it arrives
         """
         self.api_key = config.get("elevenlabs_api_key", "")
         self.voice_id = config.get("voice_id", "twLPF55UcxNYRmxaWLAn")
@@ -54,19 +157,56 @@ class VoiceEngine:
         ## Track playing process for skip functionality
         self.process = None
         self.temp_file = None
+        self.player_command = list(PLAYER_COMMAND)
+        self.stream_audio = config.get("voice_stream", False)
+
+        ## Synthesis workers + ordered playback queue (started on first speak)
+        self.in_flight = config.get("voice_in_flight", TTS_IN_FLIGHT)
+        self.pool = None
+        self.player = None
+        self.clips = queue.Queue()  ## (cancel token, TTS future, on_play)
+
+        ## skip() sets the current token and swaps in a fresh one
+        self.token = threading.Event()
+        self.lock = threading.Lock()  ## skip() vs starting the next clip
+
+        ## Stream mode window: clip number n may open its stream once
+        ## n < clips_done + in_flight (see _wait_window)
+        self.window = threading.Condition()
+        self.clips_queued = 0  ## Clips queued so far = the next clip's number
+        self.clips_done = 0    ## Clips played or dropped by the player
+
+        ## Synthesized clips, keyed on text + voice + settings
+        cache_dir = config.get("voice_cache_dir")
+        cache_mb = config.get("voice_cache_mb", 0)
+        self.cache = AudioCache(cache_dir, int(cache_mb * 1024 * 1024)) if cache_dir and cache_mb > 0 else None
 
         ## API endpoint
         self.api_url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
 
-    def speak(self, text):
+        ## Keep-alive connection pool shared by the synthesis workers.
+        ## Streamed clips hold their connection until played, so allow
+        ## a few more than are requested at once.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.in_flight * 2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.retry_attempts = RETRY_ATTEMPTS
+        self.backoff_base = BACKOFF_BASE
+
+        ## One entry per request: status, attempts, response_ms, total_ms
+        self.request_log = deque(maxlen=REQUEST_LOG_SIZE)
+
+    def speak(self, text, on_play=None):
         """
-        Convert text to speech and play it.
+        Queue text to be synthesized and played (doesn't block).
 
         Args:
             text: Text to speak
+            on_play: Optional callable run when its audio starts playing
 
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if queued, False if there's nothing to say
         """
         if not text or not text.strip():
             return False
@@ -84,21 +224,37 @@ class VoiceEngine:
         if not clean_text:
             return False
 
-        ## Get audio from API
-        audio_data = self._tts_request(clean_text)
-
-        if not audio_data:
-            return False
+        ## Request starts now (if a worker is free); plays in queue order
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.in_flight, thread_name_prefix="tts")
+            self.player = threading.Thread(target=self._play_queue, name="voice-player", daemon=True)
+            self.player.start()
 
-        ## Play audio
-        return self._play_audio(audio_data)
+        with self.window:
+            token = self.token
+            future = self.pool.submit(self._synthesize, clean_text, token, self.clips_queued)
+            self.clips.put((token, future, on_play))
+            self.clips_queued += 1
+        return True
 
     def skip(self):
         """
-        Kill audio playback immediately.
+        Drop everything queued and kill audio playback immediately.
 
         Called when user presses Ctrl+C to skip voice.
         """
+        with self.lock:
+            self.token.set()
+            self.token = threading.Event()
+            self._stop_playback()
+
+        with self.window:
+            self.window.notify_all()  ## Skipped clips stop waiting to stream
+
+    def _stop_playback(self):
+        """
+        Kill the playing clip and delete its temp file.
+        """
         if self.process:
             try:
                 self.process.terminate()
@@ -120,15 +276,110 @@ class VoiceEngine:
 
     def is_playing(self):
         """
-        Check if audio is currently playing.
+        Check if audio is playing or queued.
 
         Returns:
             bool: True if playing
         """
+        if self.clips.unfinished_tasks:
+            return True
         if self.process:
             return self.process.poll() is None
         return False
 
+    def _synthesize(self, text, token, number):
+        """
+        Synthesis worker: fetch audio unless skipped meanwhile.
+
+        Args:
+            text: Filtered text to speak
+            token: The clip's cancel token
+            number: Position of the clip in the play queue
+
+        Returns:
+            bytes: MP3 audio, AudioStream, or None
+        """
+        if token.is_set():
+            return None
+
+        ## Only a real /stream request waits for the window - cached
+        ## clips come straight back
+        wait_turn = (lambda: self._wait_window(number, token)) if self.stream_audio else None
+        return self._tts_request(text, stream=self.stream_audio, token=token, wait_turn=wait_turn)
+
+    def _wait_window(self, number, token):
+        """
+        Hold a streamed request back until its clip is within in_flight
+        clips of the one playing. The clip at the head of the queue is
+        always inside, so playback can't stall waiting on itself.
+
+        Returns:
+            bool: True to open the stream, False if skipped meanwhile
+        """
+        with self.window:
+            while number >= self.clips_done + self.in_flight and not token.is_set():
+                self.window.wait()
+        return not token.is_set()
+
+    def _play_queue(self):
+        """
+        Player thread: play queued clips one at a time, in order.
+        """
+        while True:
+            token, future, on_play = self.clips.get()
+            try:
+                audio = self._clip_audio(future, token)
+                if not audio:
+                    continue
+
+                with self.lock:
+                    if token.is_set():
+                        started = False
+                    elif self.stream_audio:
+                        started = self._start_stream_player()
+                    else:
+                        started = self._play_audio(audio)
+                if not started:
+                    if isinstance(audio, AudioStream):
+                        audio.close()
+                    continue
+
+                if on_play:
+                    on_play()
+                if self.stream_audio:
+                    ## Cached clips arrive whole - pipe them the same way
+                    self._pipe_audio([audio] if isinstance(audio, bytes) else audio, token)
+                self._wait_clip()
+            finally:
+                with self.window:
+                    self.clips_done += 1
+                    self.window.notify_all()  ## Next clip may open its stream
+                self.clips.task_done()
+
+    def _clip_audio(self, future, token):
+        """
+        Wait for a queued clip's audio, giving up as soon as it's skipped.
+
+        Returns:
+            bytes: MP3 audio, or None if skipped or failed
+        """
+        while not token.is_set():
+            try:
+                return future.result(timeout=0.1)
+            except TimeoutError:
+                continue
+            except CancelledError:
+                return None
+            except Exception as e:
+                print(f"[Voice error: {e}]")
+                return None
+
+        ## Skipped - don't start the request if it's still queued, and
+        ## let go of the connection if a stream was already opened
+        if not future.cancel():
+            future.add_done_callback(_close_stream)
+        return None
+
     def _filter_text(self, text):
         """
         Filter text for speech - remove code blocks, markdown, etc.
@@ -172,16 +423,21 @@ class VoiceEngine:
 
         return text
 
-    def _tts_request(self, text, retry_count=0):
+    def _tts_request(self, text, retry_count=0, stream=False, token=None, wait_turn=None):
         """
         Make TTS request to ElevenLabs API.
 
         Args:
             text: Text to convert
-            retry_count: Number of retries (for rate limiting)
+            retry_count: Number of retries (for unsupported characters)
+            stream: Use the /stream endpoint and don't read the body yet
+            token: Cancel token - skip() stops any retry wait
+            wait_turn: Optional callable run after a cache miss, just
+                       before the request; returning False abandons it
 
         Returns:
-            bytes: Audio data, or None on error
+            bytes: Audio data (always, if cached), AudioStream when
+                   streaming, or None on error
         """
         headers = {
             "xi-api-key": self.api_key,
@@ -201,18 +457,41 @@ class VoiceEngine:
                 # TEMP DEBUG: confirm what is actually sent
         #print("[DEBUG PAYLOAD] Full payload sent to ElevenLabs:")
         #print(payload)
+        ## Same text, voice and settings = same audio - skip the request
+        key = audio_key(self.voice_id, payload)
+        if self.cache:
+            audio = self.cache.get(key)
+            if audio is not None:
+                return audio
+
+        if wait_turn and not wait_turn():
+            return None  ## Skipped while waiting for a stream slot
+
         try:
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=30
+            response = self._post(
+                f"{self.api_url}/stream" if stream else self.api_url,
+                headers,
+                payload,
+                stream,
+                token
             )
+            if response is None:
+                return None  ## Skipped while waiting to retry
             response.raise_for_status()
+
+            if stream:
+                ## Body is read by the player, chunk by chunk
+                on_complete = (lambda audio: self.cache.put(key, audio)) if self.cache else None
+                return AudioStream(response, on_complete)
+
+            if self.cache:
+                self.cache.put(key, response.content)
             return response.content
 
         except requests.HTTPError as e:
-            status = e.response.status_code if e.response else 0
+            status = e.response.status_code if e.response is not None else 0
+            if e.response is not None:
+                e.response.close()  ## An unread stream holds a pooled connection
 
             if status == 401:
                 ## Invalid API key
@@ -220,14 +499,9 @@ class VoiceEngine:
                 return None
 
             elif status == 429:
-                ## Rate limited - retry once after wait
-                if retry_count < 1:
-                    print("[Voice: Rate limited - waiting 10s...]")
-                    time.sleep(10)
-                    return self._tts_request(text, retry_count + 1)
-                else:
-                    print("[Voice error: Rate limit exceeded]")
-                    return None
+                ## Still rate limited after every backoff retry
+                print("[Voice error: Rate limit exceeded]")
+                return None
 
             elif status == 422:
                 ## Invalid text - try cleaning further
@@ -235,7 +509,7 @@ class VoiceEngine:
                 ## Remove all non-ASCII
                 clean = ''.join(c for c in text if ord(c) < 128)
                 if clean and retry_count < 1:
-                    return self._tts_request(clean, retry_count + 1)
+                    return self._tts_request(clean, retry_count + 1, stream, token)
                 return None
 
             else:
@@ -250,6 +524,109 @@ class VoiceEngine:
             print(f"[Voice error: {e}]")
             return None
 
+    def _post(self, url, headers, payload, stream=False, token=None):
+        """
+        POST on the pooled session, retrying 429/5xx answers and failed
+        connections with exponential backoff (or the server's
+        Retry-After). The request is logged for get_stats().
+
+        Args:
+            url: Endpoint
+            headers: Request headers
+            payload: JSON body
+            stream: Don't read the body yet
+            token: Cancel token - a skip() during a backoff wait gives up
+
+        Returns:
+            requests.Response: Final response (may still be an error
+                               status), or None if skipped
+
+        Raises:
+            requests.RequestException: The last attempt failed to connect
+        """
+        token = token or threading.Event()
+        started = time.perf_counter()
+        response = error = None
+        response_ms = None
+        attempt = 0
+
+        while True:
+            attempt += 1
+            sent = time.perf_counter()
+            try:
+                response = self.session.post(
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                    stream=stream
+                )
+                error = None
+                response_ms = (time.perf_counter() - sent) * 1000
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+
+            if error is None and response.status_code not in RETRY_STATUSES:
+                break
+            if attempt >= self.retry_attempts:
+                break
+
+            delay = self._backoff(attempt, response)
+            reason = f"HTTP {response.status_code}" if response is not None else "connection failed"
+            print(f"[Voice: {reason} - retrying in {delay:.1f}s]")
+            if response is not None:
+                response.close()  ## Hand the connection back to the pool
+            if token.wait(delay):
+                response = error = None
+                break
+
+        self.request_log.append({
+            "status": response.status_code if response is not None else None,
+            "attempts": attempt,
+            "response_ms": response_ms,
+            "total_ms": (time.perf_counter() - started) * 1000,
+        })
+
+        if error is not None:
+            raise error
+        return response
+
+    def _backoff(self, attempt, response):
+        """
+        Seconds to wait before retry number `attempt`.
+
+        Args:
+            attempt: Attempts made so far (1 = first retry next)
+            response: Last response, or None if it didn't connect
+
+        Returns:
+            float: Delay, at most BACKOFF_MAX
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.backoff_base * 2 ** (attempt - 1)
+        return min(max(delay, 0.0), BACKOFF_MAX)
+
+    def get_stats(self):
+        """
+        Summarize recent ElevenLabs requests.
+
+        Returns:
+            dict: requests, retries, failed, median_ms and slowest_ms
+                  (time until the response started arriving)
+        """
+        log = list(self.request_log)
+        times = sorted(entry["response_ms"] for entry in log if entry["response_ms"] is not None)
+        return {
+            "requests": len(log),
+            "retries": sum(entry["attempts"] - 1 for entry in log),
+            "failed": sum(1 for entry in log if entry["status"] != 200),
+            "median_ms": times[len(times) // 2] if times else 0.0,
+            "slowest_ms": times[-1] if times else 0.0,
+        }
+
     def _play_audio(self, audio_data):
         """
         Play audio data using mpg123.
@@ -269,7 +646,7 @@ class VoiceEngine:
             ## Play with mpg123 (quiet mode, suppress debug output)
             ## CRITICAL: stdin=DEVNULL prevents mpg123 from stealing keyboard input
             self.process = subprocess.Popen(
-                ["mpg123", "-q", self.temp_file],
+                [*self.player_command, self.temp_file],
                 stdin=subprocess.DEVNULL,
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL
@@ -285,23 +662,87 @@ class VoiceEngine:
             print(f"[Voice error: {e}]")
             return False
 
-    def wait(self):
+    def _start_stream_player(self):
         """
-        Wait for current playback to finish.
+        Start "mpg123 -" reading MP3 from a pipe.
+
+        Returns:
+            bool: True if the player started
         """
-        if self.process:
+        try:
+            ## stdin is our pipe, never the terminal; unbuffered so the
+            ## first chunk reaches the player straight away
+            self.process = subprocess.Popen(
+                [*self.player_command, "-"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                bufsize=0
+            )
+            return True
+
+        except FileNotFoundError:
+            print("[Voice error: mpg123 not installed. Run: apt install mpg123]")
+            return False
+
+        except Exception as e:
+            print(f"[Voice error: {e}]")
+            return False
+
+    def _pipe_audio(self, chunks, token):
+        """
+        Feed audio chunks to the stream player as they arrive.
+
+        Stops early if skipped (the player is killed - broken pipe).
+
+        Args:
+            chunks: Iterable of MP3 bytes (AudioStream or [bytes])
+            token: The clip's cancel token
+        """
+        process = self.process
+        try:
+            for chunk in chunks:
+                if token.is_set() or process.poll() is not None:
+                    break
+                process.stdin.write(chunk)
+        except (OSError, requests.RequestException):
+            pass  ## Skipped mid-write, or the download failed
+        finally:
+            if isinstance(chunks, AudioStream):
+                chunks.close()
             try:
-                self.process.wait()
-            except Exception:
+                process.stdin.close()  ## End of file - player finishes up
+            except OSError:
                 pass
 
-        ## Clean up temp file
-        if self.temp_file and os.path.exists(self.temp_file):
+    def wait(self):
+        """
+        Wait until everything queued has been played (or skipped).
+        """
+        self.clips.join()
+
+    def _wait_clip(self):
+        """
+        Wait for the playing clip to finish, then delete its temp file.
+        """
+        process = self.process  ## skip() may clear it meanwhile
+        if process:
             try:
-                os.unlink(self.temp_file)
+                process.wait()
             except Exception:
                 pass
-            self.temp_file = None
+
+        with self.lock:
+            if self.process is process:
+                self.process = None
+
+            ## Clean up temp file
+            if self.temp_file and os.path.exists(self.temp_file):
+                try:
+                    os.unlink(self.temp_file)
+                except Exception:
+                    pass
+                self.temp_file = None
 
 
 ## ============================================================
@@ -331,6 +772,7 @@ if __name__ == "__main__":
         print("Waiting for playback...")
         voice.wait()
         print("Done!")
+        print(f"Requests: {voice.get_stats()}")
     else:
         print("Voice failed.")
 
@@ -8,17 +8,32 @@
 
 import os
 import sys
+import json
+import time
+import threading
 import subprocess
 import tempfile
 from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 ## Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from digger.config import load_config, PACKAGE_DIR, SYSTEM_PROMPT
-from digger.rag import RAGSearch
+from digger.rag import RAGSearch, reciprocal_rank_fusion
+from digger.cache import QueryCache
+from digger.index import RAGIndex, tokenize, MAX_PREFIX_TERMS
+from digger.query import parse_query
+from digger.vectors import VectorIndex
+from digger.ann import IVFIndex, recall_at_k
 from digger.session import Session
-from digger.ollama import OllamaClient
+from digger.history import HistoryIndex
+from digger.context import ContextBuilder
+from digger.summary import Summarizer
+from digger.ollama import OllamaClient, benchmark_ttft, normalize_host
+from digger.voice import VoiceEngine, AudioStream
+from digger.speech import SentenceSplitter, SpeechPipeline
+from digger.tts_cache import AudioCache
 
 
 ## ============================================================
@@ -114,6 +129,388 @@ def test_rag_bounds():
     results = rag.search("the")  ## Common word, many matches
     assert len(results) <= 8500, f"Results too long: {len(results)}"
 
+@test("RAG index is saved and reused on next startup")
+def test_rag_index_persists():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text("# Net\nTCP uses a three-way handshake\nUDP does not\n")
+        rag = RAGSearch(tmpdir)
+        assert rag.index.index_path.exists(), "Index not written"
+        assert "handshake" in rag.search("tcp handshake")
+        assert rag.search("udp handshake", mode="keyword") == ""  ## Different lines
+
+        index = RAGIndex(tmpdir)
+        assert index.refresh() is False, "Index rebuilt instead of loaded"
+        assert index.lookup(tokenize("TCP")) == {"net.md": [1]}
+        assert index.state == rag.index.state
+
+        ## Rebuilt from scratch: generation restarts, the epoch doesn't repeat
+        os.unlink(index.index_path)
+        rebuilt = RAGIndex(tmpdir)
+        rebuilt.refresh()
+        assert rebuilt.generation == index.generation
+        assert rebuilt.state != index.state
+
+@test("RAG index picks up new notes and edited files")
+def test_rag_index_refresh():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text("TCP\n")
+        rag = RAGSearch(tmpdir)
+        rag.add_note("VLANs split broadcast domains")
+        assert "VLANs" in rag.search("vlans")
+        Path(tmpdir, "net.md").write_text("ARP resolves MAC addresses\n")
+        assert "ARP" in rag.search("arp")
+        assert rag.search("tcp") == ""
+
+@test("RAG bm25 ranks the most relevant section first")
+def test_rag_bm25():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "a.md").write_text(
+            "# Intro\nTCP is mentioned once here.\n"
+            "# Handshake\nThe TCP handshake: SYN, SYN-ACK, ACK. TCP handshake again.\n"
+        )
+        Path(tmpdir, "b.md").write_text("# UDP\nUDP has no handshake.\n")
+        rag = RAGSearch(tmpdir, mode="bm25")
+        ranked = rag.index.rank(tokenize("tcp handshake"))
+        assert ranked[0][1:] == ("a.md", 1), f"Wrong top section: {ranked[0]}"
+        results = rag.search("tcp handshake")
+        assert results.startswith("[SOURCE: a.md]\n# Handshake")
+        assert "# UDP" in results  ## OR semantics - partial match still ranked
+        assert len(results) <= 8500
+
+        ## df survives remove/append round trips
+        rag.add_note("more TCP notes", "b.md")
+        rebuilt = RAGIndex(tmpdir)
+        rebuilt.build()
+        assert rag.index.df == rebuilt.df
+        assert rag.index.files["b.md"]["sections"] == rebuilt.files["b.md"]["sections"]
+
+@test("Query parser handles AND / OR / phrase / prefix")
+def test_query_parse():
+    assert parse_query("TCP handshake") == ("all", ["tcp", "handshake"])
+    assert parse_query("tcp OR udp") == ("or", [("all", ["tcp"]), ("all", ["udp"])])
+    assert parse_query('"three way" hand*') == ("and", [("phrase", ["three", "way"]), ("prefix", "hand")])
+    assert parse_query("tcp AND udp") == ("and", [("term", "tcp"), ("term", "udp")])
+    assert parse_query("TCP/IP") == ("phrase", ["tcp", "ip"])
+    assert parse_query("  OR ") is None
+
+@test("RAG prefix expansion keeps the most common matching terms")
+def test_rag_prefix_cap():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rare = " ".join(f"aa{i:02d}" for i in range(MAX_PREFIX_TERMS + 10))
+        common = "".join(f"# Cloud {i}\nazure zone\n" for i in range(3))
+        Path(tmpdir, "kb.md").write_text(f"# Rare\n{rare}\n{common}")
+        index = RAGIndex(tmpdir)
+        index.refresh()
+
+        terms = index.expand_prefix("a")
+        assert len(terms) == MAX_PREFIX_TERMS and terms == sorted(terms)
+        assert "azure" in terms, "Frequent term sorting late was dropped"
+        assert index.expand_prefix("az") == ["azure"]
+        assert index.expand_prefix("q") == []
+
+@test("RAG boolean queries use postings set operations")
+def test_rag_boolean_queries():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text(
+            "# TCP\nthree way handshake\nway three handshake\n"
+            "# UDP\nUDP is connectionless\nno handshake here\n"
+        )
+        index = RAGIndex(tmpdir)
+        index.refresh()
+        assert index.match(parse_query('"three way handshake"')) == {"net.md": {1}}
+        assert index.match(parse_query("tcp OR udp")) == {"net.md": {0, 3, 4}}
+        assert index.match(parse_query("hand*")) == {"net.md": {1, 2, 5}}
+        assert index.match(parse_query("udp AND handshake")) == {}
+        assert index.match(parse_query("udp AND handshake"), by_section=True) == {"net.md": {1}}
+
+        rag = RAGSearch(tmpdir)
+        assert rag.search("udp AND handshake").startswith("[SOURCE: net.md]\n# UDP")
+        assert rag.search('"handshake three"', mode="keyword") == ""
+
+@test("Chunker splits on markdown structure, not mid-table or in code")
+def test_rag_chunker():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        table = "".join(f"| row {i} | firewall rule {i} |\n" for i in range(80))
+        Path(tmpdir, "kb.md").write_text(
+            "SECTION 1: PORTS\n-----\nSSH is port 22\n\n"
+            "```bash\n# not a heading\nls -la\n```\n"
+            "## Firewalls\n" + table + "\nAfter the table\n"
+        )
+        index = RAGIndex(tmpdir)
+        index.refresh()
+        sections = index.files["kb.md"]["sections"]
+        assert [s[3] for s in sections] == ["SECTION 1: PORTS", "Firewalls", "Firewalls"]
+        text = index.section_text("kb.md", 1)
+        assert text.startswith("## Firewalls") and text.endswith("| row 79 | firewall rule 79 |\n\n")
+        assert index.section_span("kb.md", 2)[3] is True  ## Continuation chunk
+
+        rag = RAGSearch(tmpdir, mode="keyword")
+        assert rag.search("after").startswith("[SOURCE: kb.md]\nAfter the table")
+        assert rag.list_files() == [("kb.md", 91, "2.4KB")]
+        assert "ls -la" in rag.search("ssh")
+
+@test("RAG reads only the bytes of the sections it returns")
+def test_rag_mmap_sections():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        body = "Ünïcödé line about firewalls\n" * 200
+        Path(tmpdir, "kb.md").write_text("# Big\n" + body + "\n# Small\nfirewall rule of thumb\n")
+        index = RAGIndex(tmpdir)
+        index.refresh()
+        spans = []
+        original = index._read_spans
+        index._read_spans = lambda name, wanted: (spans.append(wanted), original(name, wanted))[1]
+
+        last = len(index.files["kb.md"]["sections"]) - 1
+        assert index.section_text("kb.md", last) == "# Small\nfirewall rule of thumb\n"
+        start, end = spans[-1][last]
+        assert end - start == len("# Small\nfirewall rule of thumb\n")
+
+        trimmed = index.section_text("kb.md", 0, max_bytes=101)
+        assert "\ufffd" not in trimmed and len(trimmed.encode("utf-8")) <= 101
+
+        assert index.match(parse_query('"rule of thumb"')) == {"kb.md": {len(body.splitlines()) + 3}}
+
+class StubEmbedder:
+    """Tiny 'semantic' embedder: synonyms share a dimension."""
+    model = "stub"
+    CONCEPTS = [
+        {"firewall", "acl", "acls", "rules", "filter"},
+        {"cat", "cats", "kitten"},
+        {"disk", "storage", "ssd"},
+    ]
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self, texts):
+        if self.fail:
+            raise ConnectionError("embedder down")
+        self.calls += len(texts)
+        return [[sum(word in concept for word in tokenize(text)) + 0.01 * i
+                 for i, concept in enumerate(self.CONCEPTS)] for text in texts]
+
+@test("RAG vector mode finds synonyms with a stubbed embedder")
+def test_rag_vector_search():
+    if not VectorIndex.available():
+        return  ## numpy not installed - vector mode is optional
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text("# ACL\nAccess control lists filter packets\n# Pets\nCats and kittens\n")
+        Path(tmpdir, "hw.md").write_text("# Storage\nSSD versus spinning disk\n")
+        embedder = StubEmbedder()
+        rag = RAGSearch(tmpdir, mode="vector", embedder=embedder)
+        assert rag.search("firewall", mode="bm25") == ""  ## No keyword match
+        results = rag.search("firewall")
+        assert results.startswith("[SOURCE: net.md]\n# ACL"), results[:60]
+        assert embedder.calls == 4  ## 3 sections + the query
+
+        ## Saved to disk; add_note only re-embeds hw.md (its old section
+        ## gains a blank line, plus the new note) - net.md is reused
+        assert rag.vectors.vectors_path.exists()
+        rag.add_note("kitten photos", "hw.md")
+        rag.search("cat")
+        assert embedder.calls == 4 + 2 + 1, embedder.calls
+
+        reloaded = VectorIndex(rag.index, embedder)
+        assert reloaded.refresh() is False  ## Loaded, nothing re-embedded
+        assert reloaded.search("storage", k=1)[0][1:] == ("hw.md", 0)
+
+@test("RAG never searches vectors built for an older index")
+def test_rag_vectors_stale():
+    if not VectorIndex.available():
+        return
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = Path(tmpdir, "net.md")
+        kb.write_text("# ACL\nAccess control lists\n# Pets\nCats\n# Disk\nSSD storage\n")
+        embedder = StubEmbedder()
+        rag = RAGSearch(tmpdir, mode="vector", embedder=embedder)
+        assert rag.search("firewall").startswith("[SOURCE: net.md]\n# ACL")
+
+        ## Embedder down while the file shrinks - bm25, not old keys
+        embedder.fail = True
+        kb.write_text("# Disk\nNVMe storage\n")
+        assert rag.search("storage").startswith("[SOURCE: net.md]\n# Disk")
+        assert rag.vector_fallback and not rag.vectors.is_current()
+
+        ## Index rebuilt from scratch: same generation, different epoch
+        embedder.fail = False
+        rag.search("storage")
+        os.unlink(rag.index.index_path)
+        kb.write_text("# Pets\nCats\n")
+        fresh = RAGSearch(tmpdir, mode="vector", embedder=embedder)
+        assert fresh.search("kitten").startswith("[SOURCE: net.md]\n# Pets")
+        assert fresh.vectors.keys == [("net.md", 0, fresh.vectors.keys[0][2])]
+
+@test("RAG hybrid mode fuses bm25 and vector rankings")
+def test_rag_hybrid_search():
+    ## Fusion on its own: top of both lists beats top of one
+    fused = reciprocal_rank_fusion([
+        [(9.0, "a.md", 0), (5.0, "b.md", 0)],
+        [(0.9, "b.md", 0), (0.8, "c.md", 0)],
+    ])
+    assert [hit[1] for hit in fused] == ["b.md", "a.md", "c.md"], fused
+
+    if not VectorIndex.available():
+        return
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text("# ACL\nAccess control lists filter packets\n# Firewall\nA firewall blocks ports\n")
+        Path(tmpdir, "pets.md").write_text("# Pets\nCats and kittens\n")
+        rag = RAGSearch(tmpdir, mode="hybrid", embedder=StubEmbedder())
+
+        ## Lexical finds "Firewall", vector adds the ACL section too
+        results = rag.search("firewall")
+        assert "# Firewall" in results and "# ACL" in results, results
+        for stage in ("refresh", "lexical", "vector", "fuse", "read", "total"):
+            assert stage in rag.timings, rag.timings
+        assert rag.timing_summary().startswith("total ")
+
+        ## Operators still filter both sides
+        assert "# ACL" not in rag.search('"blocks ports"')
+
+@test("RAG IVF index matches brute force recall and persists")
+def test_rag_ann_index():
+    if not VectorIndex.available():
+        return
+    import numpy as np
+
+    ## 2000 vectors around 20 topics
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((20, 32))
+    matrix = topics[rng.integers(0, 20, 2000)] + 0.5 * rng.standard_normal((2000, 32))
+    matrix = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float16)
+    queries = np.asarray(matrix[:50], dtype=np.float32)
+
+    ivf = IVFIndex()
+    ivf.train(matrix, nlist=40)
+    ivf.assign(matrix, state=("abc", 3))
+    assert recall_at_k(ivf, matrix, queries, k=10, nprobe=40) == 1.0  ## Exact
+    assert recall_at_k(ivf, matrix, queries, k=10, nprobe=8) >= 0.9
+    assert recall_at_k(ivf, matrix, queries, k=10, nprobe=1) <= recall_at_k(ivf, matrix, queries, k=10, nprobe=8)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir, "ann.npz")
+        assert ivf.save(path)
+        loaded = IVFIndex()
+        assert loaded.load(path) and loaded.state == ("abc", 3)
+        assert loaded.search(matrix, queries[0], k=5, nprobe=8)[1].tolist() == ivf.search(matrix, queries[0], k=5, nprobe=8)[1].tolist()
+
+        ## VectorIndex switches to IVF past ann_min_rows
+        Path(tmpdir, "kb.md").write_text("".join(f"# Note {i}\nfirewall cat disk {i}\n" for i in range(30)))
+        rag = RAGSearch(tmpdir, mode="vector", embedder=StubEmbedder())
+        rag.vectors = VectorIndex(rag.index, rag.embedder, ann_min_rows=10)
+        assert rag.search("firewall")
+        assert rag.vectors.ann is not None and rag.vectors.ann_path.exists()
+
+        ## Index rebuilt (same generation and rows, new epoch), and a
+        ## crash left the old ann.npz behind - it must not be reused
+        old_ann = rag.vectors.ann_path.read_bytes()
+        os.unlink(rag.index.index_path)
+        rebuilt = RAGSearch(tmpdir, mode="vector", embedder=StubEmbedder())
+        rebuilt.vectors = VectorIndex(rebuilt.index, rebuilt.embedder, ann_min_rows=10)
+        assert rebuilt.search("firewall")
+        assert rebuilt.index.generation == rag.index.generation
+        rebuilt.vectors.ann_path.write_bytes(old_ann)
+
+        reloaded = VectorIndex(rebuilt.index, rebuilt.embedder, ann_min_rows=10)
+        assert reloaded.load()
+        assert reloaded.ann.state == rebuilt.index.state, "Old IVF lists were reused"
+        saved = IVFIndex()
+        assert saved.load(reloaded.ann_path) and saved.state == rebuilt.index.state
+
+@test("RAG search results are cached until the KB changes")
+def test_rag_query_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = Path(tmpdir, "kb.md")
+        kb.write_text("# TCP\nTCP handshake is three way\n")
+        rag = RAGSearch(tmpdir, persist_cache=True)
+
+        first = rag.search("TCP handshake")
+        assert rag.search("tcp   HANDSHAKE") == first  ## Normalized query
+        assert "cache" in rag.timings
+        assert rag.cache.stats()["hits"] == 1
+        rag.search("TCP handshake", mode="keyword")  ## Different params
+        assert rag.cache.stats()["hits"] == 1
+
+        ## add_note invalidates
+        rag.add_note("handshake retries on loss", "kb.md")
+        assert "retries" in rag.search("TCP handshake")
+        assert rag.cache.stats()["hits"] == 1
+
+        ## Persisted at close: a new instance hits straight away...
+        rag.close()
+        again = RAGSearch(tmpdir, persist_cache=True)
+        assert "retries" in again.search("tcp handshake")
+        assert again.cache.stats()["hits"] == 1
+        assert again.get_stats()["cache_hit_rate"] == "100%"
+
+        ## ...unless a file changed in between
+        kb.write_text("# TCP\nTCP handshake uses SYN\n")
+        fresh = RAGSearch(tmpdir, persist_cache=True)
+        assert "SYN" in fresh.search("tcp handshake")
+        assert fresh.cache.stats()["hits"] == 0
+
+        ## ...or the index was rebuilt (generation back to the same number)
+        fresh.close()
+        os.unlink(fresh.index.index_path)
+        kb.write_text("# TCP\nTCP handshake uses SYN and ACK\n")
+        rebuilt = RAGSearch(tmpdir, persist_cache=True)
+        assert "ACK" in rebuilt.search("tcp handshake")
+
+        ## Capacity 0 caches nothing, saved entries included
+        assert len(QueryCache(capacity=0, path=rebuilt.cache.path).entries) == 0
+
+@test("RAG add_note updates the index in place")
+def test_rag_index_incremental():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text("TCP\n")
+        Path(tmpdir, "os.md").write_text("Linux kernel")  ## No trailing newline
+        rag = RAGSearch(tmpdir)
+        calls = []
+        original = rag.index._add_file
+        rag.index._add_file = lambda name: (calls.append(name), original(name))
+
+        rag.add_note("subnet masks", "net.md")
+        rag.add_note("systemd units", "os.md")
+        assert calls == [], f"Re-tokenized: {calls}"
+        assert rag.index.updates_path.exists(), "Update not logged"
+
+        ## Fresh load replays the log and matches a full rebuild
+        reloaded = RAGIndex(tmpdir)
+        reloaded.load()
+        rebuilt = RAGIndex(tmpdir)
+        rebuilt.build()
+        assert reloaded.postings == rebuilt.postings
+        assert reloaded.files == rebuilt.files
+        assert reloaded.df == rebuilt.df
+
+        ## Touch without changing content - no re-tokenize
+        os.utime(Path(tmpdir, "net.md"), (0, 0))
+        assert rag.index.refresh() is True
+        assert calls == []
+
+@test("RAG index drops an edited file without scanning the vocabulary")
+def test_rag_index_remove_file():
+    class NoScan(dict):
+        def __iter__(self):
+            raise AssertionError("Scanned every term")
+        keys = __iter__
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "net.md").write_text("# TCP\nTCP handshake\n# UDP\nUDP datagrams\n")
+        Path(tmpdir, "os.md").write_text("# Linux\nkernel modules and handshake\n")
+        index = RAGIndex(tmpdir)
+        index.refresh()
+
+        index.postings = NoScan(index.postings)
+        Path(tmpdir, "net.md").write_text("# ARP\nARP resolves MAC addresses\n")
+        assert index.refresh() is True
+
+        rebuilt = RAGIndex(tmpdir)
+        rebuilt.build()
+        assert dict(index.postings.items()) == rebuilt.postings
+        assert index.df == rebuilt.df
+        assert index._get_file_terms() == rebuilt._get_file_terms()
+
 
 ## ============================================================
 ## SESSION TESTS
@@ -142,6 +539,265 @@ def test_session_context():
         assert "Digger" in context  ## System prompt mentions Digger
         assert "George: hello" in context
 
+@test("Session context fits the token budget")
+def test_session_context_budget():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        builder = ContextBuilder(num_ctx=1000, reply_tokens=200, tokenizer=lambda text: len(text.split()))
+        session = Session(memory_dir=tmpdir, builder=builder)
+
+        ## The same section loaded twice is only sent once
+        tcp = "[SOURCE: net.md]\nTCP three way handshake"
+        session.add_context(tcp, topic="tcp")
+        session.add_context(tcp + "\n\n[SOURCE: net.md]\nSYN then ACK", topic="handshake")
+        for i in range(200):
+            session.add_message("George" if i % 2 == 0 else "Digger", f"message {i} " + "word " * 8)
+
+        context = session.get_context()
+        report = builder.last_report
+        assert report["total"] <= report["budget"], report
+        assert context.count("TCP three way handshake") == 1
+        assert "SYN then ACK" in context
+        assert "message 199" in context and "message 0 " not in context
+        assert f"[{report['dropped_messages']} earlier messages not shown]" in context
+        assert open(session.filepath).read().count('"type": "knowledge"') == 2  ## Full copy on disk
+
+        ## Latest message survives even when it alone is too big
+        session.add_message("George", "huge " * 2000)
+        assert session.get_context().endswith("huge")
+
+class FakeSummaryClient:
+    """Stands in for OllamaClient; can be held until released."""
+    def __init__(self, reply="George covered TCP."):
+        self.reply = reply
+        self.prompts = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def chat(self, prompt, stream=True):
+        self.prompts.append(prompt)
+        self.release.wait(timeout=5)
+        return self.reply
+
+@test("Session summarizes old turns in the background")
+def test_session_summary():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = Session(memory_dir=tmpdir)
+        client = FakeSummaryClient()
+        summarizer = Summarizer(client, keep_recent=4, min_batch=4)
+
+        for i in range(6):
+            session.add_message("George", f"question {i}")
+        assert summarizer.maybe_start(session) is None  ## Only 2 old messages
+
+        for i in range(6, 12):
+            session.add_message("George", f"question {i}")
+        summarizer.maybe_start(session).join(timeout=5)
+        assert "question 7" in client.prompts[0] and "question 8" not in client.prompts[0]
+
+        context = session.get_context()
+        assert "[Earlier in this session: George covered TCP.]" in context
+        assert "question 0" not in context and "question 11" in context
+        assert "George covered TCP." in open(session.filepath).read()
+
+        ## Next summary builds on the last one
+        for i in range(12, 16):
+            session.add_message("George", f"question {i}")
+        summarizer.maybe_start(session).join(timeout=5)
+        assert "SUMMARY SO FAR:\nGeorge covered TCP." in client.prompts[1]
+        assert session.get_summary()["summarized_messages"] == 12
+
+        ## 'clear' while a summary is running throws the result away
+        for i in range(10):
+            session.add_message("George", f"more {i}")
+        client.release.clear()
+        thread = summarizer.maybe_start(session)
+        assert summarizer.maybe_start(session) is None  ## One at a time
+        session.clear()
+        client.release.set()
+        thread.join(timeout=5)
+        assert "Earlier in this session" not in session.get_context()
+
+@test("Session journal appends, compacts and reloads")
+def test_session_journal():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = Session(memory_dir=tmpdir, fsync="always")
+        session.add_context("[SOURCE: net.md]\nTCP is reliable", topic="tcp")
+        session.add_message("George", "what is TCP")
+        session.add_message("Digger", "Reliable, ya drongo 🦘")
+        session.apply_summary("Covered TCP.", 0, 1)
+
+        ## One line per change, nothing rewritten
+        lines = open(session.filepath, encoding="utf-8").read().splitlines()
+        assert len(lines) == 5 and json.loads(lines[0])["type"] == "header"
+
+        loaded = Session.load(session.filepath)
+        assert loaded.id == session.id
+        assert loaded.get_context() == session.get_context()
+        assert loaded.get_last_message("Digger") == "Reliable, ya drongo 🦘"
+
+        ## A torn last line (crash mid-write) is skipped and cleaned up
+        session.close()
+        with open(session.filepath, "a", encoding="utf-8") as f:
+            f.write('{"type": "message", "role": "Geo')
+        loaded = Session.load(session.filepath)
+        assert loaded.get_message_count() == 2
+        loaded.add_message("George", "and UDP?")
+        loaded.close()
+        assert Session.load(session.filepath).get_last_message() == "and UDP?"
+
+        ## Dead records (cleared turns) get compacted away
+        for i in range(40):
+            loaded.add_message("George", f"spam {i}")
+        loaded.clear()
+        loaded.add_message("George", "fresh start")
+        lines = open(session.filepath, encoding="utf-8").read().splitlines()
+        assert len(lines) < 10, len(lines)
+        assert Session.load(session.filepath).get_context() == loaded.get_context()
+
+@test("Session writes behind in a background thread")
+def test_session_write_behind():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = Session(memory_dir=tmpdir, fsync="always", write_behind=True)
+        session.add_context("[SOURCE: net.md]\nTCP is reliable", topic="tcp")
+        for i in range(200):
+            session.add_message("George", f"question {i}")
+        session.clear()  ## Compaction is queued behind the appends
+        session.add_message("George", "fresh start")
+
+        ## In memory straight away, on disk after flush()
+        assert session.get_message_count() == 1
+        session.flush()
+        loaded = Session.load(session.filepath)
+        assert loaded.get_context() == session.get_context()
+        assert len(open(session.filepath, encoding="utf-8").read().splitlines()) < 10
+
+        ## close() drains the queue and stops the writer thread
+        session.add_message("Digger", "Good, ya drongo")
+        session.close()
+        assert not any(t.name == "session-writer" for t in threading.enumerate())
+        assert Session.load(session.filepath).get_last_message() == "Good, ya drongo"
+
+
+@test("Session resumes latest, by id, and from old .txt files")
+def test_session_resume():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ## An old free-form session (multi-line answer included)
+        legacy = Path(tmpdir) / "session_20260101_090000.txt"
+        legacy.write_text(
+            "## Session: 20260101_090000\n## Started: 2026-01-01T09:00:00\n\n"
+            "## === RAG CONTEXT ===\n\n=== KNOWLEDGE ON 'tcp' ===\n[SOURCE: net.md]\nTCP is reliable\n=== END KNOWLEDGE ===\n\n"
+            "## === CONVERSATION ===\nGeorge: what is TCP\nDigger: Reliable.\nThree-way handshake.\n",
+            encoding="utf-8"
+        )
+        session = Session(memory_dir=tmpdir)
+        session.add_message("George", "newest")
+        session.close()
+
+        latest = Session.resume(tmpdir)
+        assert latest.id == session.id and latest.get_last_message() == "newest"
+
+        old = Session.resume(tmpdir, "20260101")
+        assert old.started == "2026-01-01T09:00:00"
+        assert old.get_summary()["knowledge_blocks"] == 1
+        assert old.get_last_message("Digger") == "Reliable.\nThree-way handshake."
+        old.add_message("George", "and UDP?")
+        old.close()
+
+        ## Converted once - the journal is used from now on
+        assert old.filepath.suffix == ".jsonl"
+        again = Session.resume(tmpdir, "20260101_090000")
+        assert again.filepath == old.filepath and again.get_message_count() == 3
+
+        try:
+            Session.resume(tmpdir, "1999")
+            assert False, "Should raise"
+        except FileNotFoundError:
+            pass
+
+
+@test("History index searches past answers and follows appends")
+def test_history_index():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        (Path(tmpdir) / "session_20260101_090000.txt").write_text(
+            "## Session: 20260101_090000\n\n## === CONVERSATION ===\n"
+            "George: what is a firewall\nDigger: Filters traffic by rules.\n",
+            encoding="utf-8"
+        )
+        old = Session(memory_dir=tmpdir)
+        old.add_message("George", "explain the tcp handshake")
+        old.add_message("Digger", "SYN, SYN-ACK, ACK, ya drongo.")
+
+        history = HistoryIndex(tmpdir)
+        hits = history.search("tcp handshake")
+        assert hits[0]["session"] == old.id and hits[0]["question"] == "explain the tcp handshake"
+        assert history.search("firewall")[0]["answer"] == "Filters traffic by rules."
+
+        ## New turns are read from the saved offset, not the whole file,
+        ## and logged without rewriting the snapshot
+        offset = history.files[old.filepath.name]["offset"]
+        snapshot = history.index_path.read_bytes()
+        old.add_message("George", "and udp?")
+        old.add_message("Digger", "UDP just fires packets off.")
+        assert history.search("udp")[0]["answer"] == "UDP just fires packets off."
+        assert history.files[old.filepath.name]["offset"] > offset
+        assert history.get_stats()["answers"] == 3
+        assert history.index_path.read_bytes() == snapshot
+        assert history.updates_path.exists()
+
+        ## The log replays to the same index
+        replayed = HistoryIndex(tmpdir)
+        replayed.load()
+        assert replayed.docs == history.docs and replayed.files == history.files
+        assert replayed.postings == history.postings
+        assert replayed.generation == history.generation
+
+        ## Saved to disk; a compacted journal is re-indexed whole
+        old.clear()
+        old._compact()
+        reloaded = HistoryIndex(tmpdir)
+        assert reloaded.get_stats()["answers"] == 1
+        assert not reloaded.search("udp")
+
+        ## The session in progress can be left out
+        reloaded.exclude = "20260101_090000"
+        assert not reloaded.search("firewall")
+
+    ## The live session is not indexed until it is finished
+    with tempfile.TemporaryDirectory() as tmpdir:
+        live = Session(memory_dir=tmpdir)
+        live.add_message("George", "what is dns")
+        live.add_message("Digger", "Names to addresses.")
+        watching = HistoryIndex(tmpdir, exclude=live.id)
+        assert not watching.search("dns")
+        assert live.filepath.name not in watching.files
+        live.close()
+        watching.finish_session()
+        assert live.filepath.name in watching.files
+        watching.exclude = None
+        assert watching.search("dns")[0]["answer"] == "Names to addresses."
+
+@test("RAG search can add past answers")
+def test_rag_history_merge():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rag_dir = Path(tmpdir) / "RAG"
+        rag_dir.mkdir()
+        (rag_dir / "net.md").write_text("# TCP\nTCP is reliable.\n", encoding="utf-8")
+        memory_dir = Path(tmpdir) / "memory"
+        session = Session(memory_dir=memory_dir)
+        session.add_message("George", "tcp?")
+        session.add_message("Digger", "TCP retransmits lost segments.")
+
+        rag = RAGSearch(rag_dir=rag_dir, history=HistoryIndex(memory_dir))
+        results = rag.search("tcp")
+        assert results.startswith("[SOURCE: net.md")
+        assert f"[SOURCE: session {session.id}]" in results
+        assert "history" in rag.timings
+
+        ## Cached KB results still pick up new answers
+        session.add_message("George", "tcp again")
+        session.add_message("Digger", "TCP orders segments too.")
+        assert "TCP orders segments too." in rag.search("tcp")
+
 
 ## ============================================================
 ## OLLAMA TESTS
@@ -151,6 +807,165 @@ def test_ollama_init():
     ollama = OllamaClient(model="mistral")
     assert ollama.model == "mistral"
 
+@test("OLLAMA_HOST values become base URLs with a port")
+def test_ollama_host():
+    assert normalize_host("0.0.0.0") == "http://0.0.0.0:11434"
+    assert normalize_host("localhost/") == "http://localhost:11434"
+    assert normalize_host("127.0.0.1:8080") == "http://127.0.0.1:8080"
+    assert normalize_host("http://localhost:11434/") == "http://localhost:11434"
+    assert normalize_host("https://ollama.example.com") == "https://ollama.example.com"
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Streams canned /api/generate replies like the Ollama server."""
+    protocol_version = "HTTP/1.1"  ## Keep-alive + chunked, like the real one
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        self.server.clients.add(self.client_address)
+
+        if body["model"] != "mistral":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for piece in self.server.reply:
+            self._chunk(json.dumps({"response": piece, "done": False}) + "\n")
+        done = {"response": "", "done": True, "context": [len(self.server.requests)], "prompt_eval_count": 7}
+        self._chunk(json.dumps(done) + "\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_ollama(reply):
+    """Start a stub Ollama server in a thread; returns (server, url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllamaHandler)
+    server.reply = reply
+    server.requests = []
+    server.clients = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+@test("Ollama http transport streams over one kept-alive connection")
+def test_ollama_http_transport():
+    server, url = start_stub_ollama(["G'day", " mate, ", "TCP is réliable"])
+    try:
+        ollama = OllamaClient(model="mistral", transport="http", host=url)
+        assert ollama.chat("What is TCP?", stream=False) == "G'day mate, TCP is réliable"
+        assert ollama.chat("Again", stream=False)
+        assert server.requests[0] == {"model": "mistral", "prompt": "What is TCP?", "stream": True}
+        assert len(server.clients) == 1, server.clients  ## Connection reused
+
+        results = benchmark_ttft({"http": ollama}, "hi", runs=2)
+        assert results["http"]["ttft_ms"] is not None
+        assert results["http"]["chars"] == len("G'day mate, TCP is réliable")
+
+        ## Missing model / dead server print a hint and return ""
+        assert OllamaClient("nope", "http", url).chat("hi", stream=False) == ""
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert OllamaClient("mistral", "http", url).chat("hi", stream=False) == ""
+
+FAKE_OLLAMA = """#!/usr/bin/env python3
+import sys, time
+prompt = sys.stdin.read()
+reply = ("G'day \U0001f998 café! " * 3).encode("utf-8")
+for i in range(len(reply)):  ## Byte by byte - splits every multi-byte char
+    sys.stdout.buffer.write(reply[i:i + 1])
+    sys.stdout.buffer.flush()
+    if i % 7 == 0:
+        time.sleep(0.001)
+"""
+
+@test("Ollama subprocess stream decodes split UTF-8 in chunks")
+def test_ollama_subprocess_stream():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fake = Path(tmpdir, "ollama")
+        fake.write_text(FAKE_OLLAMA)
+        fake.chmod(0o755)
+        old_path = os.environ["PATH"]
+        os.environ["PATH"] = tmpdir + os.pathsep + old_path
+        try:
+            ollama = OllamaClient(model="mistral")
+            expected = ("G'day \U0001f998 café! " * 3).strip()
+            assert ollama.chat("hi", stream=False) == expected
+
+            pieces = list(ollama.stream("hi"))
+            assert "".join(pieces).strip() == expected
+            assert "\ufffd" not in "".join(pieces)
+
+            ## Stopping early doesn't hang or raise
+            tokens = ollama.stream("hi")
+            assert next(tokens)
+            tokens.close()
+        finally:
+            os.environ["PATH"] = old_path
+
+@test("Ollama http sends only the new turn while the context continues")
+def test_ollama_incremental_context():
+    server, url = start_stub_ollama(["Fair ", "question"])
+    try:
+        ollama = OllamaClient(model="mistral", transport="http", host=url)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            session = Session(memory_dir=tmpdir)
+            session.add_context("TCP is reliable", topic="TCP")
+
+            session.add_message("George", "what is TCP")
+            reply = ollama.chat(session.get_context(), stream=False)
+            assert "context" not in server.requests[-1]
+            assert ollama.last_stats["mode"] == "full"
+
+            ## Next turn: only the new message, continuing the tokens
+            session.add_message("Digger", reply)
+            session.add_message("George", "and UDP?")
+            ollama.chat(session.get_context(), stream=False)
+            assert server.requests[-1]["prompt"] == "George: and UDP?"
+            assert server.requests[-1]["context"] == [1]
+            assert ollama.last_stats["mode"] == "incremental"
+
+            ## New knowledge changes the prefix - full rebuild
+            session.add_message("Digger", reply)
+            session.add_context("UDP is not", topic="UDP")
+            session.add_message("George", "compare them")
+            ollama.chat(session.get_context(), stream=False)
+            assert "context" not in server.requests[-1]
+            assert "UDP is not" in server.requests[-1]["prompt"]
+
+            ## Reply not saved (e.g. interrupted) - full rebuild too
+            session.add_message("George", "hello?")
+            ollama.chat(session.get_context(), stream=False)
+            assert "context" not in server.requests[-1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@test("Ollama warm-up preloads the model with keep_alive")
+def test_ollama_warm_up():
+    server, url = start_stub_ollama(["ok"])
+    try:
+        ollama = OllamaClient(model="mistral", transport="http", host=url, keep_alive="30m")
+        ollama.start_warm_up().join(timeout=5)
+        assert server.requests[0] == {"model": "mistral", "keep_alive": "30m"}
+
+        ollama.chat("hi", stream=False)
+        assert server.requests[1]["keep_alive"] == "30m"
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert OllamaClient("mistral", "http", url).warm_up() is False  ## Server gone
+
 @test("Ollama can list models")
 def test_ollama_list():
     ollama = OllamaClient(model="mistral")
@@ -208,6 +1023,308 @@ def test_streaming_order():
     assert voice_pos > 0, "voice_engine.speak not found"
     assert chat_pos < voice_pos, "Voice called before chat completes"
 
+class StubElevenLabsHandler(BaseHTTPRequestHandler):
+    """Answers TTS requests with fake MP3 bytes, like ElevenLabs."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, body))
+        self.server.clients.add(self.client_address)
+        if self.server.fail:
+            ## Queued error answers first (429 / 503 ...)
+            self.send_response(self.server.fail.pop(0))
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        audio = b"MP3:" + body["text"].encode("utf-8")
+
+        if self.path.endswith("/stream"):
+            ## First chunk now, the rest once the test releases it
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, piece in enumerate((audio[:4], audio[4:])):
+                if i:
+                    self.server.release.wait(5)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(audio)))
+        self.end_headers()
+        self.wfile.write(audio)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_elevenlabs():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubElevenLabsHandler)
+    server.requests = []
+    server.clients = set()
+    server.fail = []
+    server.release = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/text-to-speech/voice"
+
+class FakeVoiceEngine(VoiceEngine):
+    """VoiceEngine with sleeps instead of ElevenLabs and mpg123."""
+
+    def __init__(self, tts_delays=None):
+        super().__init__({"elevenlabs_api_key": "fake"})
+        self.tts_delays = tts_delays or {}
+        self.played = []
+
+    def _tts_request(self, text, retry_count=0, stream=False, token=None, wait_turn=None):
+        time.sleep(self.tts_delays.get(text, 0.01))
+        return text.encode()
+
+    def _play_audio(self, audio_data):
+        self.played.append(audio_data.decode())
+        return True
+
+    def _wait_clip(self):
+        time.sleep(0.02)
+
+@test("Sentence splitter keeps code blocks whole")
+def test_sentence_splitter():
+    splitter = SentenceSplitter(min_chars=10)
+    sentences = []
+    for piece in "Ok. TCP is reliable, mate. Try this:\n```\nx = 1. y = 2.\n```\nDone, ya drongo".split(" "):
+        sentences += splitter.feed(piece + " ")
+    sentences.append(splitter.flush())
+    assert sentences[0] == "Ok. TCP is reliable, mate."  ## Short "Ok." joined on
+    assert sentences[1] == "Try this:\n```\nx = 1. y = 2.\n```"  ## Not split at "1."
+    assert sentences[2] == "Done, ya drongo"
+
+@test("Speech pipeline plays sentences in order as they stream")
+def test_speech_pipeline():
+    first, second = "First sentence is a slow one.", "Second one comes back quicker."
+    voice = FakeVoiceEngine({first: 0.2, second: 0.01})
+    speech = SpeechPipeline(voice, min_chars=10)
+    speech.feed(first + " ")
+    speech.feed(second + " ")
+    time.sleep(0.4)
+
+    ## Audio started before the answer finished
+    assert voice.played == [first, second] and speech.first_audio is not None
+    speech.feed("Third.")
+    speech.finish()
+    voice.wait()
+    assert voice.played == [first, second, "Third."]
+
+    ## Cancelling drops what's still queued
+    voice = FakeVoiceEngine({"One slow sentence here.": 0.2})
+    speech = SpeechPipeline(voice, min_chars=10)
+    speech.feed("One slow sentence here. Two never gets played. ")
+    speech.finish()
+    speech.cancel()
+    voice.wait()
+    assert voice.played == []
+
+@test("Voice speak() returns at once and plays in order")
+def test_voice_queue():
+    voice = FakeVoiceEngine({"Slow first line.": 0.3})
+    started = time.perf_counter()
+    assert voice.speak("Slow first line.")
+    assert voice.speak("Quick second line.")
+    assert time.perf_counter() - started < 0.1  ## REPL isn't held up
+    assert voice.is_playing()
+    voice.wait()
+    assert voice.played == ["Slow first line.", "Quick second line."]
+
+    ## skip() drops the queue; later speech still plays
+    voice.speak("Slow first line.")
+    voice.speak("Never heard.")
+    voice.skip()
+    voice.speak("After the skip.")
+    voice.wait()
+    assert voice.played[2:] == ["After the skip."]
+    assert not voice.is_playing()
+
+@test("Voice clips are cached on disk with LRU eviction")
+def test_voice_cache():
+    server, url = start_stub_elevenlabs()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = {"elevenlabs_api_key": "fake", "voice_cache_dir": tmpdir, "voice_cache_mb": 1}
+            voice = VoiceEngine(config)
+            voice.api_url = url
+
+            ## Second request for the same line never reaches the API
+            assert voice._tts_request("Note added.") == b"MP3:Note added."
+            assert voice._tts_request("Note added.") == b"MP3:Note added."
+            assert len(server.requests) == 1
+            stats = voice.cache.stats()
+            assert stats["hits"] == 1 and stats["misses"] == 1 and stats["clips"] == 1
+
+            ## Another voice is another clip; clips survive a restart
+            other = VoiceEngine(dict(config, voice_id="other"))
+            other.api_url = url
+            other._tts_request("Note added.")
+            assert len(server.requests) == 2
+            assert VoiceEngine(config).cache.stats()["clips"] == 2
+
+        ## Least recently used clips go first once over the cap
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = AudioCache(tmpdir, max_bytes=250)
+            cache.put("a", b"x" * 100)
+            cache.put("b", b"x" * 100)
+            assert cache.get("a")
+            cache.put("c", b"x" * 100)
+            assert cache.get("b") is None and cache.get("a") and cache.get("c")
+            assert cache.stats()["bytes"] == 200
+            assert sorted(p.stem for p in Path(tmpdir).iterdir()) == ["a", "c"]
+    finally:
+        server.shutdown()
+
+@test("Voice streams audio into the player as it downloads")
+def test_voice_stream():
+    server, url = start_stub_elevenlabs()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = Path(tmpdir) / "played.mp3"
+            config = {"elevenlabs_api_key": "fake", "voice_stream": True,
+                      "voice_cache_dir": tmpdir, "voice_cache_mb": 1}
+            voice = VoiceEngine(config)
+            voice.api_url = url
+            ## Fake "mpg123 -q -": append stdin to a file as it arrives
+            voice.player_command = [sys.executable, "-c", (
+                "import os\n"
+                f"with open({str(out)!r}, 'ab', buffering=0) as f:\n"
+                "    for chunk in iter(lambda: os.read(0, 65536), b''):\n"
+                "        f.write(chunk)\n"
+            )]
+
+            assert voice.speak("G'day George.")
+            deadline = time.time() + 5
+            while time.time() < deadline and not (out.exists() and out.read_bytes()):
+                time.sleep(0.02)
+            assert out.read_bytes() == b"MP3:", "Playback should start on the first chunk"
+
+            server.release.set()
+            voice.wait()
+            assert out.read_bytes() == b"MP3:G'day George."
+            assert server.requests[0][0].endswith("/stream")
+            assert voice.temp_file is None
+
+            ## Completed stream was cached - replayed through the pipe
+            voice.speak("G'day George.")
+            voice.wait()
+            assert len(server.requests) == 1
+            assert out.read_bytes() == b"MP3:G'day George." * 2
+    finally:
+        server.release.set()
+        server.shutdown()
+
+class CountedStreamVoice(VoiceEngine):
+    """Stream-mode VoiceEngine counting how many streams are open at once."""
+
+    class Response:
+        def __init__(self, voice, audio):
+            self.voice, self.audio, self.closed = voice, audio, False
+            with voice.counter:
+                voice.open_streams += 1
+                voice.most_open = max(voice.most_open, voice.open_streams)
+
+        def iter_content(self, chunk_size):
+            yield self.audio
+
+        def close(self):
+            with self.voice.counter:
+                if not self.closed:
+                    self.closed = True
+                    self.voice.open_streams -= 1
+
+    def __init__(self, in_flight):
+        super().__init__({"elevenlabs_api_key": "fake", "voice_stream": True, "voice_in_flight": in_flight})
+        self.player_command = [sys.executable, "-c", "import sys; sys.stdin.buffer.read()"]
+        self.counter = threading.Lock()
+        self.open_streams = 0
+        self.most_open = 0
+
+    def _tts_request(self, text, retry_count=0, stream=False, token=None, wait_turn=None):
+        if wait_turn and not wait_turn():
+            return None
+        time.sleep(0.01)
+        return AudioStream(self.Response(self, text.encode()))
+
+@test("Voice stream mode keeps at most voice_in_flight streams open")
+def test_voice_stream_window():
+    voice = CountedStreamVoice(in_flight=3)
+    for i in range(12):
+        assert voice.speak(f"Sentence number {i}.")
+    voice.wait()
+    assert voice.most_open <= 3, f"{voice.most_open} streams open at once"
+    assert voice.open_streams == 0
+
+    ## Skipped clips waiting for the window give up instead of streaming
+    for i in range(12):
+        voice.speak(f"Skipped sentence {i}.")
+    voice.skip()
+    voice.wait()
+    assert voice.open_streams == 0
+
+@test("Voice stream mode plays cached clips without waiting for a stream slot")
+def test_voice_stream_cached():
+    server, url = start_stub_elevenlabs()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            voice = VoiceEngine({"elevenlabs_api_key": "fake", "voice_stream": True, "voice_in_flight": 1,
+                                 "voice_cache_dir": tmpdir, "voice_cache_mb": 1})
+            voice.api_url = url
+            voice.player_command = [sys.executable, "-c", "import sys; sys.stdin.buffer.read()"]
+            server.release.set()
+            voice.speak("Cached line.")
+            voice.wait()
+
+            ## The only stream slot is held by a clip still downloading
+            server.release.clear()
+            voice.speak("Slow streaming line.")
+            voice.speak("Cached line.")
+            _, future, _ = voice.clips.queue[-1]
+            assert future.result(timeout=2) == b"MP3:Cached line."
+            assert len(server.requests) == 2
+
+            server.release.set()
+            voice.wait()
+    finally:
+        server.release.set()
+        server.shutdown()
+
+@test("Voice requests reuse one connection and back off on errors")
+def test_voice_retry():
+    server, url = start_stub_elevenlabs()
+    try:
+        voice = VoiceEngine({"elevenlabs_api_key": "fake"})
+        voice.api_url = url
+        voice.backoff_base = 0.01
+
+        for text in ("One.", "Two.", "Three."):
+            assert voice._tts_request(text) == b"MP3:" + text.encode()
+        assert len(server.clients) == 1, "Keep-alive should reuse the connection"
+
+        server.fail = [429, 503]
+        assert voice._tts_request("Four.") == b"MP3:Four."
+        assert len(server.requests) == 6
+
+        ## Out of attempts - gives up with the last error
+        server.fail = [503] * voice.retry_attempts
+        assert voice._tts_request("Five.") is None
+
+        stats = voice.get_stats()
+        assert stats["requests"] == 5
+        assert stats["retries"] == 2 + voice.retry_attempts - 1
+        assert stats["failed"] == 1
+        assert stats["median_ms"] > 0
+    finally:
+        server.shutdown()
+
 
 ## ============================================================
 ## RUN ALL TESTS
@@ -230,16 +1347,43 @@ def run_all():
     test_rag_search_tcp()
     test_rag_search_acsc()
     test_rag_bounds()
+    test_rag_index_persists()
+    test_rag_index_refresh()
+    test_rag_bm25()
+    test_query_parse()
+    test_rag_prefix_cap()
+    test_rag_boolean_queries()
+    test_rag_chunker()
+    test_rag_mmap_sections()
+    test_rag_vector_search()
+    test_rag_vectors_stale()
+    test_rag_hybrid_search()
+    test_rag_ann_index()
+    test_rag_query_cache()
+    test_rag_index_incremental()
+    test_rag_index_remove_file()
 
     ## Session tests
     print("\n[SESSION TESTS]")
     test_session_creates()
     test_session_messages()
     test_session_context()
+    test_session_context_budget()
+    test_session_summary()
+    test_session_journal()
+    test_session_write_behind()
+    test_session_resume()
+    test_history_index()
+    test_rag_history_merge()
 
     ## Ollama tests
     print("\n[OLLAMA TESTS]")
     test_ollama_init()
+    test_ollama_host()
+    test_ollama_http_transport()
+    test_ollama_subprocess_stream()
+    test_ollama_incremental_context()
+    test_ollama_warm_up()
     test_ollama_list()
     test_ollama_check()
 
@@ -251,6 +1395,14 @@ def run_all():
     ## Streaming test
     print("\n[STREAMING TESTS]")
     test_streaming_order()
+    test_sentence_splitter()
+    test_speech_pipeline()
+    test_voice_queue()
+    test_voice_cache()
+    test_voice_stream()
+    test_voice_stream_window()
+    test_voice_stream_cached()
+    test_voice_retry()
 
     ## Results
     print("\n" + "=" * 60)